@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+推論レイテンシのマイクロベンチマーク
+
+sklearn の transform + predict と畳み込み済み線形カーネル・フラットな木の配列の
+1件あたりの推論時間を比較する。
+
+使い方:
+    python benchmark_inference.py [model_dir]
+    （model_dir 省略時は合成モデルを一時ディレクトリに生成）
+"""
+
+import sys
+import tempfile
+import timeit
+import warnings
+
+from inference_engine import LinearKernel
+from model_loader import ModelLoader
+from test_inference import build_sample_models, sample_requests
+
+warnings.filterwarnings('ignore')
+
+
+def bench(label: str, func, number: int, items: int = 1) -> float:
+    """
+    関数を number 回実行し、1件あたりの時間（マイクロ秒）を表示
+    """
+    elapsed = min(timeit.repeat(func, number=number, repeat=5)) / number / items * 1e6
+    print(f"  {label:32s}: {elapsed:9.3f} µs")
+    return elapsed
+
+
+def main():
+    """
+    メイン実行関数
+    """
+    if len(sys.argv) > 1:
+        model_dir = sys.argv[1]
+    else:
+        model_dir = tempfile.mkdtemp(prefix="appraisal_models_")
+        build_sample_models(model_dir)
+
+    loader = ModelLoader(model_dir=model_dir)
+    request_data = sample_requests(1)[0]
+    features = loader.prepare_features(request_data)
+    number = 2000
+
+    # model.bin から読み込んだ場合は sklearn モデルを持たないため比較を省略
+    has_sklearn = loader.model is not None
+
+    print(f"=== 1件あたりの推論時間 (features={features.shape[1]}) ===")
+    if has_sklearn:
+        sklearn_us = bench(
+            "sklearn transform + predict",
+            lambda: loader.model.predict(loader.scaler.transform(features)),
+            number
+        )
+    kernel_us = bench("linear kernel", lambda: loader.kernel.predict(features), number)
+    dense, ward_codes = loader.prepare_compact(request_data)
+    compact_us = bench(
+        f"ward bias table (dense={dense.shape[1]})",
+        lambda: loader.kernel.predict_compact(dense, ward_codes),
+        number
+    )
+    if has_sklearn:
+        print(f"  speedup: {sklearn_us / kernel_us:.1f}x (kernel), {sklearn_us / compact_us:.1f}x (ward table)")
+
+    print("\n=== ModelLoader.predict (特徴量準備込み) ===")
+    bench("predict()", lambda: loader.predict(request_data), number // 4)
+
+    batch_size = 10000
+    requests_data = sample_requests(batch_size)
+    dense, ward_codes = loader.prepare_compact_batch(requests_data)
+    batch_features = loader.layout.expand(dense, ward_codes)
+    print(f"\n=== バッチ推論 (N={batch_size}, 1件あたり) ===")
+    if has_sklearn:
+        bench(
+            "sklearn transform + predict",
+            lambda: loader.model.predict(loader.scaler.transform(batch_features)),
+            10, batch_size
+        )
+    bench("linear kernel", lambda: loader.kernel.predict(batch_features), 10, batch_size)
+    bench("ward bias table", lambda: loader.kernel.predict_compact(dense, ward_codes), 10, batch_size)
+    bench("prepare_compact_batch", lambda: loader.prepare_compact_batch(requests_data), 1, batch_size)
+
+    # float32（精度検証に不合格の場合は省略）
+    loader32 = ModelLoader(model_dir=model_dir, precision="float32")
+    if loader32.active_precision == "float32":
+        dense32, ward_codes32 = loader32.prepare_compact_batch(requests_data)
+        bench(
+            "ward bias table (float32)",
+            lambda: loader32.kernel.predict_compact(dense32, ward_codes32),
+            10, batch_size
+        )
+        bench("predict_batch() float64", lambda: loader.predict_batch(requests_data, ['predicted_price']), 1, batch_size)
+        bench("predict_batch() float32", lambda: loader32.predict_batch(requests_data, ['predicted_price']), 1, batch_size)
+
+    # ブートストラップアンサンブル: K 回の predict と1回の行列積の比較
+    replicas = 50
+    ensemble_dir = tempfile.mkdtemp(prefix="appraisal_ensemble_")
+    build_sample_models(ensemble_dir, ensemble=replicas)
+    ensemble_loader = ModelLoader(model_dir=ensemble_dir)
+    kernel = ensemble_loader.ensemble_kernel
+    dense, ward_codes = ensemble_loader.prepare_compact_batch(requests_data)
+    batch_features = ensemble_loader.layout.expand(dense, ward_codes)
+    replica_kernels = [LinearKernel(kernel.weights[:, k], kernel.intercepts[k]) for k in range(replicas)]
+    print(f"\n=== ブートストラップアンサンブル (K={replicas}, N={batch_size}, 1件あたり) ===")
+    if has_sklearn:
+        from sklearn.linear_model import LinearRegression
+        ensemble = ensemble_loader.feature_info['ensemble']
+        replica_models = []
+        for coef, intercept in zip(ensemble['coef'], ensemble['intercept']):
+            replica = LinearRegression()
+            replica.coef_, replica.intercept_, replica.n_features_in_ = coef, intercept, coef.shape[0]
+            replica_models.append(replica)
+        bench(
+            f"{replicas} x sklearn transform + predict",
+            lambda: [m.predict(ensemble_loader.scaler.transform(batch_features)) for m in replica_models],
+            1, batch_size
+        )
+    bench(f"{replicas} x linear kernel", lambda: [k.predict(batch_features) for k in replica_kernels], 5, batch_size)
+    bench("ensemble kernel (1 GEMM)", lambda: kernel.predict(batch_features), 5, batch_size)
+    bench("ensemble kernel (ward table)", lambda: kernel.predict_compact(dense, ward_codes), 5, batch_size)
+
+    # 勾配ブースティング木: sklearn の predict とフラットな配列の一括評価の比較
+    tree_dir = tempfile.mkdtemp(prefix="appraisal_trees_")
+    build_sample_models(tree_dir, trees=True)
+    tree_loader = ModelLoader(model_dir=tree_dir)
+    tree_kernel = tree_loader.kernel
+    tree_features = tree_loader.prepare_features_batch(requests_data)
+    single_features = tree_features[:1]
+    print(f"\n=== 勾配ブースティング木 (T={tree_kernel.tree_count}, depth={tree_kernel.depth}) ===")
+    bench("sklearn predict (1件)",
+          lambda: tree_loader.model.predict(tree_loader.scaler.transform(single_features)), number // 10)
+    bench("tree kernel (1件)", lambda: tree_kernel.predict(single_features), number)
+    bench(f"sklearn predict (N={batch_size})",
+          lambda: tree_loader.model.predict(tree_loader.scaler.transform(tree_features)), 2, batch_size)
+    bench(f"tree kernel (N={batch_size})", lambda: tree_kernel.predict(tree_features), 2, batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+起動時間のベンチマーク
+
+新しいプロセスで FastAPI アプリの import とモデル読み込みを行い、
+パッケージ別の import 時間・モデル読み込み時間・ピーク RSS を比較する。
+各計測は独立したサブプロセスで行うため、import 済みモジュールの影響を受けない。
+
+使い方:
+    python benchmark_startup.py [model_dir]
+    （model_dir 省略時は joblib 形式と model.bin 形式の合成モデルを一時ディレクトリに生成）
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple
+
+from test_inference import build_sample_models
+
+# 読み込まれたかを報告する重いモジュール
+HEAVY_MODULES = ("joblib", "sklearn", "scipy", "pandas")
+
+# サブプロセスで実行する計測コード（引数: model_dir, lean）
+CHILD_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from model_loader import ModelLoader
+loader = ModelLoader(model_dir=sys.argv[1], lean=sys.argv[2] == "lean")
+loader.warm_up()
+loaded = time.perf_counter()
+# ru_maxrss は Linux では exec 前の親プロセスの値を引き継ぐため /proc の VmHWM を優先
+peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+try:
+    with open("/proc/self/status") as f:
+        peak_rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+except (OSError, StopIteration):
+    pass
+print(json.dumps({
+    "import_ms": (imported - start) * 1e3,
+    "load_ms": (loaded - imported) * 1e3,
+    "peak_rss_kb": peak_rss_kb,
+    "heavy_modules": [name for name in sys.argv[3].split(",") if name in sys.modules]
+}))
+"""
+
+
+def parse_import_times(stderr: str) -> Dict[str, float]:
+    """
+    -X importtime の出力をトップレベルパッケージごとの import 時間（ミリ秒）に集計
+
+    累積時間は入れ子の import を重複して数えるため、各モジュール自身の時間を合計する。
+    """
+    totals: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        package = fields[2].strip().split(".")[0]
+        totals[package] += int(fields[0]) / 1e3
+    return dict(totals)
+
+
+def measure(model_dir: str, lean: bool) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """
+    サブプロセスでアプリの import・モデル読み込みを計測
+    """
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT,
+         model_dir, "lean" if lean else "standard", ",".join(HEAVY_MODULES)],
+        cwd=app_dir, capture_output=True, text=True, check=True
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return result, parse_import_times(completed.stderr)
+
+
+def report(label: str, result: Dict[str, Any], import_times: Dict[str, float], top: int = 8) -> None:
+    """
+    計測結果を表示
+    """
+    # ru_maxrss は macOS ではバイト単位
+    peak_rss_mb = result['peak_rss_kb'] / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    print(f"=== {label} ===")
+    print(f"  {'import main':32s}: {result['import_ms']:9.1f} ms")
+    print(f"  {'model load + warm-up':32s}: {result['load_ms']:9.1f} ms")
+    print(f"  {'peak RSS':32s}: {peak_rss_mb:9.1f} MB")
+    print(f"  {'heavy modules loaded':32s}: {', '.join(result['heavy_modules']) or '-'}")
+    print("  import time by package:")
+    for package, elapsed in sorted(import_times.items(), key=lambda item: -item[1])[:top]:
+        print(f"    {package:30s}: {elapsed:9.1f} ms")
+    print()
+
+
+def main():
+    """
+    メイン実行関数
+    """
+    scenarios: List[Tuple[str, str, bool]] = []
+    if len(sys.argv) > 1:
+        scenarios.append((f"{sys.argv[1]} (standard)", sys.argv[1], False))
+    else:
+        joblib_dir = tempfile.mkdtemp(prefix="appraisal_joblib_")
+        artifact_dir = tempfile.mkdtemp(prefix="appraisal_artifact_")
+        build_sample_models(joblib_dir)
+        build_sample_models(artifact_dir, artifact=True)
+        scenarios.append(("joblib (standard runtime)", joblib_dir, False))
+        scenarios.append(("model.bin (lean runtime)", artifact_dir, True))
+
+    for label, model_dir, lean in scenarios:
+        report(label, *measure(model_dir, lean))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+"""
+列形式のバッチ予測 - 列ごとの配列で受け取った物件を配列演算で検証し、予測結果も列形式で返す
+"""
+
+import asyncio
+import logging
+import os
+import re
+import typing
+from typing import Dict, Any, Optional, List, Collection, Mapping, Sequence, Tuple, FrozenSet, AsyncIterable
+
+import numpy as np
+import orjson
+
+from fast_response import PREDICT_RESPONSE_FIELDS
+from inference_executor import InferenceExecutor
+from model_loader import ModelLoader
+from model_shards import RegionShards
+from predict_schema import PredictRequest
+from regions import TOKYO_23KU_WARDS
+
+# Arrow IPC ストリーム形式の Content-Type（pyarrow がインストールされている場合のみ受け付ける）
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class ColumnarBodyTooLargeError(ValueError):
+    """
+    列形式のリクエストボディが max_bytes を超えたことを示す例外（413 として返す）
+    """
+
+
+# PredictRequest の数値制約（Field の gt / ge / lt / le）と対応する配列演算
+_BOUND_CHECKS = (('gt', np.greater), ('ge', np.greater_equal), ('lt', np.less), ('le', np.less_equal))
+
+
+class ColumnarBatch:
+    """
+    列形式（列名 -> 値の配列）の予測リクエスト
+
+    PredictRequest の制約（必須・gt / ge / le・整数・区名・市区町村コードの形式）を
+    列ごとの配列演算で検証し、違反した行は valid マスクで除外する。行ごとに
+    PredictRequest を生成しないため、検証のコストが件数に対してほぼ一定になる。
+    列の欠落・長さの不一致など入力全体が不正な場合は ValueError を送出する。
+    """
+
+    NUMERIC_COLUMNS = ('land_area', 'building_area', 'building_age', 'year', 'quarter')
+
+    def __init__(self, columns: Mapping[str, Any], wards: FrozenSet[str] = TOKYO_23KU_WARDS,
+                 max_rows: Optional[int] = None):
+        """
+        列形式の入力の検証
+
+        Args:
+            columns: 列名 -> 値の配列（None・null は未指定扱い）
+            wards: 受け付ける区名の許可リスト（app.state.allowed_wards）
+            max_rows: 最大行数（超えた場合は列の変換・検証の前に ValueError）
+        """
+        fields = PredictRequest.model_fields
+        missing = [name for name, info in fields.items() if info.is_required() and columns.get(name) is None]
+        if missing:
+            raise ValueError(f"Missing columns: {missing}")
+
+        lengths = {}
+        for name in fields:
+            values = columns.get(name)
+            if values is None:
+                continue
+            if isinstance(values, (str, bytes, Mapping)) or not hasattr(values, '__len__'):
+                raise ValueError(f"Column '{name}' must be an array")
+            lengths[name] = len(values)
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f"All columns must have the same length: {lengths}")
+
+        self.n_rows = next(iter(lengths.values()))
+        _check_rows(self.n_rows, max_rows)
+        self.columns: Dict[str, Optional[np.ndarray]] = {}
+        self.errors: Dict[str, np.ndarray] = {}
+
+        for name in self.NUMERIC_COLUMNS:
+            self._validate_numeric(name, columns.get(name))
+        self._validate_wards(columns['ward_name'], wards)
+        self._validate_area_codes(columns.get('area_code'))
+        self._fill_districts(columns.get('district'))
+
+        self.valid = np.ones(self.n_rows, dtype=bool)
+        for invalid in self.errors.values():
+            self.valid &= ~invalid
+
+    @classmethod
+    def from_arrow(cls, body: bytes, wards: FrozenSet[str] = TOKYO_23KU_WARDS,
+                   max_rows: Optional[int] = None) -> "ColumnarBatch":
+        """
+        Arrow IPC ストリーム形式のボディから生成
+
+        pyarrow は任意の依存関係のため、ここで初めて import する（未インストール時は ImportError）。
+
+        Args:
+            body: Arrow IPC ストリーム形式のバイト列
+            wards: 受け付ける区名の許可リスト
+            max_rows: 最大行数
+
+        Returns:
+            ColumnarBatch: 検証済みの入力
+        """
+        import pyarrow as pa
+
+        table = pa.ipc.open_stream(body).read_all()
+        _check_rows(table.num_rows, max_rows)
+        return cls({name: table.column(name).to_numpy() for name in table.column_names}, wards, max_rows)
+
+    def _validate_numeric(self, name: str, values: Optional[Sequence[Any]]) -> None:
+        """
+        数値列の変換と制約の検証（未指定は NaN とし、ModelLoader でデフォルト値になる）
+        """
+        info = PredictRequest.model_fields[name]
+        if values is None:
+            self.columns[name] = np.full(self.n_rows, np.nan)
+            return
+
+        array, invalid = _to_float(values, self.n_rows)
+        given = ~np.isnan(array)
+        if info.is_required():
+            invalid |= ~given
+
+        with np.errstate(invalid='ignore'):
+            for constraint in info.metadata:
+                for attr, check in _BOUND_CHECKS:
+                    bound = getattr(constraint, attr, None)
+                    if bound is not None:
+                        invalid |= given & ~check(array, bound)
+            if int in (info.annotation,) + typing.get_args(info.annotation):
+                invalid |= given & (np.mod(array, 1) != 0)
+
+        self.columns[name] = array
+        self._record(name, invalid)
+
+    def _validate_wards(self, values: Sequence[Any], allowed: FrozenSet[str]) -> None:
+        """
+        区名の検証（許可リストの区名のみ）
+        """
+        wards, _, wrong_type = _to_text(values, self.n_rows)
+        invalid = wrong_type | ~np.isin(wards, np.array(sorted(allowed)))
+        self.columns['ward_name'] = wards
+        self._record('ward_name', invalid)
+
+    def _validate_area_codes(self, values: Optional[Sequence[Any]]) -> None:
+        """
+        市区町村コードの検証（PredictRequest の pattern、値の種類ごとに1回だけ照合）
+        """
+        if values is None:
+            self.columns['area_code'] = None
+            return
+
+        codes, given, invalid = _to_text(values, self.n_rows)
+        patterns = [m.pattern for m in PredictRequest.model_fields['area_code'].metadata if getattr(m, 'pattern', None)]
+        candidates = given & ~invalid
+        rejected = [code for code in np.unique(codes[candidates]).tolist()
+                    if not all(re.search(pattern, code) for pattern in patterns)]
+        if rejected:
+            invalid |= candidates & np.isin(codes, rejected)
+
+        self.columns['area_code'] = np.where(given & ~invalid, codes.astype(object), None)
+        self._record('area_code', invalid)
+
+    def _fill_districts(self, values: Optional[Sequence[Any]]) -> None:
+        """
+        地区名の補完（未指定・空文字列の場合は PredictRequest と同じく「<区名>_1丁目」）
+        """
+        if values is None:
+            districts, given, invalid = np.full(self.n_rows, ''), np.zeros(self.n_rows, dtype=bool), None
+        else:
+            districts, given, invalid = _to_text(values, self.n_rows)
+        fill = ~given | (districts == '')
+        self.columns['district'] = np.where(fill, np.char.add(self.columns['ward_name'], '_1丁目'), districts)
+        if invalid is not None:
+            self._record('district', invalid)
+
+    def _record(self, name: str, invalid: np.ndarray) -> None:
+        """
+        制約に違反した行の記録
+        """
+        if invalid.any():
+            self.errors[name] = invalid
+
+    def valid_columns(self) -> Tuple[Dict[str, Optional[np.ndarray]], np.ndarray]:
+        """
+        検証を通過した行だけの列
+
+        Returns:
+            Tuple[Dict[str, Optional[np.ndarray]], np.ndarray]: 列名 -> 値の配列と、元の行番号
+        """
+        rows = np.flatnonzero(self.valid)
+        return {name: None if values is None else values[rows] for name, values in self.columns.items()}, rows
+
+    def error_rows(self) -> Dict[str, List[int]]:
+        """
+        列ごとの制約に違反した行番号
+
+        Returns:
+            Dict[str, List[int]]: 列名 -> 行番号のリスト
+        """
+        return {name: np.flatnonzero(invalid).tolist() for name, invalid in self.errors.items()}
+
+
+class ColumnarPredictor:
+    """
+    ColumnarBatch の有効な行をモデル（地域シャード）ごとに一括推論し、列形式の結果を返すクラス
+
+    結果の各列は入力と同じ長さで、無効な行は null になる。予測キャッシュ・重複排除は
+    行ごとのキーが必要なため使用しない。
+    """
+
+    def __init__(self, executor: InferenceExecutor, max_rows: int = 100000, max_bytes: int = 32 << 20):
+        """
+        列形式のバッチ予測の初期化
+
+        Args:
+            executor: 推論を実行する InferenceExecutor
+            max_rows: 1リクエストの最大行数
+            max_bytes: 1リクエストのボディの最大バイト数
+        """
+        self.logger = logging.getLogger(__name__)
+        self.executor = executor
+        self.max_rows = max(1, int(max_rows))
+        self.max_bytes = max(1, int(max_bytes))
+
+        self.requests = 0
+        self.rows = 0
+        self.invalid_rows = 0
+
+    @classmethod
+    def from_env(cls, executor: InferenceExecutor) -> "ColumnarPredictor":
+        """
+        環境変数から設定を読み込んで生成
+
+        COLUMNAR_MAX_ROWS: 1リクエストの最大行数（デフォルト 100000）
+        COLUMNAR_MAX_BYTES: 1リクエストのボディの最大バイト数（デフォルト 32MiB）
+        """
+        return cls(
+            executor=executor,
+            max_rows=int(os.getenv('COLUMNAR_MAX_ROWS', '100000')),
+            max_bytes=int(os.getenv('COLUMNAR_MAX_BYTES', str(32 << 20)))
+        )
+
+    async def read(self, body: AsyncIterable[bytes], content_type: str = '',
+                   content_length: Optional[str] = None,
+                   wards: FrozenSet[str] = TOKYO_23KU_WARDS) -> ColumnarBatch:
+        """
+        リクエストボディを max_bytes まで読み込み、max_rows 以内であることを確認してから検証
+
+        Content-Length が上限を超える場合は読み込まずに、送信中に上限を超えた場合は
+        その時点で打ち切る。行数は列の変換・検証の前に確認する。
+
+        Args:
+            body: リクエストボディ（チャンク転送の断片で可）
+            content_type: Content-Type（Arrow IPC ストリーム形式か JSON か）
+            content_length: Content-Length ヘッダーの値
+            wards: 受け付ける区名の許可リスト（app.state.allowed_wards）
+
+        Returns:
+            ColumnarBatch: 検証済みの入力
+
+        Raises:
+            ColumnarBodyTooLargeError: ボディが max_bytes を超えた
+            ValueError: 列形式として不正・行数が max_rows を超えた
+            ImportError: Arrow IPC の入力で pyarrow が無い
+        """
+        too_large = ColumnarBodyTooLargeError(f"Request body exceeds {self.max_bytes} bytes")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            raise too_large
+
+        buffer = bytearray()
+        async for data in body:
+            buffer += data
+            if len(buffer) > self.max_bytes:
+                raise too_large
+
+        if content_type.startswith(ARROW_MEDIA_TYPE):
+            return ColumnarBatch.from_arrow(bytes(buffer), wards, self.max_rows)
+        columns = orjson.loads(buffer)
+        if not isinstance(columns, dict):
+            raise ValueError("Body must be a JSON object of columns")
+        return ColumnarBatch(columns, wards, self.max_rows)
+
+    async def predict(self, batch: ColumnarBatch, model_loader: ModelLoader,
+                      fields: Optional[Collection[str]] = None,
+                      shards: Optional[RegionShards] = None,
+                      queue_wait: float = 0.0) -> Dict[str, Any]:
+        """
+        有効な行の予測
+
+        Args:
+            batch: 検証済みの入力
+            model_loader: 使用するモデル（地域シャードが担当しない行）
+            fields: 結果に含める項目（省略時は全項目）
+            shards: 区名・市区町村コードで振り分ける地域シャード
+            queue_wait: 推論の待ち行列が満杯の場合に再試行する最大秒数（0 の場合は即座に拒否）
+
+        Returns:
+            Dict[str, Any]: 列形式の結果・有効行マスク・列ごとのエラー行番号・件数
+        """
+        _check_rows(batch.n_rows, self.max_rows)
+
+        columns, rows = batch.valid_columns()
+        groups = await self._group(columns, model_loader, shards)
+
+        async def run(loader: ModelLoader, positions: np.ndarray) -> Dict[str, List[Any]]:
+            subset = {name: None if values is None else values[positions] for name, values in columns.items()}
+            return await self.executor.submit(
+                loader, 'predict_columns', subset, len(positions), fields, queue_wait=queue_wait
+            )
+
+        computed = await asyncio.gather(*(run(loader, positions) for loader, positions in groups))
+
+        names = PREDICT_RESPONSE_FIELDS if fields is None else [n for n in PREDICT_RESPONSE_FIELDS if n in fields]
+        results = {}
+        for name in names:
+            values = np.full(batch.n_rows, None, dtype=object)
+            for (_, positions), group in zip(groups, computed):
+                if name in group:
+                    values[rows[positions]] = group[name]
+            results[name] = values.tolist()
+
+        successful = len(rows)
+        self.requests += 1
+        self.rows += batch.n_rows
+        self.invalid_rows += batch.n_rows - successful
+        return {
+            "results": results,
+            "valid": batch.valid.tolist(),
+            "errors": batch.error_rows(),
+            "total_processed": batch.n_rows,
+            "successful": successful,
+            "failed": batch.n_rows - successful
+        }
+
+    async def _group(self, columns: Dict[str, Optional[np.ndarray]], model_loader: ModelLoader,
+                     shards: Optional[RegionShards]) -> List[Tuple[ModelLoader, np.ndarray]]:
+        """
+        有効な行をモデルごとに分割（地域シャードが未設定なら全行を model_loader で推論）
+        """
+        size = len(columns['ward_name'])
+        if size == 0:
+            return []
+        if shards is None:
+            return [(model_loader, np.arange(size))]
+
+        area_codes = columns['area_code'] if columns['area_code'] is not None else [None] * size
+        regions: Dict[Optional[str], List[int]] = {}
+        for i, (ward_name, area_code) in enumerate(zip(columns['ward_name'].tolist(), area_codes)):
+            regions.setdefault(shards.route(ward_name, area_code), []).append(i)
+
+        return [
+            (model_loader if region is None else await shards.aget(region), np.array(positions))
+            for region, positions in regions.items()
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        列形式のバッチ予測の統計の取得
+
+        Returns:
+            Dict[str, Any]: 設定値・リクエスト数・行数・無効行数
+        """
+        return {
+            "max_rows": self.max_rows,
+            "max_bytes": self.max_bytes,
+            "requests": self.requests,
+            "rows": self.rows,
+            "invalid_rows": self.invalid_rows
+        }
+
+
+def _check_rows(n_rows: int, max_rows: Optional[int]) -> None:
+    """
+    行数の上限の確認（列の変換・検証の前に行う）
+    """
+    if max_rows is not None and n_rows > max_rows:
+        raise ValueError(f"Too many rows. Maximum {max_rows} rows per request.")
+
+
+def _to_float(values: Sequence[Any], n_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    数値列を float64 配列に変換（null は NaN、数値に変換できない値は不正）
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: 値 (N,) と型が不正な行のマスク (N,)
+    """
+    try:
+        array = np.asarray(values, dtype=np.float64)
+        if array.shape == (n_rows,):
+            return array, np.zeros(n_rows, dtype=bool)
+    except (TypeError, ValueError):
+        pass
+
+    # 変換できない値を含む場合のみ1件ずつ変換
+    array = np.full(n_rows, np.nan)
+    invalid = np.zeros(n_rows, dtype=bool)
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        try:
+            array[i] = float(value)
+        except (TypeError, ValueError):
+            invalid[i] = True
+    return array, invalid
+
+
+def _to_text(values: Sequence[Any], n_rows: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    文字列列を Unicode 配列に変換（null・文字列以外は空文字列）
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: 値 (N,)・指定された行のマスク・文字列以外の行のマスク
+    """
+    # 0: null, 1: 文字列, 2: 文字列以外
+    kinds = np.fromiter((0 if value is None else 1 if isinstance(value, str) else 2 for value in values),
+                        dtype=np.int8, count=n_rows)
+    text = np.array([value if isinstance(value, str) else '' for value in values], dtype=str)
+    if text.shape != (n_rows,):
+        text = np.full(n_rows, '')
+    return text, kinds != 0, kinds == 2
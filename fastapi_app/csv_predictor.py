@@ -0,0 +1,296 @@
+"""
+CSV 予測 - アップロードされた CSV を一定行数ごとに読み込んで一括推論し、予測結果の列を加えた CSV を逐次返す
+"""
+
+import asyncio
+import codecs
+import csv
+import io
+import logging
+import os
+import time
+from itertools import islice
+from urllib.parse import quote
+from typing import Dict, Any, Optional, List, BinaryIO, AsyncIterator, Iterator, Tuple, FrozenSet
+
+from columnar_batch import ColumnarBatch, ColumnarPredictor
+from inference_executor import InferenceExecutor, InferenceQueueFullError
+from model_loader import ModelLoader
+from model_shards import RegionShards
+from predict_schema import PredictRequest
+from regions import TOKYO_23KU_WARDS
+
+# 元の列の後ろに追加する列
+RESULT_COLUMNS = ('predicted_price', 'error')
+
+
+class CSVInput:
+    """
+    ヘッダーを検証済みの CSV 入力（行はまだ読み込まない）
+    """
+
+    def __init__(self, text: io.TextIOWrapper, header: List[str], mapping: Dict[str, int], encoding: str):
+        """
+        Args:
+            text: アップロードされたファイルのテキストストリーム
+            header: 元のヘッダー行
+            mapping: PredictRequest の項目名 -> 列番号
+            encoding: 入出力の文字コード
+        """
+        self.text = text
+        self.rows: Iterator[List[str]] = csv.reader(text)
+        self.header = header
+        self.mapping = mapping
+        self.encoding = encoding
+
+    @property
+    def media_type(self) -> str:
+        """
+        結果の CSV の Content-Type（BOM 付き UTF-8 は charset=utf-8）
+        """
+        charset = codecs.lookup(self.encoding).name
+        return f"text/csv; charset={'utf-8' if charset == 'utf-8-sig' else charset}"
+
+
+class CSVPredictor:
+    """
+    CSV（ヘッダー行 + 1行1物件）を chunk_rows 行ずつ ColumnarBatch として検証・一括推論し、
+    元の列に predicted_price・error 列を加えた CSV を返すクラス
+
+    列はヘッダー名（前後の空白・大文字小文字を無視）で PredictRequest の項目に対応付け、
+    それ以外の列はそのまま出力する。空のセルは未指定として扱う。読み込みと出力は
+    chunk_rows 行ごとのため、行数に関わらずメモリ使用量は1チャンク分に収まる。
+    推論の待ち行列が満杯の間は queue_wait 秒まで空きを待ち、それでも空かない場合は
+    再送を始める行を示すエラー行で出力を終える（チャンクの行をエラーにはしない）。
+    """
+
+    def __init__(self, executor: InferenceExecutor, chunk_rows: int = 5000,
+                 wards: FrozenSet[str] = TOKYO_23KU_WARDS, queue_wait: float = 60.0):
+        """
+        CSV 予測の初期化
+
+        Args:
+            executor: 推論を実行する InferenceExecutor
+            chunk_rows: 1回の一括推論の行数
+            wards: 受け付ける区名の許可リスト（app.state.allowed_wards）
+            queue_wait: 推論の待ち行列が満杯の場合に1チャンクで空きを待つ最大秒数
+        """
+        self.logger = logging.getLogger(__name__)
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.wards = wards
+        self.queue_wait = max(0.0, float(queue_wait))
+        self.columnar = ColumnarPredictor(executor, max_rows=self.chunk_rows)
+
+        self.files = 0
+        self.active = 0
+        self.rows = 0
+        self.failed = 0
+
+    @classmethod
+    def from_env(cls, executor: InferenceExecutor,
+                 wards: FrozenSet[str] = TOKYO_23KU_WARDS) -> "CSVPredictor":
+        """
+        環境変数から設定を読み込んで生成
+
+        CSV_CHUNK_ROWS: 1回の一括推論の行数（デフォルト 5000）
+        CSV_QUEUE_WAIT: 推論の待ち行列が満杯の場合に空きを待つ最大秒数（デフォルト 60）
+
+        Args:
+            executor: 推論を実行する InferenceExecutor
+            wards: 受け付ける区名の許可リスト
+        """
+        return cls(
+            executor=executor,
+            chunk_rows=int(os.getenv('CSV_CHUNK_ROWS', '5000')),
+            wards=wards,
+            queue_wait=float(os.getenv('CSV_QUEUE_WAIT', '60'))
+        )
+
+    def open(self, file: BinaryIO, encoding: str = 'utf-8-sig') -> CSVInput:
+        """
+        ヘッダー行の読み込みと列の対応付け
+
+        デコードできないバイトは置換文字として読み込む（該当する行は検証で無効になる）。
+
+        Args:
+            file: アップロードされたファイル（バイナリ）
+            encoding: 文字コード（Excel の CSV は cp932 など）
+
+        Returns:
+            CSVInput: ヘッダーを検証済みの入力
+
+        Raises:
+            ValueError: 未知の文字コード・空のファイル・必須列の欠落
+        """
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            raise ValueError(f"Unknown encoding: {encoding}")
+
+        text = io.TextIOWrapper(file, encoding=encoding, errors='replace', newline='')
+        try:
+            header = next(csv.reader(text))
+        except StopIteration:
+            text.detach()
+            raise ValueError("CSV file is empty")
+        except csv.Error as e:
+            text.detach()
+            raise ValueError(f"Malformed CSV header: {e}")
+
+        mapping: Dict[str, int] = {}
+        for i, name in enumerate(header):
+            key = name.strip().lower()
+            if key in PredictRequest.model_fields:
+                mapping.setdefault(key, i)
+
+        missing = [name for name, info in PredictRequest.model_fields.items()
+                   if info.is_required() and name not in mapping]
+        if missing:
+            text.detach()
+            raise ValueError(f"Missing columns: {missing}")
+
+        return CSVInput(text, header, mapping, encoding)
+
+    async def stream(self, source: CSVInput, model_loader: ModelLoader,
+                     shards: Optional[RegionShards] = None) -> AsyncIterator[bytes]:
+        """
+        CSV の予測と結果の CSV の生成
+
+        Args:
+            source: open() で検証した入力
+            model_loader: 使用するモデル（地域シャードが担当しない行）
+            shards: 区名・市区町村コードで振り分ける地域シャード
+
+        Yields:
+            bytes: チャンク分の結果行（最初はヘッダー行のみ、入力と同じ文字コード）
+        """
+        self.files += 1
+        self.active += 1
+        started = time.monotonic()
+        encoder = codecs.getincrementalencoder(source.encoding)(errors='replace')
+        rows = 0
+        failed = 0
+        try:
+            yield encoder.encode(_format_rows([source.header + list(RESULT_COLUMNS)]))
+            while True:
+                chunk, malformed = await asyncio.to_thread(self._read_chunk, source)
+                if chunk:
+                    try:
+                        prices, errors = await self._predict(chunk, source.mapping, model_loader, shards)
+                    except InferenceQueueFullError as e:
+                        # 過負荷が続いた場合は、再送を始めるデータ行（1 から）を示して終了する
+                        self.logger.warning(f"CSV prediction stopped after row {rows}: {e}")
+                        yield encoder.encode(_format_rows(
+                            [[''] * (len(source.header) + 1) + [f"Stopped at data row {rows + 1}: {e}"]]
+                        ))
+                        break
+                    rows += len(chunk)
+                    failed += sum(1 for error in errors if error)
+                    yield encoder.encode(_format_rows(
+                        row + [price, error] for row, price, error in zip(chunk, prices, errors)
+                    ))
+                if malformed is not None:
+                    # 以降の行は区切れないため、エラー行を出力して終了する
+                    self.logger.warning(f"Malformed CSV after row {rows}: {malformed}")
+                    yield encoder.encode(_format_rows([[''] * (len(source.header) + 1) + [f"Malformed CSV: {malformed}"]]))
+                    break
+                if not chunk:
+                    break
+        finally:
+            source.text.detach()
+            self.active -= 1
+            self.rows += rows
+            self.failed += failed
+            self.logger.info(
+                f"CSV prediction finished: {rows} rows, {failed} failed "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+
+    def _read_chunk(self, source: CSVInput) -> Tuple[List[List[str]], Optional[str]]:
+        """
+        最大 chunk_rows 行の読み込み（壊れた行があればそれまでの行とエラーを返す）
+        """
+        chunk: List[List[str]] = []
+        try:
+            for row in islice(source.rows, self.chunk_rows):
+                chunk.append(row)
+        except csv.Error as e:
+            return chunk, str(e)
+        return chunk, None
+
+    async def _predict(self, chunk: List[List[str]], mapping: Dict[str, int], model_loader: ModelLoader,
+                       shards: Optional[RegionShards]) -> Tuple[List[str], List[str]]:
+        """
+        1チャンクの検証と推論（行ごとの予測価格とエラーの文字列を返す）
+
+        Raises:
+            InferenceQueueFullError: queue_wait 秒待っても推論の待ち行列が空かなかった
+        """
+        columns = {name: [_cell(row, i) for row in chunk] for name, i in mapping.items()}
+        batch = ColumnarBatch(columns, self.wards)
+        try:
+            content = await self.columnar.predict(batch, model_loader, ['predicted_price'], shards, self.queue_wait)
+        except InferenceQueueFullError:
+            raise
+        except RuntimeError as e:
+            self.logger.error(f"CSV chunk prediction failed: {e}")
+            return [''] * len(chunk), ["Prediction failed"] * len(chunk)
+
+        invalid: Dict[int, List[str]] = {}
+        for name, positions in content['errors'].items():
+            for position in positions:
+                invalid.setdefault(position, []).append(name)
+
+        prices = ['' if price is None else repr(float(price)) for price in content['results']['predicted_price']]
+        errors = [
+            f"Invalid input: {', '.join(invalid[i])}" if i in invalid else '' for i in range(len(chunk))
+        ]
+        return prices, errors
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        CSV 予測の統計の取得
+
+        Returns:
+            Dict[str, Any]: 設定値・ファイル数・処理行数・失敗行数
+        """
+        return {
+            "chunk_rows": self.chunk_rows,
+            "queue_wait": self.queue_wait,
+            "files": self.files,
+            "active": self.active,
+            "rows": self.rows,
+            "failed": self.failed
+        }
+
+
+def content_disposition(filename: Optional[str]) -> str:
+    """
+    結果の CSV の Content-Disposition（元のファイル名に _predicted を付ける）
+
+    Args:
+        filename: アップロードされたファイル名
+
+    Returns:
+        str: Content-Disposition ヘッダーの値（日本語のファイル名は RFC 5987 形式）
+    """
+    stem = os.path.splitext(os.path.basename(filename or ''))[0] or 'properties'
+    return f"attachment; filename*=UTF-8''{quote(stem + '_predicted.csv')}"
+
+
+def _cell(row: List[str], index: int) -> Optional[str]:
+    """
+    セルの値（列が足りない行・空のセルは None）
+    """
+    if index >= len(row):
+        return None
+    return row[index].strip() or None
+
+
+def _format_rows(rows: Any) -> str:
+    """
+    行のリストを CSV の文字列に変換
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\r\n').writerows(rows)
+    return buffer.getvalue()
@@ -0,0 +1,219 @@
+"""
+エンドポイント共通の依存関係
+"""
+
+import logging
+from typing import Any, Dict, FrozenSet, List, Optional
+from fastapi import HTTPException, status, Request, Response, Query, Header
+from starlette.types import ASGIApp, Scope, Receive, Send
+
+from model_loader import ModelLoader
+from model_registry import ModelRegistry
+from model_shards import RegionShards
+from predict_schema import ward_validation_context
+from regions import TOKYO_23KU_WARDS
+
+logger = logging.getLogger(__name__)
+
+# 使用したモデルを返すレスポンスヘッダー
+MODEL_HEADERS = ("X-Model-Name", "X-Model-Version")
+
+
+def get_model_loader(
+    request: Request,
+    response: Response,
+    model: Optional[str] = Query(None, description="使用するモデル名またはエイリアス"),
+    x_model_name: Optional[str] = Header(None)
+) -> ModelLoader:
+    """
+    リクエストで指定されたモデルの ModelLoader を取得
+
+    クエリパラメータ model、X-Model-Name ヘッダーの順で参照し、どちらも
+    無い場合はデフォルトモデルを使用する。使用したモデルは X-Model-Name /
+    X-Model-Version レスポンスヘッダーで返す。
+
+    Args:
+        request: FastAPIリクエストオブジェクト
+        response: FastAPIレスポンスオブジェクト
+        model: モデル名またはエイリアス（クエリパラメータ）
+        x_model_name: モデル名またはエイリアス（ヘッダー）
+
+    Returns:
+        ModelLoader: モデルローダー
+    """
+    model_registry: Optional[ModelRegistry] = getattr(request.app.state, 'model_registry', None)
+    if model_registry is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Model not available"
+        )
+
+    requested = model or x_model_name
+    try:
+        model_name = model_registry.resolve_name(requested)
+        model_loader = model_registry.get(model_name)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown model: {requested}"
+        )
+
+    if not model_loader.is_loaded():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Model not available"
+        )
+
+    set_model_headers(response, model_name, model_loader)
+    return model_loader
+
+
+def set_model_headers(response: Response, model_name: str, model_loader: ModelLoader) -> None:
+    """
+    使用したモデルを X-Model-Name / X-Model-Version レスポンスヘッダーに設定
+
+    Args:
+        response: FastAPIレスポンスオブジェクト
+        model_name: モデル名（地域シャードの場合は地域名）
+        model_loader: モデルローダー
+    """
+    response.headers["X-Model-Name"] = model_name
+    response.headers["X-Model-Version"] = model_loader.model_version or ""
+
+
+def get_region_shards(request: Request) -> Optional[RegionShards]:
+    """
+    要求を振り分ける地域シャードを取得
+
+    ?model= / X-Model-Name でモデルを明示した場合は振り分けない。
+
+    Args:
+        request: FastAPIリクエストオブジェクト
+
+    Returns:
+        Optional[RegionShards]: 地域シャード（未設定・モデル指定時はNone）
+    """
+    if request.query_params.get('model') or request.headers.get('x-model-name'):
+        return None
+    return getattr(request.app.state, 'region_shards', None)
+
+
+async def route_to_shards(region_shards: Optional[RegionShards], model_loader: ModelLoader,
+                          requests_data: List[Dict[str, Any]], response: Response) -> List[ModelLoader]:
+    """
+    要求ごとに区名・市区町村コードから地域シャードのモデルを選択
+
+    全ての要求が同じ地域のシャードに振り分けられた場合は、その地域名とバージョンを
+    レスポンスヘッダーで返す。
+
+    Args:
+        region_shards: 地域シャード（None の場合は全て model_loader）
+        model_loader: シャードが担当しない要求に使うモデル
+        requests_data: API リクエストデータのリスト
+        response: FastAPIレスポンスオブジェクト
+
+    Returns:
+        List[ModelLoader]: 要求ごとのモデルローダー
+    """
+    if region_shards is None:
+        return [model_loader] * len(requests_data)
+
+    try:
+        regions, loaders = await region_shards.loaders(requests_data, model_loader)
+    except RuntimeError as e:
+        logger.error(f"Region shard loading failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Region model not available"
+        )
+
+    distinct = set(regions)
+    if len(distinct) == 1 and None not in distinct:
+        set_model_headers(response, regions[0], loaders[0])
+    return loaders
+
+
+def get_result_fields(
+    fields: Optional[str] = Query(
+        None, description="返す項目のカンマ区切り（例：predicted_price,confidence）"
+    ),
+    lean: bool = Query(False, description="predicted_price のみを返す軽量モード"),
+    explain: bool = Query(False, description="特徴量ごとの価格寄与（contributions）を追加")
+) -> Optional[FrozenSet[str]]:
+    """
+    レスポンスに含める予測結果の項目を取得
+
+    predicted_price は常に含める。指定が無い場合は None（全項目）を返す。
+
+    Args:
+        fields: 項目名のカンマ区切り
+        lean: 軽量モード（fields=predicted_price と同じ）
+        explain: 価格寄与を追加（fields=...,contributions と同じ）
+
+    Returns:
+        Optional[FrozenSet[str]]: 項目名の集合（全項目の場合はNone）
+    """
+    available = ModelLoader.RESULT_FIELDS + ModelLoader.OPTIONAL_RESULT_FIELDS
+    if lean:
+        requested = frozenset(['predicted_price'])
+    elif fields is None:
+        requested = None if not explain else frozenset(ModelLoader.RESULT_FIELDS)
+    else:
+        requested = frozenset(name.strip() for name in fields.split(',') if name.strip())
+        unknown = requested - set(available)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {sorted(unknown)}. Available: {list(available)}"
+            )
+
+    if requested is None:
+        return None
+    if explain:
+        requested |= {'contributions'}
+    return requested | {'predicted_price'}
+
+
+def model_headers(response: Response) -> Dict[str, str]:
+    """
+    get_model_loader が設定したモデルのヘッダーを取得（Response を直接返す場合に引き継ぐ）
+
+    Args:
+        response: FastAPIレスポンスオブジェクト
+
+    Returns:
+        Dict[str, str]: ヘッダー名 -> 値
+    """
+    return {name: response.headers[name] for name in MODEL_HEADERS if name in response.headers}
+
+
+def get_allowed_wards(request: Request) -> FrozenSet[str]:
+    """
+    予測リクエストで受け付ける区名の許可リストを取得（起動時に設定から生成）
+
+    Args:
+        request: FastAPIリクエストオブジェクト
+
+    Returns:
+        FrozenSet[str]: 受け付ける区名
+    """
+    return getattr(request.app.state, 'allowed_wards', TOKYO_23KU_WARDS)
+
+
+class WardValidationMiddleware:
+    """
+    リクエストボディの PredictRequest の検証で app.state.allowed_wards を使う ASGI ミドルウェア
+
+    FastAPI はボディの検証に context を渡せないため、リクエストごとに
+    ward_validation_context で許可リストを設定する。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        with ward_validation_context(getattr(scope['app'].state, 'allowed_wards', TOKYO_23KU_WARDS)):
+            await self.app(scope, receive, send)
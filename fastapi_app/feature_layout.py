@@ -0,0 +1,315 @@
+"""
+特徴量レイアウト - feature_columns から読み込み時に1度だけ生成する列配置情報
+"""
+
+import threading
+import numpy as np
+from typing import Dict, Any, Optional, List, Sequence, Tuple
+
+
+# 数値特徴量とリクエスト未指定時のデフォルト値
+NUMERIC_DEFAULTS: Dict[str, float] = {
+    'building_area': 0,
+    'land_area': 0,
+    'building_age': 0,
+    'year': 2024,
+    'quarter': 1
+}
+
+# One-hot 区名列の接頭辞
+WARD_PREFIX = 'ward_'
+
+# ラベルエンコードされた区名列（fix_model.py のスキーマ）
+WARD_ENCODED_COLUMN = 'ward_encoded'
+
+
+class FeatureLayout:
+    """
+    特徴量ベクトルの列配置
+
+    リクエストごとの feature_columns.index() / in 判定を避けるため、
+    各入力の書き込み先インデックスを読み込み時に確定させる。
+
+    入力は「区名ブロック以外の密な数値特徴量 (N, K)」と「区コード (N,)」の
+    コンパクト表現に変換し、必要な場合のみ元の特徴量行列 (N, F) に展開する。
+    区名ブロックは One-hot 列（train_model.py）と ward_encoded 列
+    （fix_model.py）のどちらにも対応する。
+    """
+
+    def __init__(self, feature_columns: List[str], ward_classes: Optional[Sequence[str]] = None,
+                 dtype: Any = np.float64):
+        """
+        レイアウトの生成
+
+        Args:
+            feature_columns: 学習時の特徴量列名リスト
+            ward_classes: ward_encoded 列の LabelEncoder.classes_（One-hot スキーマでは不要）
+            dtype: 特徴量バッファの精度（float32 推論時は np.float32）
+        """
+        self.feature_columns = list(feature_columns)
+        self.feature_count = len(self.feature_columns)
+        self.dtype = np.dtype(dtype)
+
+        column_index = {col: i for i, col in enumerate(self.feature_columns)}
+
+        # 区名ブロック: 区コード -> (列インデックス, 値)
+        one_hot_slots = {
+            col[len(WARD_PREFIX):]: i
+            for col, i in column_index.items()
+            if col.startswith(WARD_PREFIX) and col != WARD_ENCODED_COLUMN
+        }
+        ward_encoded_slot = column_index.get(WARD_ENCODED_COLUMN)
+        if one_hot_slots:
+            self.ward_names = list(one_hot_slots)
+            ward_columns = [one_hot_slots[name] for name in self.ward_names]
+            ward_values = [1.0] * len(self.ward_names)
+        elif ward_encoded_slot is not None and ward_classes is not None:
+            self.ward_names = [str(name) for name in ward_classes]
+            ward_columns = [ward_encoded_slot] * len(self.ward_names)
+            ward_values = [float(code) for code in range(len(self.ward_names))]
+        else:
+            self.ward_names = []
+            ward_columns, ward_values = [], []
+        self.ward_codes: Dict[str, int] = {name: code for code, name in enumerate(self.ward_names)}
+        self.unknown_ward_code = len(self.ward_names)
+        self.ward_columns = np.array(ward_columns, dtype=np.intp)
+        self.ward_values = np.array(ward_values, dtype=np.float64)
+
+        # 区名ブロック以外の密な列
+        ward_block = set(ward_columns)
+        self.dense_slots = np.array(
+            [i for i in range(self.feature_count) if i not in ward_block], dtype=np.intp
+        )
+        dense_position = {
+            self.feature_columns[slot]: pos for pos, slot in enumerate(self.dense_slots.tolist())
+        }
+        self.dense_count = len(self.dense_slots)
+
+        # 数値入力: (入力名, 密な列の位置, デフォルト値)
+        self.numeric_slots: Tuple[Tuple[str, int, float], ...] = tuple(
+            (name, dense_position[name], float(default))
+            for name, default in NUMERIC_DEFAULTS.items()
+            if name in dense_position
+        )
+
+        # 派生特徴量（存在しない場合は None）
+        self.area_ratio_slot: Optional[int] = dense_position.get('area_ratio')
+        self.total_area_slot: Optional[int] = dense_position.get('total_area')
+        self.district_slot: Optional[int] = dense_position.get('district_encoded')
+
+        # features_used に含める列（area_ratio を除外）
+        self.used_slots: Tuple[int, ...] = tuple(
+            i for i, col in enumerate(self.feature_columns) if col != 'area_ratio'
+        )
+
+    def encode_row(self, request_data: Dict[str, Any],
+                   district_code: Optional[float] = None) -> Tuple[np.ndarray, int]:
+        """
+        1件分のリクエストデータをコンパクト表現に変換
+
+        Args:
+            request_data: API リクエストデータ
+            district_code: 地区のエンコード値（未指定の場合は0）
+
+        Returns:
+            Tuple[np.ndarray, int]: 密な特徴量 (K,) と区コード
+        """
+        dense = np.zeros(self.dense_count, dtype=self.dtype)
+        for name, slot, default in self.numeric_slots:
+            value = request_data.get(name)
+            dense[slot] = default if value is None else float(value)
+
+        if self.area_ratio_slot is not None or self.total_area_slot is not None:
+            building_area = request_data.get('building_area')
+            land_area = request_data.get('land_area')
+            building_area = NUMERIC_DEFAULTS['building_area'] if building_area is None else building_area
+            land_area = NUMERIC_DEFAULTS['land_area'] if land_area is None else land_area
+            if self.area_ratio_slot is not None:
+                dense[self.area_ratio_slot] = building_area / (land_area + 1e-6)
+            if self.total_area_slot is not None:
+                dense[self.total_area_slot] = building_area + land_area
+
+        if self.district_slot is not None and district_code is not None:
+            dense[self.district_slot] = district_code
+
+        ward_code = self.ward_codes.get(request_data.get('ward_name') or '', self.unknown_ward_code)
+        return dense, ward_code
+
+    def encode_columns(self, columns: Dict[str, Sequence[Any]], n_rows: int,
+                       district_codes: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        列形式の入力データをコンパクト表現に配列演算で変換
+
+        Args:
+            columns: 列名 -> 値リストの辞書（None は未指定扱い）
+            n_rows: 行数
+            district_codes: 地区のエンコード値 (N,)（未指定の場合は0）
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 密な特徴量 (N, K) と区コード (N,)
+        """
+        dense = np.zeros((n_rows, self.dense_count), dtype=self.dtype)
+
+        numeric = {
+            name: self._numeric_column(columns.get(name), default, n_rows)
+            for name, default in NUMERIC_DEFAULTS.items()
+        }
+        for name, slot, _ in self.numeric_slots:
+            dense[:, slot] = numeric[name]
+
+        if self.area_ratio_slot is not None:
+            dense[:, self.area_ratio_slot] = numeric['building_area'] / (numeric['land_area'] + 1e-6)
+        if self.total_area_slot is not None:
+            dense[:, self.total_area_slot] = numeric['building_area'] + numeric['land_area']
+
+        if self.district_slot is not None and district_codes is not None:
+            dense[:, self.district_slot] = district_codes
+
+        return dense, self.encode_wards(columns.get('ward_name'), n_rows)
+
+    def encode_wards(self, ward_names: Optional[Sequence[Optional[str]]], n_rows: int) -> np.ndarray:
+        """
+        区名の配列を区コードに変換（未知・未指定は unknown_ward_code）
+
+        Args:
+            ward_names: 区名のリスト
+            n_rows: 行数
+
+        Returns:
+            np.ndarray: 区コード (N,)
+        """
+        if ward_names is None:
+            return np.full(n_rows, self.unknown_ward_code, dtype=np.intp)
+        return np.fromiter(
+            (self.ward_codes.get(ward_name or '', self.unknown_ward_code) for ward_name in ward_names),
+            dtype=np.intp, count=n_rows
+        )
+
+    def expand(self, dense: np.ndarray, ward_codes: np.ndarray) -> np.ndarray:
+        """
+        コンパクト表現を元の特徴量行列に展開
+
+        Args:
+            dense: 密な特徴量 (N, K)
+            ward_codes: 区コード (N,)
+
+        Returns:
+            np.ndarray: 特徴量行列 (N, F)
+        """
+        features = np.zeros((dense.shape[0], self.feature_count), dtype=self.dtype)
+        features[:, self.dense_slots] = dense
+
+        rows = np.flatnonzero(ward_codes < self.unknown_ward_code)
+        codes = ward_codes[rows]
+        features[rows, self.ward_columns[codes]] = self.ward_values[codes]
+        return features
+
+    def features_used(self, row: np.ndarray) -> Dict[str, float]:
+        """
+        特徴量ベクトルから0以外の使用特徴量を抽出（デバッグ用）
+
+        Args:
+            row: 特徴量ベクトル (F,)
+
+        Returns:
+            Dict[str, float]: 列名 -> 値
+        """
+        values = row.tolist()
+        return {self.feature_columns[i]: values[i] for i in self.used_slots if values[i] != 0}
+
+    @staticmethod
+    def _numeric_column(values: Optional[Sequence[Any]], default: float, n_rows: int) -> np.ndarray:
+        """
+        数値列を float64 配列に変換（None・NaN はデフォルト値）
+        """
+        if values is None:
+            return np.full(n_rows, float(default))
+        if isinstance(values, np.ndarray):
+            values = values.astype(np.float64, copy=False)
+            return np.where(np.isnan(values), float(default), values)
+        return np.array([default if v is None else v for v in values], dtype=np.float64)
+
+
+class CategoryEncoder:
+    """
+    LabelEncoder を置き換える辞書ベースのカテゴリエンコーダー
+
+    LabelEncoder.transform は呼び出しごとに検証・探索を行い、未知の値では
+    例外を送出する。読み込み時に classes_ を辞書とソート済み配列へ変換し、
+    未知の値は例外を使わずフォールバック値を返して件数を記録する。
+    """
+
+    def __init__(self, classes: Sequence[Any], fallback_code: float = 0):
+        """
+        エンコーダーの初期化
+
+        Args:
+            classes: LabelEncoder.classes_（ソート済み、位置がエンコード値）
+            fallback_code: 未知の値に割り当てるエンコード値
+        """
+        self.classes = np.asarray(classes).astype(str)
+        self.table: Dict[str, int] = {value: code for code, value in enumerate(self.classes.tolist())}
+        self.fallback_code = float(fallback_code)
+        self.lookup_count = 0
+        self.unknown_count = 0
+        self._lock = threading.Lock()
+
+    def encode(self, value: str) -> float:
+        """
+        1件のエンコード（未知の値はフォールバック値）
+
+        Args:
+            value: カテゴリ値
+
+        Returns:
+            float: エンコード値
+        """
+        code = self.table.get(value)
+        with self._lock:
+            self.lookup_count += 1
+            if code is None:
+                self.unknown_count += 1
+        return self.fallback_code if code is None else float(code)
+
+    def encode_many(self, values: Sequence[Optional[str]]) -> np.ndarray:
+        """
+        配列のエンコード（ソート済み classes への二分探索）
+
+        Args:
+            values: カテゴリ値のリスト（None・空文字は未指定扱いで0）
+
+        Returns:
+            np.ndarray: エンコード値 (N,)
+        """
+        encoded = np.zeros(len(values))
+        if len(values) == 0:
+            return encoded
+
+        keys = np.array([v if v else '' for v in values], dtype=object).astype(str)
+        given = keys != ''
+        if len(self.classes) > 0:
+            positions = np.minimum(np.searchsorted(self.classes, keys), len(self.classes) - 1)
+            known = (self.classes[positions] == keys) & given
+            encoded[known] = positions[known]
+        else:
+            known = np.zeros(len(values), dtype=bool)
+        encoded[given & ~known] = self.fallback_code
+
+        n_given = int(np.count_nonzero(given))
+        with self._lock:
+            self.lookup_count += n_given
+            self.unknown_count += n_given - int(np.count_nonzero(known))
+        return encoded
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        ルックアップ統計の取得
+
+        Returns:
+            Dict[str, int]: クラス数・ルックアップ数・未知値件数
+        """
+        return {
+            "classes": len(self.classes),
+            "lookups": self.lookup_count,
+            "unknown": self.unknown_count
+        }
@@ -0,0 +1,562 @@
+"""
+推論カーネル - 標準化と線形回帰を1つの重みベクトルに畳み込んだ高速推論、
+勾配ブースティング木をフラットな配列で一括評価する推論
+"""
+
+import numpy as np
+from typing import Any, Dict, Optional, Tuple, Mapping
+
+from feature_layout import FeatureLayout
+
+
+def scaler_parameters(scaler: Any) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    StandardScaler が実際に適用する平均・標準偏差
+
+    with_mean=False でも mean_ は計算されるため、with_mean / with_std を見て使わない側を None にする
+
+    Args:
+        scaler: 学習済みの StandardScaler
+
+    Returns:
+        Tuple[Optional[np.ndarray], Optional[np.ndarray]]: (平均, 標準偏差)（適用しない側は None）
+    """
+    mean = getattr(scaler, 'mean_', None) if getattr(scaler, 'with_mean', True) else None
+    scale = getattr(scaler, 'scale_', None) if getattr(scaler, 'with_std', True) else None
+    return mean, scale
+
+
+class LinearKernel:
+    """
+    StandardScaler + 線形回帰モデルを畳み込んだ推論カーネル
+
+    標準化 z = (x - mean) / scale と回帰 y = coef · z + intercept を展開し、
+    y = (coef / scale) · x + (intercept - coef · mean / scale) として
+    読み込み時に1本の重みベクトルと切片へまとめる。
+    """
+
+    # get_model_info の inference_path に表示する名前
+    INFERENCE_PATH = "linear_kernel"
+
+    def __init__(self, weights: np.ndarray, intercept: float, dtype: Any = np.float64):
+        """
+        カーネルの初期化
+
+        Args:
+            weights: 元の特徴量空間での実効重み (F,)
+            intercept: 実効切片
+            dtype: 重み・区寄与テーブルの精度
+        """
+        self.weights = np.ascontiguousarray(weights, dtype=dtype)
+        self.intercept = float(intercept)
+        self.dense_weights = None
+        self.ward_bias = None
+        # 寄与度の基準点（学習データの平均）
+        self.baseline: Optional[np.ndarray] = None
+        self.dense_baseline = None
+        self.ward_baseline = 0.0
+
+    @classmethod
+    def from_estimators(cls, model: Any, scaler: Any) -> "LinearKernel":
+        """
+        学習済みのスケーラーと線形モデルからカーネルを生成
+
+        Args:
+            model: coef_ / intercept_ を持つ線形回帰モデル
+            scaler: mean_ / scale_ を持つ StandardScaler
+
+        Returns:
+            LinearKernel: 畳み込み済みカーネル
+        """
+        if not hasattr(model, 'coef_') or not hasattr(model, 'intercept_'):
+            raise TypeError(f"Model {type(model).__name__} is not a linear model")
+
+        return cls.from_coefficients(
+            model.coef_, float(np.ravel(model.intercept_)[0]), *scaler_parameters(scaler)
+        )
+
+    @classmethod
+    def from_coefficients(cls, coef: np.ndarray, intercept: float,
+                          mean: Optional[np.ndarray] = None,
+                          scale: Optional[np.ndarray] = None) -> "LinearKernel":
+        """
+        回帰係数とスケーラーのパラメータからカーネルを生成
+
+        Args:
+            coef: 標準化後の特徴量空間での回帰係数 (F,)
+            intercept: 切片
+            mean: スケーラーの平均 (F,)（None の場合は0）
+            scale: スケーラーの標準偏差 (F,)（None の場合は1）
+
+        Returns:
+            LinearKernel: 畳み込み済みカーネル
+        """
+        coef = np.asarray(coef, dtype=np.float64).ravel()
+        mean = np.zeros_like(coef) if mean is None else np.asarray(mean, dtype=np.float64)
+        scale = np.ones_like(coef) if scale is None else np.asarray(scale, dtype=np.float64)
+
+        if not (coef.shape == mean.shape == scale.shape):
+            raise ValueError(
+                f"Shape mismatch: coef={coef.shape}, mean={mean.shape}, scale={scale.shape}"
+            )
+
+        weights = coef / scale
+        kernel = cls(weights, intercept - float(weights @ mean))
+        kernel.baseline = mean
+        return kernel
+
+    @property
+    def feature_count(self) -> int:
+        """特徴量数"""
+        return self.weights.shape[0]
+
+    @property
+    def dtype(self) -> np.dtype:
+        """重みの精度"""
+        return self.weights.dtype
+
+    def astype(self, dtype: Any) -> "LinearKernel":
+        """
+        重み・区寄与テーブルを指定した精度に変換したカーネルを生成
+
+        Args:
+            dtype: 変換後の精度（np.float32 など）
+
+        Returns:
+            LinearKernel: 変換後のカーネル（bind_layout 済みの状態を引き継ぐ）
+        """
+        kernel = LinearKernel(self.weights, self.intercept, dtype=dtype)
+        kernel.baseline = self.baseline
+        kernel.ward_baseline = self.ward_baseline
+        if self.dense_weights is not None:
+            kernel.dense_weights = np.ascontiguousarray(self.dense_weights, dtype=dtype)
+            kernel.ward_bias = np.ascontiguousarray(self.ward_bias, dtype=dtype)
+        if self.dense_baseline is not None:
+            kernel.dense_baseline = np.ascontiguousarray(self.dense_baseline, dtype=dtype)
+        return kernel
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """
+        予測実行
+
+        Args:
+            features: 特徴量行列 (N, F)
+
+        Returns:
+            np.ndarray: 予測値 (N,)
+        """
+        return features @ self.weights + self.intercept
+
+    def bind_layout(self, layout: FeatureLayout) -> None:
+        """
+        レイアウトに合わせて区名ブロックを区ごとの寄与テーブルに畳み込み
+
+        区名ブロック（One-hot 列 / ward_encoded 列）の寄与は区コードだけで決まるため、
+        区ごとの価格寄与を事前計算し、推論時は密な特徴量の内積 + テーブル参照にする。
+        末尾の要素は未知の区（寄与0）。
+
+        Args:
+            layout: 特徴量レイアウト
+        """
+        if layout.feature_count != self.feature_count:
+            raise ValueError(
+                f"Layout feature count {layout.feature_count} does not match kernel {self.feature_count}"
+            )
+        self.dense_weights = np.ascontiguousarray(self.weights[layout.dense_slots])
+        ward_bias = np.zeros(layout.unknown_ward_code + 1, dtype=self.dtype)
+        ward_bias[:-1] = self.weights[layout.ward_columns] * layout.ward_values
+        self.ward_bias = ward_bias
+
+        if self.baseline is not None:
+            baseline = np.asarray(self.baseline, dtype=np.float64)
+            ward_block = np.unique(layout.ward_columns)
+            self.dense_baseline = np.ascontiguousarray(baseline[layout.dense_slots], dtype=self.dtype)
+            self.ward_baseline = float(self.weights[ward_block] @ baseline[ward_block])
+
+    @property
+    def base_value(self) -> float:
+        """基準点（学習データの平均）での予測値"""
+        return self.intercept + float(self.weights @ np.asarray(self.baseline, dtype=np.float64))
+
+    def contributions_compact(self, dense: np.ndarray,
+                              ward_codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        特徴量ごとの価格寄与（bind_layout 済みで baseline を持つこと）
+
+        寄与は 重み × (値 - 学習データの平均) で、標準化後の空間では
+        係数 × 標準化値 に等しい。base_value と全寄与の和が予測値になる。
+        区名ブロックは区ごとの寄与テーブルから1つの寄与として求める。
+
+        Args:
+            dense: 区名ブロック以外の密な特徴量 (N, K)
+            ward_codes: 区コード (N,)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 密な特徴量の寄与 (N, K) と区名の寄与 (N,)
+        """
+        return (dense - self.dense_baseline) * self.dense_weights, self.ward_bias[ward_codes] - self.ward_baseline
+
+    def predict_compact(self, dense: np.ndarray, ward_codes: np.ndarray) -> np.ndarray:
+        """
+        コンパクト表現からの予測実行（bind_layout 済みであること）
+
+        Args:
+            dense: 区名ブロック以外の密な特徴量 (N, K)
+            ward_codes: 区コード (N,)
+
+        Returns:
+            np.ndarray: 予測値 (N,)
+        """
+        return dense @ self.dense_weights + self.ward_bias[ward_codes] + self.intercept
+
+
+class TreeEnsembleKernel:
+    """
+    勾配ブースティング木（HistGradientBoostingRegressor）をフラットな配列で評価する推論カーネル
+
+    全ての木のノードを分岐特徴量・閾値・左右の子・葉の値の配列に連結し、
+    バッチ全体 × 全ての木の現在ノードを (N, T) の配列として深さ方向に一斉に進める。
+    葉は自身を左右の子に持つため、最大深さ回の反復で全ての行が葉に到達する。
+    標準化は閾値を元の特徴量空間に逆変換して畳み込む。
+    """
+
+    INFERENCE_PATH = "tree_kernel"
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray,
+                 right: np.ndarray, value: np.ndarray, missing_left: np.ndarray,
+                 roots: np.ndarray, baseline: float, dtype: Any = np.float64):
+        """
+        カーネルの初期化
+
+        Args:
+            feature: 分岐に使う特徴量のインデックス (M,)（葉は0）
+            threshold: 元の特徴量空間での閾値 (M,)（値 <= 閾値 で左、葉は +inf）
+            left: 左の子のノード番号 (M,)（葉は自身）
+            right: 右の子のノード番号 (M,)（葉は自身）
+            value: 葉の値 (M,)（学習率を適用済み、分岐ノードは0）
+            missing_left: 欠損値を左に進めるか (M,)
+            roots: 各木の根のノード番号 (T,)
+            baseline: 初期予測値
+            dtype: 閾値・葉の値の精度
+        """
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=dtype)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=dtype)
+        self.missing_left = np.ascontiguousarray(missing_left, dtype=bool)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.baseline = float(baseline)
+        # 子ノード表（node * 2 + 左に進むか で右 / 左の子を引く）
+        self.children = np.ascontiguousarray(np.column_stack([self.right, self.left]).ravel())
+        self.depth = self._max_depth()
+        self.layout: Optional[FeatureLayout] = None
+
+    @classmethod
+    def from_arrays(cls, trees: Mapping[str, Any], mean: Optional[np.ndarray] = None,
+                    scale: Optional[np.ndarray] = None) -> "TreeEnsembleKernel":
+        """
+        フラット化した木（標準化後の特徴量空間）とスケーラーのパラメータからカーネルを生成
+
+        Args:
+            trees: flatten_tree_ensemble の結果
+            mean: スケーラーの平均 (F,)（None の場合は0）
+            scale: スケーラーの標準偏差 (F,)（None の場合は1）
+
+        Returns:
+            TreeEnsembleKernel: 閾値を畳み込み済みのカーネル
+        """
+        feature = np.asarray(trees['feature']).astype(np.intp)
+        threshold = np.asarray(trees['threshold'], dtype=np.float64)
+        if mean is not None or scale is not None:
+            feature_count = np.shape(mean if mean is not None else scale)[0]
+            mean = np.zeros(feature_count) if mean is None else np.asarray(mean, dtype=np.float64)
+            scale = np.ones(feature_count) if scale is None else np.asarray(scale, dtype=np.float64)
+            if mean.shape != scale.shape:
+                raise ValueError(f"Shape mismatch: mean={mean.shape}, scale={scale.shape}")
+            if feature.size and feature.max() >= feature_count:
+                raise ValueError(f"Tree feature index {feature.max()} exceeds {feature_count} features")
+            # z = (x - mean) / scale <= t ⇔ x <= t * scale + mean（scale > 0）
+            threshold = threshold * scale[feature] + mean[feature]
+
+        return cls(
+            feature, threshold, np.asarray(trees['left']).astype(np.intp),
+            np.asarray(trees['right']).astype(np.intp), trees['value'],
+            np.asarray(trees['missing_left']) != 0, np.asarray(trees['roots']).astype(np.intp),
+            trees['baseline']
+        )
+
+    def _max_depth(self) -> int:
+        """
+        根から最も深い葉までの分岐数
+        """
+        index = np.arange(self.left.shape[0])
+        frontier = self.roots
+        depth = 0
+        while True:
+            frontier = frontier[self.left[frontier] != index[frontier]]
+            if frontier.size == 0:
+                return depth
+            frontier = np.concatenate([self.left[frontier], self.right[frontier]])
+            depth += 1
+
+    @property
+    def tree_count(self) -> int:
+        """木の数 T"""
+        return self.roots.shape[0]
+
+    @property
+    def dtype(self) -> np.dtype:
+        """閾値の精度"""
+        return self.threshold.dtype
+
+    def astype(self, dtype: Any) -> "TreeEnsembleKernel":
+        """
+        閾値・葉の値を指定した精度に変換したカーネルを生成
+
+        Args:
+            dtype: 変換後の精度（np.float32 など）
+
+        Returns:
+            TreeEnsembleKernel: 変換後のカーネル（bind_layout 済みの状態を引き継ぐ）
+        """
+        kernel = TreeEnsembleKernel(
+            self.feature, self.threshold, self.left, self.right, self.value,
+            self.missing_left, self.roots, self.baseline, dtype=dtype
+        )
+        kernel.layout = self.layout
+        return kernel
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """
+        予測実行
+
+        Args:
+            features: 特徴量行列 (N, F)
+
+        Returns:
+            np.ndarray: 予測値 (N,)
+        """
+        count, feature_count = features.shape
+        # 2次元の添字参照より平坦化した配列の take の方が速い
+        flat = np.ascontiguousarray(features).ravel()
+        offsets = (np.arange(count) * feature_count)[:, None]
+        node = np.repeat(self.roots[None, :], count, axis=0)
+        for _ in range(self.depth):
+            values = flat.take(offsets + self.feature.take(node))
+            go_left = values <= self.threshold.take(node)
+            go_left |= np.isnan(values) & self.missing_left.take(node)
+            node = self.children.take(node * 2 + go_left)
+        return self.value.take(node).sum(axis=1) + self.baseline
+
+    def bind_layout(self, layout: FeatureLayout) -> None:
+        """
+        レイアウトの保持（分岐は任意の列を参照するため、推論時に特徴量行列へ展開する）
+
+        Args:
+            layout: 特徴量レイアウト
+        """
+        if self.feature.size and self.feature.max() >= layout.feature_count:
+            raise ValueError(
+                f"Tree feature index {self.feature.max()} exceeds layout feature count {layout.feature_count}"
+            )
+        self.layout = layout
+
+    def predict_compact(self, dense: np.ndarray, ward_codes: np.ndarray) -> np.ndarray:
+        """
+        コンパクト表現からの予測実行（bind_layout 済みであること）
+
+        Args:
+            dense: 区名ブロック以外の密な特徴量 (N, K)
+            ward_codes: 区コード (N,)
+
+        Returns:
+            np.ndarray: 予測値 (N,)
+        """
+        return self.predict(self.layout.expand(dense, ward_codes))
+
+
+class EnsembleKernel:
+    """
+    ブートストラップアンサンブル（K 個の線形回帰）を1つの重み行列に畳み込んだ推論カーネル
+
+    各レプリカの標準化 + 回帰を LinearKernel と同様に (F, K) の重み行列と (K,) の切片へ
+    まとめ、バッチ全体の K 個の予測を1回の行列積 (N, F) × (F, K) で求める。
+    """
+
+    def __init__(self, weights: np.ndarray, intercepts: np.ndarray):
+        """
+        カーネルの初期化
+
+        Args:
+            weights: 元の特徴量空間での実効重み (F, K)
+            intercepts: 実効切片 (K,)
+        """
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+        self.intercepts = np.ascontiguousarray(intercepts, dtype=np.float64)
+        self.dense_weights = None
+        self.ward_bias = None
+
+    @classmethod
+    def from_coefficients(cls, coef: np.ndarray, intercepts: np.ndarray,
+                          mean: Optional[np.ndarray] = None,
+                          scale: Optional[np.ndarray] = None) -> "EnsembleKernel":
+        """
+        レプリカの回帰係数とスケーラーのパラメータからカーネルを生成
+
+        Args:
+            coef: 標準化後の特徴量空間での回帰係数 (K, F)
+            intercepts: 切片 (K,)
+            mean: スケーラーの平均 (F,)（None の場合は0）
+            scale: スケーラーの標準偏差 (F,)（None の場合は1）
+
+        Returns:
+            EnsembleKernel: 畳み込み済みカーネル
+        """
+        coef = np.atleast_2d(np.asarray(coef, dtype=np.float64))
+        intercepts = np.asarray(intercepts, dtype=np.float64).ravel()
+        feature_count = coef.shape[1]
+        mean = np.zeros(feature_count) if mean is None else np.asarray(mean, dtype=np.float64)
+        scale = np.ones(feature_count) if scale is None else np.asarray(scale, dtype=np.float64)
+
+        if intercepts.shape != (coef.shape[0],) or not (mean.shape == scale.shape == (feature_count,)):
+            raise ValueError(
+                f"Shape mismatch: coef={coef.shape}, intercepts={intercepts.shape}, "
+                f"mean={mean.shape}, scale={scale.shape}"
+            )
+
+        weights = (coef / scale).T
+        return cls(weights, intercepts - mean @ weights)
+
+    @property
+    def feature_count(self) -> int:
+        """特徴量数"""
+        return self.weights.shape[0]
+
+    @property
+    def replicas(self) -> int:
+        """レプリカ数 K"""
+        return self.weights.shape[1]
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """
+        全レプリカの予測実行
+
+        Args:
+            features: 特徴量行列 (N, F)
+
+        Returns:
+            np.ndarray: 予測値 (N, K)
+        """
+        return features @ self.weights + self.intercepts
+
+    def bind_layout(self, layout: FeatureLayout) -> None:
+        """
+        レイアウトに合わせて区名ブロックを区 × レプリカの寄与テーブルに畳み込み
+
+        Args:
+            layout: 特徴量レイアウト
+        """
+        if layout.feature_count != self.feature_count:
+            raise ValueError(
+                f"Layout feature count {layout.feature_count} does not match kernel {self.feature_count}"
+            )
+        self.dense_weights = np.ascontiguousarray(self.weights[layout.dense_slots])
+        ward_bias = np.zeros((layout.unknown_ward_code + 1, self.replicas))
+        ward_bias[:-1] = self.weights[layout.ward_columns] * layout.ward_values[:, None]
+        self.ward_bias = ward_bias
+
+    def predict_compact(self, dense: np.ndarray, ward_codes: np.ndarray) -> np.ndarray:
+        """
+        コンパクト表現からの全レプリカの予測実行（bind_layout 済みであること）
+
+        Args:
+            dense: 区名ブロック以外の密な特徴量 (N, K_dense)
+            ward_codes: 区コード (N,)
+
+        Returns:
+            np.ndarray: 予測値 (N, K)
+        """
+        return dense @ self.dense_weights + self.ward_bias[ward_codes] + self.intercepts
+
+
+class IntervalKernel:
+    """
+    線形回帰の解析的な予測区間
+
+    学習時に保存した残差分散 σ² と係数共分散 σ² * C（標準化後の特徴量空間）から、
+    新しい入力の予測区間の半幅 t * σ * sqrt(1 + 1/n + zᵀ C z) を求める。
+    標準化 z = (x - center) / scale は C に畳み込み、推論時はバッチごとに
+    1回の二次形式で計算する。
+    """
+
+    def __init__(self, covariance: np.ndarray, center: np.ndarray, residual_variance: float,
+                 n_train: int, t_critical: float, level: float):
+        """
+        予測区間カーネルの初期化
+
+        Args:
+            covariance: 元の特徴量空間での係数共分散 / σ² (F, F)
+            center: 学習データの中心（元の特徴量空間） (F,)
+            residual_variance: 残差分散 σ²
+            n_train: 学習データ件数
+            t_critical: t 分布の両側臨界値
+            level: 信頼水準
+        """
+        self.covariance = np.ascontiguousarray(covariance, dtype=np.float64)
+        self.center = np.ascontiguousarray(center, dtype=np.float64)
+        self.residual_variance = float(residual_variance)
+        self.n_train = int(n_train)
+        self.t_critical = float(t_critical)
+        self.level = float(level)
+
+    @classmethod
+    def from_statistics(cls, stats: Dict[str, Any], mean: Optional[np.ndarray] = None,
+                        scale: Optional[np.ndarray] = None) -> "IntervalKernel":
+        """
+        学習時の統計量（compute_interval_statistics の結果）とスケーラーのパラメータから生成
+
+        Args:
+            stats: 予測区間の統計量
+            mean: スケーラーの平均 (F,)（None の場合は0）
+            scale: スケーラーの標準偏差 (F,)（None の場合は1）
+
+        Returns:
+            IntervalKernel: 予測区間カーネル
+        """
+        covariance = np.asarray(stats['covariance'], dtype=np.float64)
+        center = np.asarray(stats['center'], dtype=np.float64)
+        mean = np.zeros_like(center) if mean is None else np.asarray(mean, dtype=np.float64)
+        scale = np.ones_like(center) if scale is None else np.asarray(scale, dtype=np.float64)
+
+        feature_count = center.shape[0]
+        if covariance.shape != (feature_count, feature_count) or not (center.shape == mean.shape == scale.shape):
+            raise ValueError(
+                f"Shape mismatch: covariance={covariance.shape}, center={center.shape}, scale={scale.shape}"
+            )
+
+        # z - center = (x - (mean + scale * center)) / scale
+        return cls(
+            covariance / np.outer(scale, scale),
+            mean + scale * center,
+            stats['residual_variance'], stats['n_train'], stats['t_critical'], stats['level']
+        )
+
+    @property
+    def feature_count(self) -> int:
+        """特徴量数"""
+        return self.center.shape[0]
+
+    def half_width(self, features: np.ndarray) -> np.ndarray:
+        """
+        予測区間の半幅
+
+        Args:
+            features: 特徴量行列 (N, F)
+
+        Returns:
+            np.ndarray: 半幅 (N,)
+        """
+        diff = features - self.center
+        leverage = np.maximum(np.einsum('ij,ij->i', diff @ self.covariance, diff), 0.0)
+        return self.t_critical * np.sqrt(self.residual_variance * (1.0 + 1.0 / self.n_train + leverage))
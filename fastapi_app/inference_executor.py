@@ -0,0 +1,295 @@
+"""
+推論の実行器 - イベントループの外で推論を実行し、同時実行数と待ち行列を制限
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, Optional, List, Collection, Tuple
+
+from model_loader import ModelLoader
+from prediction_cache import PredictionCache
+
+# 待ち行列が満杯の場合の再試行間隔（秒、再試行ごとに倍にして上限まで）
+_RETRY_INITIAL_DELAY = 0.01
+_RETRY_MAX_DELAY = 0.5
+
+# プロセスモードのワーカーが保持する ModelLoader（(model_dir, 読み込み設定) -> (要求バージョン, ローダー)）
+_process_loaders: Dict[Tuple[str, tuple], Tuple[Optional[str], ModelLoader]] = {}
+
+
+def _call_in_process(model_dir: str, load_options: Dict[str, Any], model_version: Optional[str],
+                     method: str, args: tuple) -> Any:
+    """
+    ワーカープロセスで ModelLoader のメソッドを実行
+
+    ModelLoader はワーカーごとに一度だけ読み込み、親プロセスのモデルが
+    差し替えられてバージョンが変わった場合のみ読み込み直す。
+    """
+    key = (model_dir, tuple(sorted(load_options.items())))
+    cached = _process_loaders.get(key)
+    if cached is None or cached[0] != model_version:
+        loader = ModelLoader(model_dir=model_dir, **load_options)
+        if loader.model_version != model_version:
+            logging.getLogger(__name__).warning(
+                f"Worker loaded model version {loader.model_version}, expected {model_version}"
+            )
+        cached = _process_loaders[key] = (model_version, loader)
+    return getattr(cached[1], method)(*args)
+
+
+class InferenceQueueFullError(RuntimeError):
+    """
+    推論の待ち行列が上限に達したことを示す例外（503 として返す）
+    """
+
+
+class InferenceExecutor:
+    """
+    推論をスレッドプール・プロセスプールで実行するクラス
+
+    推論は同期処理のため、async エンドポイントから直接呼ぶと 100 件のバッチが
+    イベントループを止め、ヘルスチェックや単件予測が後ろで待たされる。
+    同時実行数を max_workers、実行待ちを max_queue 件までに制限し、
+    それを超える要求は InferenceQueueFullError で即座に拒否する。ストリーム・CSV などの
+    一括処理は queue_wait を指定し、空きが出るまで間隔を空けて再試行する（待ちの間は
+    待ち行列の枠を使わないため、単件予測が一括処理のために拒否されることはない）。
+
+    - thread: スレッドプール（NumPy の行列演算は GIL を解放する）
+    - process: プロセスプール（各ワーカーが model_dir からモデルを読み込む）
+    - inline: イベントループ上で直接実行（従来の動作）
+    """
+
+    MODES = ("thread", "process", "inline")
+
+    def __init__(self, mode: str = "thread", max_workers: Optional[int] = None, max_queue: int = 64):
+        """
+        実行器の初期化
+
+        Args:
+            mode: 実行方式（thread / process / inline）
+            max_workers: 同時実行数（省略時は CPU 数、最大 4）
+            max_queue: 実行待ちの最大件数
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown inference executor mode '{mode}', expected one of {self.MODES}")
+
+        self.logger = logging.getLogger(__name__)
+        self.mode = mode
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_queue = max(0, int(max_queue))
+
+        self._executor: Optional[Executor] = None
+        if mode == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        elif mode == "process":
+            # fork はイベントループ・スレッドの状態を引き継ぐため spawn で起動
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.retried = 0
+        self.logger.info(
+            f"Inference executor ready: mode={mode}, workers={self.max_workers}, queue={self.max_queue}"
+        )
+
+    @classmethod
+    def from_env(cls) -> "InferenceExecutor":
+        """
+        環境変数から設定を読み込んで生成
+
+        INFERENCE_EXECUTOR: 実行方式（thread / process / inline、デフォルト thread）
+        INFERENCE_WORKERS: 同時実行数（デフォルト 0 = CPU 数、最大 4）
+        INFERENCE_QUEUE_SIZE: 実行待ちの最大件数（デフォルト 64）
+        """
+        return cls(
+            mode=os.getenv('INFERENCE_EXECUTOR', 'thread').lower(),
+            max_workers=int(os.getenv('INFERENCE_WORKERS', '0')) or None,
+            max_queue=int(os.getenv('INFERENCE_QUEUE_SIZE', '64'))
+        )
+
+    async def submit(self, model_loader: ModelLoader, method: str, *args: Any, queue_wait: float = 0.0) -> Any:
+        """
+        ModelLoader のメソッドを実行器で実行
+
+        Args:
+            model_loader: モデルローダー
+            method: メソッド名（'predict' / 'predict_batch'）
+            *args: メソッドの引数
+            queue_wait: 待ち行列が満杯の場合に再試行する最大秒数（0 の場合は即座に拒否）
+
+        Returns:
+            Any: メソッドの戻り値
+        """
+        deadline = time.monotonic() + queue_wait
+        delay = _RETRY_INITIAL_DELAY
+        while self.active + self.queued >= self.max_workers + self.max_queue:
+            if time.monotonic() + delay > deadline:
+                self.rejected += 1
+                raise InferenceQueueFullError(
+                    f"Inference queue is full ({self.max_queue} waiting, {self.max_workers} running)"
+                )
+            self.retried += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _RETRY_MAX_DELAY)
+
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+
+        if self.mode == "inline":
+            try:
+                return getattr(model_loader, method)(*args)
+            finally:
+                self._release()
+
+        loop = asyncio.get_running_loop()
+        try:
+            if self.mode == "thread":
+                future: Future = self._executor.submit(getattr(model_loader, method), *args)
+            else:
+                future = self._executor.submit(
+                    _call_in_process, model_loader.model_dir, model_loader.load_options,
+                    model_loader.model_version, method, args
+                )
+        except Exception:
+            self._release()
+            raise
+        # 呼び出し側がキャンセルされても実行中の推論が終わるまで枠を解放しない
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._release) if not loop.is_closed() else None
+        )
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _release(self) -> None:
+        """
+        実行枠の解放
+        """
+        self.active -= 1
+        self.completed += 1
+        self._slots.release()
+
+    async def predict(self, model_loader: ModelLoader, request_data: Dict[str, Any],
+                      fields: Optional[Collection[str]] = None,
+                      cache: Optional[PredictionCache] = None) -> Dict[str, Any]:
+        """
+        単件予測（キャッシュ参照はイベントループ上で行い、ミス時のみ実行器で推論）
+
+        Args:
+            model_loader: モデルローダー
+            request_data: API リクエストデータ
+            fields: 結果に含める項目（省略時は全項目）
+            cache: 予測キャッシュ
+
+        Returns:
+            Dict[str, Any]: 予測結果
+        """
+        if cache is None or not cache.enabled:
+            return await self.submit(model_loader, 'predict', request_data, fields)
+
+        keys, results = cache.lookup(model_loader, [request_data], fields)
+        if results[0] is None:
+            results[0] = await self.submit(model_loader, 'predict', request_data, fields)
+            cache.store(model_loader, keys, results)
+        return results[0]
+
+    async def predict_batch(self, model_loader: ModelLoader, requests_data: List[Dict[str, Any]],
+                            fields: Optional[Collection[str]] = None,
+                            cache: Optional[PredictionCache] = None,
+                            queue_wait: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        バッチ予測（キャッシュに無い項目のみ実行器で一括推論）
+
+        Args:
+            model_loader: モデルローダー
+            requests_data: API リクエストデータのリスト
+            fields: 結果に含める項目（省略時は全項目）
+            cache: 予測キャッシュ
+            queue_wait: 待ち行列が満杯の場合に再試行する最大秒数
+
+        Returns:
+            List[Dict[str, Any]]: 入力順の予測結果リスト
+        """
+        if cache is None or not cache.enabled:
+            return await self.submit(model_loader, 'predict_batch', requests_data, fields, queue_wait=queue_wait)
+
+        keys, results = cache.lookup(model_loader, requests_data, fields)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = await self.submit(
+                model_loader, 'predict_batch', [requests_data[i] for i in missing], fields, queue_wait=queue_wait
+            )
+            for i, result in zip(missing, computed):
+                results[i] = result
+            cache.store(model_loader, [keys[i] for i in missing], computed)
+        return results
+
+    async def predict_grouped(self, model_loaders: List[ModelLoader], requests_data: List[Dict[str, Any]],
+                              fields: Optional[Collection[str]] = None,
+                              cache: Optional[PredictionCache] = None,
+                              queue_wait: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        要求ごとにモデルが異なるバッチ予測（モデルごとに一括推論し、入力順に戻す）
+
+        Args:
+            model_loaders: 要求ごとのモデルローダー
+            requests_data: API リクエストデータのリスト
+            fields: 結果に含める項目（省略時は全項目）
+            cache: 予測キャッシュ
+            queue_wait: 待ち行列が満杯の場合に再試行する最大秒数
+
+        Returns:
+            List[Dict[str, Any]]: 入力順の予測結果リスト
+        """
+        groups: Dict[int, List[int]] = {}
+        for i, model_loader in enumerate(model_loaders):
+            groups.setdefault(id(model_loader), []).append(i)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests_data)
+
+        async def run(indices: List[int]) -> None:
+            computed = await self.predict_batch(
+                model_loaders[indices[0]], [requests_data[i] for i in indices], fields, cache, queue_wait
+            )
+            for i, result in zip(indices, computed):
+                results[i] = result
+
+        await asyncio.gather(*(run(indices) for indices in groups.values()))
+        return results
+
+    def shutdown(self) -> None:
+        """
+        プールの停止（実行待ちの推論は破棄）
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        実行器の統計の取得
+
+        Returns:
+            Dict[str, Any]: 設定値・実行中/待ち件数・完了/拒否/再試行数
+        """
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "retried": self.retried
+        }
@@ -0,0 +1,638 @@
+"""
+非同期ジョブ - 大量の物件を HTTP 接続を保持せずに一定件数ごとに推論し、結果をページ単位で保存する
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, List, Collection, Callable, AsyncIterable, AsyncIterator, FrozenSet, Tuple
+
+from inference_executor import InferenceExecutor
+from job_store import JobStore
+from model_loader import ModelLoader
+from model_registry import ModelRegistry
+from model_shards import RegionShards
+from regions import TOKYO_23KU_WARDS
+from stream_predictor import StreamPredictor
+
+# 終了したジョブの状態
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+# 入力をストアに書き込む単位
+_INPUT_BLOCK_BYTES = 1 << 20
+
+# 期限切れのジョブを削除する間隔（秒）
+_PURGE_INTERVAL_SECONDS = 300
+
+
+class JobQueueFullError(RuntimeError):
+    """
+    ジョブの待ち行列が上限に達した（またはジョブが無効な）ことを示す例外（503 として返す）
+    """
+
+
+class JobManager:
+    """
+    NDJSON の入力をジョブとして受け付け、ワーカーが chunk_size 件ずつ推論して
+    結果をページ（1チャンク = 1ページ、/predict/stream と同じ NDJSON）として保存するクラス
+
+    各ジョブは専用スレッドの別のイベントループで読み込み・推論・結果の変換を行い、
+    予測キャッシュも使わないため、大量のジョブが /predict のイベントループ・実行枠・
+    キャッシュを占有することはない。同時に実行するジョブは max_running 件、
+    実行待ちは max_queued 件まで。
+
+    ストアの操作（ファイルロック・SQLite の書き込みロックを待つことがある）はワーカー
+    スレッドで行い、イベントループ上では実行しない。
+
+    ジョブは受け付けたプロセスが実行する。状態・キャンセル要求はストアに保存するため、
+    他のプロセス（uvicorn の --workers）からも参照・キャンセルできる。実行中のプロセスが
+    終了したジョブは、次に起動したプロセスが最初からやり直す。
+    """
+
+    def __init__(self, store: JobStore, model_registry: ModelRegistry,
+                 region_shards: Optional[RegionShards] = None, chunk_size: int = 1000,
+                 max_running: int = 1, max_queued: int = 100, max_input_bytes: int = 1 << 30,
+                 retention_hours: float = 24.0, max_line_bytes: int = 65536,
+                 wards: FrozenSet[str] = TOKYO_23KU_WARDS):
+        """
+        ジョブ管理の初期化
+
+        Args:
+            store: ジョブストア
+            model_registry: ジョブで使用するモデルのレジストリ
+            region_shards: 区名・市区町村コードで振り分ける地域シャード
+            chunk_size: 1回の一括推論の件数（結果1ページの件数）
+            max_running: 同時に実行するジョブ数（0 でジョブを無効化）
+            max_queued: 実行待ちの最大ジョブ数
+            max_input_bytes: 1ジョブの入力の最大バイト数
+            retention_hours: 終了したジョブを削除するまでの時間
+            max_line_bytes: 1行の最大バイト数（超えた行はエラー）
+            wards: 受け付ける区名の許可リスト（app.state.allowed_wards）
+        """
+        self.logger = logging.getLogger(__name__)
+        self.store = store
+        self.model_registry = model_registry
+        self.region_shards = region_shards
+        self.chunk_size = max(1, int(chunk_size))
+        self.max_line_bytes = max(1, int(max_line_bytes))
+        self.wards = wards
+        self.max_running = max(0, int(max_running))
+        self.max_queued = max(0, int(max_queued))
+        self.max_input_bytes = max(1, int(max_input_bytes))
+        self.retention = timedelta(hours=retention_hours)
+
+        # 実行中のジョブを保持するプロセス（ホスト名:PID）
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._purger: Optional[asyncio.Task] = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._stopping = threading.Event()
+        self._changed = asyncio.Event()
+
+        self.running = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rows = 0
+
+    @classmethod
+    def from_env(cls, model_registry: ModelRegistry, region_shards: Optional[RegionShards],
+                 wards: FrozenSet[str] = TOKYO_23KU_WARDS) -> "JobManager":
+        """
+        環境変数から設定を読み込んで生成
+
+        JOB_STORE / JOB_STORE_PATH: ジョブストア（JobStore.from_env を参照）
+        JOB_MAX_RUNNING: 同時に実行するジョブ数（デフォルト 1、0 でジョブを無効化）
+        JOB_MAX_QUEUED: 実行待ちの最大ジョブ数（デフォルト 100）
+        JOB_CHUNK_SIZE: 1回の一括推論の件数・1ページの件数（デフォルト 1000）
+        JOB_MAX_INPUT_BYTES: 1ジョブの入力の最大バイト数（デフォルト 1GiB）
+        JOB_RETENTION_HOURS: 終了したジョブを削除するまでの時間（デフォルト 24）
+
+        Args:
+            model_registry: モデルのレジストリ
+            region_shards: 地域シャード
+            wards: 受け付ける区名の許可リスト
+        """
+        return cls(
+            store=JobStore.from_env(),
+            model_registry=model_registry,
+            region_shards=region_shards,
+            chunk_size=int(os.getenv('JOB_CHUNK_SIZE', '1000')),
+            max_running=int(os.getenv('JOB_MAX_RUNNING', '1')),
+            max_queued=int(os.getenv('JOB_MAX_QUEUED', '100')),
+            max_input_bytes=int(os.getenv('JOB_MAX_INPUT_BYTES', str(1 << 30))),
+            retention_hours=float(os.getenv('JOB_RETENTION_HOURS', '24')),
+            max_line_bytes=int(os.getenv('STREAM_MAX_LINE_BYTES', '65536')),
+            wards=wards
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """
+        ジョブを受け付けるか（JOB_MAX_RUNNING=0 で無効）
+        """
+        return self.max_running > 0
+
+    async def start(self) -> None:
+        """
+        中断されたジョブの再開を行い、ワーカーと期限切れのジョブの定期削除を起動
+        """
+        if not self.enabled:
+            self.logger.info("Job queue is disabled (JOB_MAX_RUNNING=0)")
+            return
+        recovered, cancelled = await asyncio.to_thread(self._recover)
+        self.cancelled += cancelled
+        for job_id in recovered:
+            self._queue.put_nowait(job_id)
+        self._stopping.clear()
+        self._threads = ThreadPoolExecutor(max_workers=self.max_running, thread_name_prefix="job")
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.max_running)]
+        self._purger = asyncio.ensure_future(self._purge_periodically())
+        self.logger.info(
+            f"Job queue ready: {self.max_running} running, {self.max_queued} queued, "
+            f"chunk_size={self.chunk_size}"
+        )
+
+    async def stop(self) -> None:
+        """
+        ワーカーの停止（実行中のジョブは処理中のチャンクの完了後に中断し、次の起動時に最初からやり直す）
+        """
+        self._stopping.set()
+        tasks = self._workers + ([self._purger] if self._purger is not None else [])
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        self._purger = None
+        if self._threads is not None:
+            await asyncio.to_thread(self._threads.shutdown)
+            self._threads = None
+
+    async def submit(self, body: AsyncIterable[bytes], model_name: str,
+                     fields: Optional[Collection[str]] = None, use_shards: bool = False) -> Dict[str, Any]:
+        """
+        ジョブの受け付け（入力をストアに書き込み、実行待ちに追加）
+
+        Args:
+            body: NDJSON の入力（チャンク転送の断片で可）
+            model_name: 使用するモデル名（レジストリで解決済み）
+            fields: 結果に含める項目（省略時は全項目）
+            use_shards: 区名・市区町村コードで地域シャードに振り分けるか
+
+        Returns:
+            Dict[str, Any]: ジョブの状態
+
+        Raises:
+            JobQueueFullError: ジョブが無効・実行待ちが上限に達した
+            ValueError: 入力が max_input_bytes を超えた
+        """
+        if not self.enabled:
+            raise JobQueueFullError("Job queue is disabled")
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFullError(f"Job queue is full ({self.max_queued} waiting)")
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "uploading",
+            "owner": self.owner,
+            "model": model_name,
+            "model_version": self.model_registry.get(model_name).model_version,
+            "shards": use_shards,
+            "fields": None if fields is None else sorted(fields),
+            "page_size": self.chunk_size,
+            "input_bytes": 0,
+            "total_rows": None,
+            "processed_rows": 0,
+            "failed_rows": 0,
+            "pages": 0,
+            "cancel_requested": False,
+            "error": None,
+            "created_at": self._now(),
+            "started_at": None,
+            "finished_at": None
+        }
+        await asyncio.to_thread(self.store.create, job)
+
+        size = 0
+        buffer = bytearray()
+        try:
+            async for data in body:
+                size += len(data)
+                if size > self.max_input_bytes:
+                    raise ValueError(f"Job input exceeds {self.max_input_bytes} bytes")
+                buffer += data
+                if len(buffer) >= _INPUT_BLOCK_BYTES:
+                    await asyncio.to_thread(self.store.append_input, job_id, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(self.store.append_input, job_id, bytes(buffer))
+        except BaseException:
+            await asyncio.to_thread(self.store.delete, job_id)
+            raise
+
+        queued = await asyncio.to_thread(
+            self.store.update, job_id, {"status": "queued", "input_bytes": size}, expected={"status": "uploading", "cancel_requested": False}
+        )
+        self.submitted += 1
+        if queued is None:
+            # 受信中にキャンセルされた
+            return self.describe(await self._finish(job_id, "cancelled"))
+
+        self._queue.put_nowait(job_id)
+        self._notify()
+        self.logger.info(f"Job {job_id} queued: {size} bytes, model={model_name}")
+        return self.describe(queued)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        ジョブの状態の取得（存在しない場合は None）
+        """
+        job = await asyncio.to_thread(self.store.get, job_id)
+        return None if job is None else self.describe(job)
+
+    async def list(self) -> List[Dict[str, Any]]:
+        """
+        全ジョブの状態の取得（新しい順）
+        """
+        jobs = sorted(await asyncio.to_thread(self.store.list), key=lambda job: job['created_at'], reverse=True)
+        return [self.describe(job) for job in jobs]
+
+    async def cancel(self, job_id: str) -> Dict[str, Any]:
+        """
+        ジョブのキャンセル（実行待ちは即座に、実行中は処理中のチャンクの完了後に停止）
+
+        Args:
+            job_id: ジョブ ID
+
+        Returns:
+            Dict[str, Any]: ジョブの状態
+
+        Raises:
+            KeyError: ジョブが存在しない
+        """
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job['status'] in TERMINAL_STATUSES:
+            return self.describe(job)
+
+        cancelled = await asyncio.to_thread(
+            self.store.update, job_id, {"status": "cancelled", "cancel_requested": True, "finished_at": self._now()},
+            expected={"status": "queued"}
+        )
+        if cancelled is not None:
+            self.cancelled += 1
+            self.logger.info(f"Job {job_id} cancelled before start")
+        else:
+            cancelled = await asyncio.to_thread(self.store.update, job_id, {"cancel_requested": True}) or job
+        self._notify()
+        return self.describe(cancelled)
+
+    async def delete(self, job_id: str) -> None:
+        """
+        終了したジョブの削除
+
+        Raises:
+            KeyError: ジョブが存在しない
+            ValueError: ジョブが終了していない
+        """
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job['status'] not in TERMINAL_STATUSES:
+            raise ValueError(f"Job is {job['status']}, cancel it before deleting")
+        await asyncio.to_thread(self.store.delete, job_id)
+
+    async def read_page(self, job_id: str, page: int) -> Optional[bytes]:
+        """
+        結果ページの取得（未作成のページは None）
+
+        Raises:
+            KeyError: ジョブが存在しない
+        """
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if not 0 <= page < job['pages']:
+            return None
+        return await asyncio.to_thread(self.store.read_page, job_id, page)
+
+    async def watch(self, job_id: str, heartbeat: float = 15.0,
+                    poll_interval: float = 1.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        ジョブの状態が変わるたびに返す（終了した時点で終わる）
+
+        このプロセスで実行中のジョブは更新時に、他のプロセスのジョブは poll_interval ごとに
+        ストアを参照して検知する。
+
+        Args:
+            job_id: ジョブ ID
+            heartbeat: 変化が無い場合に None を返す間隔（接続維持用）
+            poll_interval: ストアを参照する間隔
+
+        Yields:
+            Optional[Dict[str, Any]]: ジョブの状態（接続維持の場合は None）
+        """
+        last = None
+        last_sent = time.monotonic()
+        while True:
+            changed = self._changed
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is None:
+                return
+            if job != last:
+                last = job
+                last_sent = time.monotonic()
+                yield self.describe(job)
+            if job['status'] in TERMINAL_STATUSES:
+                return
+
+            try:
+                await asyncio.wait_for(changed.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            if time.monotonic() - last_sent >= heartbeat:
+                last_sent = time.monotonic()
+                yield None
+
+    @staticmethod
+    def describe(job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        API で返すジョブの状態（実行プロセスを除き、進捗率を追加）
+        """
+        described = {key: value for key, value in job.items() if key != 'owner'}
+        total = job.get('total_rows')
+        if job['status'] == 'succeeded':
+            described['progress'] = 1.0
+        elif total:
+            described['progress'] = min(1.0, job['processed_rows'] / total)
+        else:
+            described['progress'] = 0.0 if total is None else 1.0
+        return described
+
+    async def _worker(self) -> None:
+        """
+        実行待ちのジョブを1件ずつ実行
+        """
+        while True:
+            job_id = await self._queue.get()
+            self.running += 1
+            try:
+                await self._run(job_id)
+            finally:
+                self.running -= 1
+
+    async def _run(self, job_id: str) -> None:
+        """
+        ジョブの実行（実行権を取得し、チャンクの処理はジョブ専用スレッドで行う）
+        """
+        job = await asyncio.to_thread(
+            self.store.update, job_id, {"status": "running", "started_at": self._now()},
+            expected={"status": "queued", "owner": self.owner}
+        )
+        if job is None:
+            # 実行待ちの間にキャンセル・削除された
+            return
+        self._notify()
+        self.logger.info(f"Job {job_id} started")
+
+        try:
+            model_loader = self.model_registry.get(job['model'])
+        except KeyError:
+            self.logger.error(f"Job {job_id} failed: unknown model {job['model']}")
+            await self._finish(job_id, "failed", f"Unknown model: {job['model']}")
+            return
+
+        loop = asyncio.get_running_loop()
+        try:
+            status = await loop.run_in_executor(self._threads, self._execute, job, model_loader, loop)
+        except Exception as e:
+            self.logger.error(f"Job {job_id} failed: {e}")
+            await self._finish(job_id, "failed", str(e))
+            return
+        if status is not None:
+            await self._finish(job_id, status)
+
+    def _execute(self, job: Dict[str, Any], model_loader: ModelLoader,
+                 loop: asyncio.AbstractEventLoop) -> Optional[str]:
+        """
+        ジョブ専用スレッドでの実行（このスレッドのイベントループで推論し、/predict のイベントループを使わない）
+
+        Returns:
+            Optional[str]: 終了時の状態（停止中で中断した場合は None）
+        """
+        def notify() -> None:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._notify)
+
+        def count_rows(rows: int) -> None:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._count_rows_processed, rows)
+
+        return asyncio.run(self._process(job, model_loader, notify, count_rows))
+
+    async def _process(self, job: Dict[str, Any], model_loader: ModelLoader,
+                       notify: Callable[[], None], count_rows: Callable[[int], None]) -> Optional[str]:
+        """
+        入力を chunk_size 件ずつ推論して結果ページを保存し、チャンクごとにキャンセル要求を確認
+
+        統計（処理件数）の更新と watch への通知は notify / count_rows 経由で /predict のイベントループに渡す
+        """
+        job_id = job['job_id']
+        shards = self.region_shards if job['shards'] else None
+        fields = None if job['fields'] is None else frozenset(job['fields'])
+        self.store.update(job_id, {"total_rows": self._count_rows(job_id),
+                                   "model_version": model_loader.model_version})
+        notify()
+
+        # スレッド内で直接推論する（ジョブ同士・/predict と実行枠を共有しない）
+        predictor = StreamPredictor(InferenceExecutor(mode="inline", max_workers=1),
+                                    chunk_size=self.chunk_size, max_line_bytes=self.max_line_bytes,
+                                    wards=self.wards)
+        processed = failed = pages = 0
+        chunks = predictor.predict_chunks(self._read_input(job_id), model_loader, fields, None, shards)
+        try:
+            async for payload, rows, chunk_failed in chunks:
+                self.store.write_page(job_id, pages, payload)
+                pages += 1
+                processed += rows
+                failed += chunk_failed
+                count_rows(rows)
+                updated = self.store.update(job_id, {"processed_rows": processed, "failed_rows": failed, "pages": pages})
+                notify()
+                if updated is None or updated['cancel_requested']:
+                    self.logger.info(f"Job {job_id} cancelled after {processed} rows")
+                    return "cancelled"
+                if self._stopping.is_set():
+                    self.logger.info(f"Job {job_id} interrupted after {processed} rows")
+                    return None
+        finally:
+            await chunks.aclose()
+
+        self.logger.info(f"Job {job_id} succeeded: {processed} rows, {failed} failed")
+        return "succeeded"
+
+    async def _read_input(self, job_id: str) -> AsyncIterator[bytes]:
+        """
+        ストアの入力の読み込み（ジョブ専用スレッドのため直接読む）
+        """
+        for block in self.store.read_input(job_id):
+            yield block
+
+    def _count_rows(self, job_id: str) -> int:
+        """
+        入力の空行以外の行数（進捗率の分母）
+        """
+        rows = 0
+        carry = b""
+        for block in self.store.read_input(job_id):
+            lines = (carry + block).split(b"\n")
+            carry = lines.pop()
+            rows += sum(1 for line in lines if line.strip())
+            if len(carry) > self.max_line_bytes:
+                # 改行が届かないまま上限を超えた行も1行（エラー行）として数える
+                carry = b"-"
+        return rows + (1 if carry.strip() else 0)
+
+    async def _finish(self, job_id: str, status: str, error: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        ジョブの終了（状態・終了時刻の保存と待機中の watch への通知）
+        """
+        if status == "succeeded":
+            self.succeeded += 1
+        elif status == "failed":
+            self.failed += 1
+        else:
+            self.cancelled += 1
+        job = await asyncio.to_thread(
+            self.store.update, job_id, {"status": status, "error": error, "finished_at": self._now()}
+        )
+        self._notify()
+        return job
+
+    def _count_rows_processed(self, rows: int) -> None:
+        """
+        処理件数の加算（イベントループ上でのみ呼ぶ）
+        """
+        self.rows += rows
+
+    def _notify(self) -> None:
+        """
+        待機中の watch を起こす
+        """
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _recover(self) -> Tuple[List[str], int]:
+        """
+        終了したプロセスが実行していたジョブを引き取って最初からやり直す（ワーカースレッドで実行）
+
+        Returns:
+            Tuple[List[str], int]: キューに戻すジョブIDと、キャンセル済みとして終了したジョブ数
+        """
+        recovered_ids: List[str] = []
+        cancelled = 0
+        for job in self.store.list():
+            if job['status'] in TERMINAL_STATUSES or self._owner_alive(job['owner']):
+                continue
+            if job['status'] == 'uploading':
+                # 入力を受信し終える前に中断されたジョブは再開できない
+                self.store.delete(job['job_id'])
+                continue
+
+            recovered = self.store.update(
+                job['job_id'],
+                {"status": "queued", "owner": self.owner, "processed_rows": 0, "failed_rows": 0, "pages": 0,
+                 "started_at": None},
+                expected={"status": job['status'], "owner": job['owner']}
+            )
+            if recovered is None:
+                continue
+            if recovered['cancel_requested']:
+                self.store.update(recovered['job_id'], {"status": "cancelled", "finished_at": self._now()})
+                cancelled += 1
+            else:
+                recovered_ids.append(recovered['job_id'])
+                self.logger.info(f"Job {recovered['job_id']} recovered from {job['owner']}")
+        return recovered_ids, cancelled
+
+    @staticmethod
+    def _owner_alive(owner: str) -> bool:
+        """
+        ジョブを実行しているプロセスが稼働中か（起動時のみ使用、他のホストのプロセスは稼働中とみなす）
+        """
+        host, _, pid = owner.rpartition(':')
+        if host != socket.gethostname():
+            return True
+        if int(pid) == os.getpid():
+            # 起動時点のこのプロセスは何も実行していないため、再起動前に同じ PID だったプロセス
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    async def _purge_periodically(self) -> None:
+        """
+        期限切れのジョブの定期削除（起動時と _PURGE_INTERVAL_SECONDS ごと）
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self._purge)
+            except Exception as e:
+                self.logger.error(f"Failed to purge expired jobs: {e}")
+            await asyncio.sleep(_PURGE_INTERVAL_SECONDS)
+
+    def _purge(self) -> None:
+        """
+        retention を過ぎた終了済みのジョブの削除（ワーカースレッドで実行）
+        """
+        expires = (datetime.now(timezone.utc) - self.retention).isoformat(timespec='seconds')
+        for job in self.store.list():
+            if job['status'] in TERMINAL_STATUSES and (job['finished_at'] or '') < expires:
+                self.store.delete(job['job_id'])
+                self.logger.info(f"Job {job['job_id']} expired")
+
+    @staticmethod
+    def _now() -> str:
+        """
+        現在時刻（UTC, ISO 8601）
+        """
+        return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ジョブ管理の統計の取得
+
+        Returns:
+            Dict[str, Any]: 設定値・実行中/待ちジョブ数・終了ジョブ数・処理行数
+        """
+        return {
+            "enabled": self.enabled,
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+            "chunk_size": self.chunk_size,
+            "running": self.running,
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "rows": self.rows
+        }
@@ -0,0 +1,317 @@
+"""
+ジョブストア - 非同期ジョブのメタデータ・入力・結果ページの保存先（ローカルファイル / SQLite）
+"""
+
+import fcntl
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Iterator
+
+import orjson
+
+# ジョブ ID の形式（uuid4 の16進表記、パスに使うため他の文字は受け付けない）
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class JobStore(ABC):
+    """
+    ジョブストアの共通インターフェース（全メソッドを実装しないサブクラスは生成できない）
+
+    メタデータは dict（JSON に変換できる値のみ）で保存する。update は expected に
+    指定した項目が一致する場合のみ更新する比較交換で、複数プロセス（uvicorn の
+    --workers）が同じストアを共有しても実行権の取得・キャンセル要求が競合しない。
+    """
+
+    @abstractmethod
+    def create(self, job: Dict[str, Any]) -> None:
+        """
+        ジョブの作成
+
+        Args:
+            job: メタデータ（job_id を含む）
+        """
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        ジョブのメタデータの取得（存在しない場合は None）
+        """
+
+    @abstractmethod
+    def update(self, job_id: str, changes: Dict[str, Any],
+               expected: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        メタデータの更新
+
+        Args:
+            job_id: ジョブ ID
+            changes: 更新する項目
+            expected: 更新の条件（現在の値と一致する場合のみ更新）
+
+        Returns:
+            Optional[Dict[str, Any]]: 更新後のメタデータ（ジョブが無い・条件が一致しない場合は None）
+        """
+
+    @abstractmethod
+    def list(self) -> List[Dict[str, Any]]:
+        """
+        全ジョブのメタデータの取得
+        """
+
+    @abstractmethod
+    def delete(self, job_id: str) -> None:
+        """
+        ジョブのメタデータ・入力・結果の削除
+        """
+
+    @abstractmethod
+    def append_input(self, job_id: str, data: bytes) -> None:
+        """
+        入力（NDJSON）の追記
+        """
+
+    @abstractmethod
+    def read_input(self, job_id: str) -> Iterator[bytes]:
+        """
+        入力を先頭から断片ごとに読み込む
+        """
+
+    @abstractmethod
+    def write_page(self, job_id: str, page: int, data: bytes) -> None:
+        """
+        結果ページ（NDJSON）の書き込み（同じページは上書き）
+        """
+
+    @abstractmethod
+    def read_page(self, job_id: str, page: int) -> Optional[bytes]:
+        """
+        結果ページの読み込み（存在しない場合は None）
+        """
+
+    @staticmethod
+    def from_env() -> "JobStore":
+        """
+        環境変数から設定を読み込んで生成
+
+        JOB_STORE: 保存先（file / sqlite、デフォルト file）
+        JOB_STORE_PATH: 保存先のディレクトリ・データベースファイル（デフォルト ./jobs・./jobs.sqlite3）
+        """
+        kind = os.getenv('JOB_STORE', 'file').lower()
+        if kind == 'file':
+            return FileJobStore(os.getenv('JOB_STORE_PATH', './jobs'))
+        if kind == 'sqlite':
+            return SQLiteJobStore(os.getenv('JOB_STORE_PATH', './jobs.sqlite3'))
+        raise ValueError(f"Unknown job store '{kind}', expected one of ('file', 'sqlite')")
+
+
+class FileJobStore(JobStore):
+    """
+    ローカルファイルのジョブストア
+
+    <root>/<job_id>/ に job.json（メタデータ）・input.ndjson（入力）・
+    pages/<番号>.ndjson（結果ページ）を保存する。メタデータ・ページは一時ファイルに
+    書いてから置き換え、更新はストア全体のファイルロックで直列化する。
+    """
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: 保存先のディレクトリ
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock_path = os.path.join(root, '.lock')
+
+    def _dir(self, job_id: str) -> str:
+        """
+        ジョブのディレクトリ（不正なジョブ ID は KeyError）
+        """
+        if not _JOB_ID.match(job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.root, job_id)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """
+        ストア全体の排他ロック（プロセス間）
+        """
+        with open(self._lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        """
+        一時ファイルに書いてから置き換え（読み込み側が書きかけのファイルを読まない）
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        job.json の読み込み（存在しない場合は None）
+        """
+        try:
+            with open(os.path.join(self._dir(job_id), 'job.json'), 'rb') as f:
+                return orjson.loads(f.read())
+        except (KeyError, FileNotFoundError):
+            return None
+
+    def create(self, job: Dict[str, Any]) -> None:
+        job_dir = self._dir(job['job_id'])
+        os.makedirs(os.path.join(job_dir, 'pages'))
+        self._write_atomic(os.path.join(job_dir, 'job.json'), orjson.dumps(job))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._read_job(job_id)
+
+    def update(self, job_id: str, changes: Dict[str, Any],
+               expected: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._locked():
+            job = self._read_job(job_id)
+            if job is None or any(job.get(key) != value for key, value in (expected or {}).items()):
+                return None
+            job.update(changes)
+            self._write_atomic(os.path.join(self._dir(job_id), 'job.json'), orjson.dumps(job))
+            return job
+
+    def list(self) -> List[Dict[str, Any]]:
+        jobs = []
+        for name in os.listdir(self.root):
+            if _JOB_ID.match(name):
+                job = self._read_job(name)
+                if job is not None:
+                    jobs.append(job)
+        return jobs
+
+    def delete(self, job_id: str) -> None:
+        shutil.rmtree(self._dir(job_id), ignore_errors=True)
+
+    def append_input(self, job_id: str, data: bytes) -> None:
+        with open(os.path.join(self._dir(job_id), 'input.ndjson'), 'ab') as f:
+            f.write(data)
+
+    def read_input(self, job_id: str) -> Iterator[bytes]:
+        try:
+            f = open(os.path.join(self._dir(job_id), 'input.ndjson'), 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            while True:
+                data = f.read(65536)
+                if not data:
+                    return
+                yield data
+
+    def write_page(self, job_id: str, page: int, data: bytes) -> None:
+        self._write_atomic(os.path.join(self._dir(job_id), 'pages', f"{page:06d}.ndjson"), data)
+
+    def read_page(self, job_id: str, page: int) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self._dir(job_id), 'pages', f"{page:06d}.ndjson"), 'rb') as f:
+                return f.read()
+        except (KeyError, FileNotFoundError):
+            return None
+
+
+class SQLiteJobStore(JobStore):
+    """
+    SQLite のジョブストア
+
+    メタデータは JSON、入力の断片・結果ページは BLOB として1つのデータベースファイルに
+    保存する。WAL モードのため読み込みは書き込みを待たない。
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: データベースファイル
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, data BLOB NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS inputs (job_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+                "data BLOB NOT NULL, PRIMARY KEY (job_id, seq))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages (job_id TEXT NOT NULL, page INTEGER NOT NULL, "
+                "data BLOB NOT NULL, PRIMARY KEY (job_id, page))"
+            )
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """
+        1文の実行（接続はスレッド間で共有するためロックで直列化）
+        """
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def create(self, job: Dict[str, Any]) -> None:
+        self._query("INSERT INTO jobs (job_id, data) VALUES (?, ?)", (job['job_id'], orjson.dumps(job)))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT data FROM jobs WHERE job_id = ?", (job_id,))
+        return orjson.loads(rows[0][0]) if rows else None
+
+    def update(self, job_id: str, changes: Dict[str, Any],
+               expected: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            # 読み込みから書き込みまでを1トランザクションにして他プロセスの更新と直列化
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchall()
+                job = orjson.loads(rows[0][0]) if rows else None
+                if job is None or any(job.get(key) != value for key, value in (expected or {}).items()):
+                    self._conn.execute("ROLLBACK")
+                    return None
+                job.update(changes)
+                self._conn.execute("UPDATE jobs SET data = ? WHERE job_id = ?", (orjson.dumps(job), job_id))
+                self._conn.execute("COMMIT")
+                return job
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [orjson.loads(data) for (data,) in self._query("SELECT data FROM jobs")]
+
+    def delete(self, job_id: str) -> None:
+        for table in ('inputs', 'pages', 'jobs'):
+            self._query(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+
+    def append_input(self, job_id: str, data: bytes) -> None:
+        self._query(
+            "INSERT INTO inputs (job_id, seq, data) "
+            "SELECT ?, COALESCE(MAX(seq) + 1, 0), ? FROM inputs WHERE job_id = ?",
+            (job_id, data, job_id)
+        )
+
+    def read_input(self, job_id: str) -> Iterator[bytes]:
+        # 断片を1つずつ読み込み、入力全体をメモリに載せない
+        for (seq,) in self._query("SELECT seq FROM inputs WHERE job_id = ? ORDER BY seq", (job_id,)):
+            rows = self._query("SELECT data FROM inputs WHERE job_id = ? AND seq = ?", (job_id, seq))
+            if rows:
+                yield rows[0][0]
+
+    def write_page(self, job_id: str, page: int, data: bytes) -> None:
+        self._query("INSERT OR REPLACE INTO pages (job_id, page, data) VALUES (?, ?, ?)", (job_id, page, data))
+
+    def read_page(self, job_id: str, page: int) -> Optional[bytes]:
+        rows = self._query("SELECT data FROM pages WHERE job_id = ? AND page = ?", (job_id, page))
+        return rows[0][0] if rows else None
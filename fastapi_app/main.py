@@ -5,16 +5,32 @@
 import os
 import logging
 from contextlib import asynccontextmanager
-from typing import Dict, Any
+from typing import Dict, Any, Optional, FrozenSet
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, status, Depends, Request, Response, UploadFile, File, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import uvicorn
+from fastapi.responses import JSONResponse, StreamingResponse
 from mangum import Mangum
 
-from predict_schema import PredictRequest, PredictResponse, ErrorResponse
+from predict_schema import PredictRequest, PredictResponse, ErrorResponse, ColumnarPredictRequest
+from model_types import ColumnarPredictResponse
 from model_loader import ModelLoader
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache, deduplicate
+from inference_executor import InferenceExecutor, InferenceQueueFullError
+from micro_batcher import MicroBatcher
+from stream_predictor import StreamPredictor, NDJSONStreamingResponse
+from columnar_batch import ColumnarPredictor, ColumnarBodyTooLargeError, ARROW_MEDIA_TYPE
+from csv_predictor import CSVPredictor, content_disposition
+from job_manager import JobManager
+from fast_response import FastJSONResponse, prediction_content, batch_content
+from model_shards import RegionShards
+from regions import build_allowed_wards
+from dependencies import (
+    get_model_loader, get_result_fields, model_headers, get_region_shards, route_to_shards,
+    WardValidationMiddleware
+)
+from routers import admin, jobs
 
 # ロギング設定
 logging.basicConfig(
@@ -24,7 +40,16 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # グローバル変数
-model_loader = None
+model_registry = None
+region_shards = None
+allowed_wards = None
+inference_executor = None
+micro_batcher = None
+stream_predictor = None
+columnar_predictor = None
+csv_predictor = None
+job_manager = None
+prediction_cache = PredictionCache.from_env()
 
 
 @asynccontextmanager
@@ -32,15 +57,60 @@ async def lifespan(app: FastAPI):
     """
     アプリケーションライフサイクル管理
     """
-    global model_loader
+    global model_registry, region_shards, allowed_wards, inference_executor, micro_batcher, stream_predictor, columnar_predictor, csv_predictor, job_manager
+    
+    def activate_model(name: str, loader: ModelLoader, previous: Optional[ModelLoader]) -> None:
+        """
+        モデル差し替え時に旧バージョンのキャッシュを破棄（処理中のリクエストは旧モデルを継続使用）
+        """
+        if previous is not None and previous.model_version != loader.model_version:
+            prediction_cache.invalidate_version(previous.model_version)
     
     # 起動時処理
     logger.info("Starting Real Estate Appraisal API...")
     
     try:
-        # モデル読み込み
-        model_loader = ModelLoader()
-        logger.info("Model loaded successfully")
+        # モデル読み込み（以降は /admin/reload・SIGHUP・ファイル監視で再読み込み）
+        model_registry = ModelRegistry.from_env(on_swap=activate_model)
+        app.state.model_registry = model_registry
+        app.state.prediction_cache = prediction_cache
+        
+        # 地域ごとのモデル（初回使用時に読み込み、preload の地域のみ起動時に読み込む）
+        region_shards = RegionShards.from_env(load_options=model_registry.get().load_options)
+        if region_shards is not None:
+            region_shards.preload()
+        app.state.region_shards = region_shards
+        
+        # 予測リクエストで受け付ける区名（東京23区と地域シャードの区名）
+        allowed_wards = build_allowed_wards(region_shards.wards if region_shards is not None else ())
+        app.state.allowed_wards = allowed_wards
+        
+        # 推論はイベントループの外で実行（同時実行数・待ち行列を制限）
+        inference_executor = InferenceExecutor.from_env()
+        app.state.inference_executor = inference_executor
+        
+        # 同時に届いた単件予測を1回のバッチ推論にまとめる
+        micro_batcher = MicroBatcher.from_env(inference_executor)
+        app.state.micro_batcher = micro_batcher
+        
+        # /predict/stream の入力を一定件数ごとに一括推論
+        stream_predictor = StreamPredictor.from_env(inference_executor, allowed_wards)
+        app.state.stream_predictor = stream_predictor
+        
+        # /predict/columns の列形式の入力を配列演算で検証して一括推論
+        columnar_predictor = ColumnarPredictor.from_env(inference_executor)
+        app.state.columnar_predictor = columnar_predictor
+        
+        # /predict/csv のアップロードを一定行数ごとに一括推論
+        csv_predictor = CSVPredictor.from_env(inference_executor, allowed_wards)
+        app.state.csv_predictor = csv_predictor
+        
+        # /jobs の大量予測をジョブ専用の実行器でバックグラウンド実行
+        job_manager = JobManager.from_env(model_registry, region_shards, allowed_wards)
+        app.state.job_manager = job_manager
+        model_registry.start()
+        await job_manager.start()
+        logger.info(f"Models loaded successfully: {model_registry.names}")
         
         yield
         
@@ -50,6 +120,9 @@ async def lifespan(app: FastAPI):
     
     # 終了時処理
     logger.info("Shutting down Real Estate Appraisal API...")
+    await job_manager.stop()
+    await model_registry.stop()
+    inference_executor.shutdown()
 
 
 # FastAPIアプリケーション作成
@@ -68,10 +141,20 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,  # 環境変数で制御
     allow_credentials=True,
-    allow_methods=["GET", "POST"],  # 必要なメソッドのみ許可
-    allow_headers=["Content-Type", "Authorization"],  # 必要なヘッダーのみ
+    allow_methods=["GET", "POST", "DELETE"],  # 必要なメソッドのみ許可（DELETE はジョブの削除）
+    allow_headers=["Content-Type", "Authorization", "X-Model-Name"],  # 必要なヘッダーのみ
+    expose_headers=["X-Model-Name", "X-Model-Version", "Location", "X-Page-Count", "X-Job-Status"],
 )
 
+# リクエストボディの区名を起動時の許可リストで検証
+app.add_middleware(WardValidationMiddleware)
+
+# 管理用エンドポイント（モデル再読み込み）
+app.include_router(admin.router)
+
+# 非同期ジョブのエンドポイント（投入・進捗・結果のダウンロード・キャンセル）
+app.include_router(jobs.router)
+
 
 @app.get("/")
 async def root():
@@ -90,9 +173,9 @@ async def health_check():
     """
     ヘルスチェックエンドポイント
     """
-    global model_loader
+    global model_registry
     
-    if model_loader is None or not model_loader.is_loaded():
+    if model_registry is None or not model_registry.get().is_loaded():
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Model not loaded"
@@ -101,7 +184,16 @@ async def health_check():
     return {
         "status": "healthy",
         "model_loaded": True,
-        "model_info": model_loader.get_model_info()
+        "model_info": model_registry.get().get_model_info(),
+        "models": model_registry.get_status(),
+        "prediction_cache": prediction_cache.get_stats(),
+        "inference_executor": inference_executor.get_stats(),
+        "micro_batcher": micro_batcher.get_stats(),
+        "stream_predictor": stream_predictor.get_stats(),
+        "columnar_predictor": columnar_predictor.get_stats(),
+        "csv_predictor": csv_predictor.get_stats(),
+        "job_manager": job_manager.get_stats(),
+        "region_shards": region_shards.get_status() if region_shards is not None else None
     }
 
 
@@ -111,49 +203,49 @@ async def health_check():
     responses={
         200: {"model": PredictResponse, "description": "Successful prediction"},
         400: {"model": ErrorResponse, "description": "Invalid input data"},
+        404: {"model": ErrorResponse, "description": "Unknown model"},
         503: {"model": ErrorResponse, "description": "Service unavailable"}
     }
 )
-async def predict_price(request: PredictRequest):
+async def predict_price(request: PredictRequest, response: Response,
+                        model_loader: ModelLoader = Depends(get_model_loader),
+                        fields: Optional[FrozenSet[str]] = Depends(get_result_fields),
+                        shards: Optional[RegionShards] = Depends(get_region_shards)):
     """
     不動産価格予測エンドポイント
     
     Args:
         request: 予測リクエストデータ
+        response: FastAPIレスポンスオブジェクト
+        model_loader: 使用するモデル（?model= / X-Model-Name で選択、省略時はデフォルト）
+        fields: 返す項目（?fields= / ?lean=true で指定、省略時は全項目）
+        shards: 区名・市区町村コードで振り分ける地域シャード（モデル指定時は使用しない）
         
     Returns:
-        PredictResponse: 予測結果
+        PredictResponse: 予測結果（項目指定時は指定項目のみ）
     """
-    global model_loader
-    
-    # モデル読み込み確認
-    if model_loader is None or not model_loader.is_loaded():
-        logger.error("Model not loaded")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Model not available"
-        )
+    # リクエストデータを辞書に変換
+    request_data = request.dict()
+    model_loader = (await route_to_shards(shards, model_loader, [request_data], response))[0]
     
     try:
-        # リクエストデータを辞書に変換
-        request_data = request.dict()
-        
         logger.info(f"Prediction request: {request_data}")
         
-        # 予測実行
-        result = model_loader.predict(request_data)
-        
-        # レスポンス作成
-        response = PredictResponse(
-            predicted_price=result['predicted_price'],
-            confidence=result.get('confidence'),
-            features_used=result.get('features_used')
-        )
+        # 予測実行（キャッシュ経由）
+        result = await micro_batcher.predict(model_loader, request_data, fields, prediction_cache)
         
         logger.info(f"Prediction successful: {result['predicted_price']:.1f}万円")
         
-        return response
+        # モデル検証を省略して JSON に直接変換（項目指定時は指定項目のみ）
+        return FastJSONResponse(content=prediction_content(result, fields), headers=model_headers(response))
         
+    except InferenceQueueFullError as e:
+        logger.warning(f"Prediction rejected: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    
     except ValueError as e:
         logger.warning(f"Invalid input data: {e}")
         raise HTTPException(
@@ -170,24 +262,23 @@ async def predict_price(request: PredictRequest):
 
 
 @app.post("/predict/batch")
-async def predict_batch(requests: list[PredictRequest]):
+async def predict_batch(requests: list[PredictRequest], response: Response,
+                        model_loader: ModelLoader = Depends(get_model_loader),
+                        fields: Optional[FrozenSet[str]] = Depends(get_result_fields),
+                        shards: Optional[RegionShards] = Depends(get_region_shards)):
     """
     バッチ予測エンドポイント（複数物件の一括予測）
     
     Args:
         requests: 予測リクエストのリスト
+        response: FastAPIレスポンスオブジェクト
+        model_loader: 使用するモデル（?model= / X-Model-Name で選択、省略時はデフォルト）
+        fields: 返す項目（?fields= / ?lean=true で指定、省略時は全項目）
+        shards: 区名・市区町村コードで振り分ける地域シャード（モデル指定時は使用しない）
         
     Returns:
-        List[PredictResponse]: 予測結果のリスト
+        BatchPredictResponse: バッチ予測結果（項目指定時は指定項目のみ）
     """
-    global model_loader
-    
-    if model_loader is None or not model_loader.is_loaded():
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Model not available"
-        )
-    
     if len(requests) > 100:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -196,35 +287,229 @@ async def predict_batch(requests: list[PredictRequest]):
     
     results = []
     errors = []
+    requests_data = [request.dict() for request in requests]
     
-    for i, request in enumerate(requests):
+    # 同一条件の物件は1回だけ推論し、結果を元の位置に戻す
+    unique_data, positions = deduplicate(requests_data)
+    item_loaders = await route_to_shards(shards, model_loader, unique_data, response)
+    
+    # モデルごとに一括推論（失敗時は1件ずつ推論してエラー箇所を特定）
+    try:
+        batch_results = await inference_executor.predict_grouped(
+            item_loaders, unique_data, fields, prediction_cache
+        )
+    except InferenceQueueFullError as e:
+        logger.warning(f"Batch prediction rejected: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.warning(f"Vectorized batch prediction failed, falling back to per-item: {e}")
+        batch_results = []
+        for request_data, item_loader in zip(unique_data, item_loaders):
+            try:
+                batch_results.append(
+                    await inference_executor.submit(item_loader, 'predict', request_data, fields)
+                )
+            except Exception as item_error:
+                batch_results.append(item_error)
+    
+    for i, request_data in enumerate(requests_data):
         try:
-            request_data = request.dict()
-            result = model_loader.predict(request_data)
+            result = batch_results[positions[i]]
+            if isinstance(result, Exception):
+                raise result
             
-            response = PredictResponse(
-                predicted_price=result['predicted_price'],
-                confidence=result.get('confidence'),
-                features_used=result.get('features_used')
-            )
-            results.append(response)
+            results.append(result)
             
         except Exception as e:
             error_response = {
                 "index": i,
                 "error": str(e),
-                "input": request.dict()
+                "input": request_data
             }
             errors.append(error_response)
             results.append(None)
     
-    return {
-        "results": results,
-        "errors": errors,
-        "total_processed": len(requests),
-        "successful": len([r for r in results if r is not None]),
-        "failed": len(errors)
+    # モデル検証を省略して JSON に直接変換（項目指定時は指定項目のみ）
+    return FastJSONResponse(
+        content=batch_content(results, errors, len(requests_data) - len(unique_data), fields),
+        headers=model_headers(response)
+    )
+
+
+@app.post(
+    "/predict/stream",
+    response_class=NDJSONStreamingResponse,
+    responses={
+        200: {"description": "1行1物件の予測結果（{index, result} または {index, error, input}）"},
+        404: {"model": ErrorResponse, "description": "Unknown model"}
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "description": "1行1物件の PredictRequest（NDJSON、チャンク転送可）",
+            "content": {NDJSONStreamingResponse.media_type: {"schema": {"type": "string"}}}
+        }
+    }
+)
+async def predict_stream(request: Request, response: Response,
+                         model_loader: ModelLoader = Depends(get_model_loader),
+                         fields: Optional[FrozenSet[str]] = Depends(get_result_fields),
+                         shards: Optional[RegionShards] = Depends(get_region_shards)):
+    """
+    ストリーミング予測エンドポイント（件数上限なし、NDJSON 入出力）
+    
+    Args:
+        request: FastAPIリクエストオブジェクト（ボディを NDJSON として逐次読み込む）
+        response: FastAPIレスポンスオブジェクト
+        model_loader: 使用するモデル（?model= / X-Model-Name で選択、省略時はデフォルト）
+        fields: 返す項目（?fields= / ?lean=true で指定、省略時は全項目）
+        shards: 区名・市区町村コードで振り分ける地域シャード（モデル指定時は使用しない）
+        
+    Returns:
+        NDJSONStreamingResponse: 入力順の予測結果（NDJSON、不正な行・失敗した行はその行のエラー）
+    """
+    return NDJSONStreamingResponse(
+        stream_predictor.stream(request.stream(), model_loader, fields, prediction_cache, shards),
+        headers=model_headers(response)
+    )
+
+
+@app.post(
+    "/predict/columns",
+    response_model=ColumnarPredictResponse,
+    responses={
+        200: {"model": ColumnarPredictResponse, "description": "Successful prediction (columnar)"},
+        400: {"model": ErrorResponse, "description": "Malformed columns or too many rows"},
+        404: {"model": ErrorResponse, "description": "Unknown model"},
+        413: {"model": ErrorResponse, "description": "Request body exceeds COLUMNAR_MAX_BYTES"},
+        415: {"model": ErrorResponse, "description": "Arrow IPC input without pyarrow"},
+        503: {"model": ErrorResponse, "description": "Service unavailable"}
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": ColumnarPredictRequest.model_json_schema()},
+                ARROW_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}
+            }
+        }
+    }
+)
+async def predict_columns(request: Request, response: Response,
+                          model_loader: ModelLoader = Depends(get_model_loader),
+                          fields: Optional[FrozenSet[str]] = Depends(get_result_fields),
+                          shards: Optional[RegionShards] = Depends(get_region_shards)):
+    """
+    列形式のバッチ予測エンドポイント（列名 -> 値の配列の JSON、または Arrow IPC ストリーム）
+    
+    制約は行ごとの pydantic 検証ではなく列ごとの配列演算で検証し、違反した行は
+    valid マスクと列ごとの行番号で返す（他の行は予測する）。
+    
+    Args:
+        request: FastAPIリクエストオブジェクト（ボディを列形式として読み込む）
+        response: FastAPIレスポンスオブジェクト
+        model_loader: 使用するモデル（?model= / X-Model-Name で選択、省略時はデフォルト）
+        fields: 返す項目（?fields= / ?lean=true で指定、省略時は全項目）
+        shards: 区名・市区町村コードで振り分ける地域シャード（モデル指定時は使用しない）
+        
+    Returns:
+        ColumnarPredictResponse: 列形式の予測結果（項目指定時は指定項目のみ）
+    """
+    try:
+        batch = await columnar_predictor.read(
+            request.stream(), request.headers.get('content-type', ''),
+            request.headers.get('content-length'), allowed_wards
+        )
+    except ColumnarBodyTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=str(e)
+        )
+    except ImportError:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Arrow IPC input requires pyarrow"
+        )
+    except ValueError as e:
+        logger.warning(f"Invalid columnar input: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid input: {str(e)}"
+        )
+    
+    logger.info(f"Columnar prediction: {batch.n_rows} rows, {batch.n_rows - int(batch.valid.sum())} invalid")
+    
+    try:
+        content = await columnar_predictor.predict(batch, model_loader, fields, shards)
+    except InferenceQueueFullError as e:
+        logger.warning(f"Columnar prediction rejected: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except RuntimeError as e:
+        logger.error(f"Columnar prediction failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Prediction service error: {str(e)}"
+        )
+    
+    # モデル検証を省略して JSON に直接変換
+    return FastJSONResponse(content=content, headers=model_headers(response))
+
+
+@app.post(
+    "/predict/csv",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/csv": {}}, "description": "元の列に predicted_price・error 列を加えた CSV"},
+        400: {"model": ErrorResponse, "description": "Unknown encoding or missing columns"},
+        404: {"model": ErrorResponse, "description": "Unknown model"}
     }
+)
+async def predict_csv(request: Request, response: Response,
+                      file: UploadFile = File(..., description="ヘッダー行付きの CSV（1行1物件）"),
+                      encoding: str = Query('utf-8-sig', description="CSV の文字コード（Excel の CSV は cp932）"),
+                      model_loader: ModelLoader = Depends(get_model_loader),
+                      shards: Optional[RegionShards] = Depends(get_region_shards)):
+    """
+    CSV 予測エンドポイント（件数上限なし、multipart/form-data の CSV ファイル）
+    
+    Args:
+        request: FastAPIリクエストオブジェクト
+        response: FastAPIレスポンスオブジェクト
+        file: アップロードされた CSV（列はヘッダー名で PredictRequest の項目に対応付け）
+        encoding: CSV の文字コード（結果も同じ文字コード）
+        model_loader: 使用するモデル（?model= / X-Model-Name で選択、省略時はデフォルト）
+        shards: 区名・市区町村コードで振り分ける地域シャード（モデル指定時は使用しない）
+        
+    Returns:
+        StreamingResponse: 入力順の CSV（無効な行・失敗した行は error 列にエラー）
+    """
+    try:
+        source = csv_predictor.open(file.file, encoding)
+    except ValueError as e:
+        logger.warning(f"Invalid CSV upload: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid input: {str(e)}"
+        )
+    
+    logger.info(f"CSV prediction started: {file.filename}")
+    
+    return StreamingResponse(
+        csv_predictor.stream(source, model_loader, shards),
+        media_type=source.media_type,
+        headers={**model_headers(response), "Content-Disposition": content_disposition(file.filename)}
+    )
 
 
 @app.exception_handler(Exception)
@@ -247,7 +532,9 @@ async def global_exception_handler(request, exc):
 handler = Mangum(app)
 
 if __name__ == "__main__":
-    # 開発サーバー起動
+    # 開発サーバー起動（Lambda の起動時間に含めないようここで import）
+    import uvicorn
+    
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
@@ -0,0 +1,202 @@
+"""
+単件予測のマイクロバッチ化 - 同時に届いた /predict を1回のバッチ推論にまとめる
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Dict, Any, Optional, List, Collection, Tuple, Hashable
+
+import numpy as np
+
+from inference_executor import InferenceExecutor, InferenceQueueFullError
+from model_loader import ModelLoader
+from prediction_cache import PredictionCache
+
+# 待ち行列 1 件分（リクエストデータ, 結果を受け取る Future, 登録時刻）
+_Pending = Tuple[Dict[str, Any], asyncio.Future, float]
+
+
+class MicroBatcher:
+    """
+    同時に届いた単件予測を集めて ModelLoader.predict_batch で一括推論するクラス
+
+    バッチ推論中でなければ同じイベントループ反復内に届いた要求だけをまとめて
+    即座に実行し、バッチ推論中は window_ms だけ待って要求を集める。
+    負荷が低い時は待ち時間を加えず、負荷が高い時ほど大きなバッチになる。
+    max_batch_size に達した場合は待たずに実行する。
+    モデル・返す項目が異なる要求は別のバッチになる。
+    """
+
+    def __init__(self, executor: InferenceExecutor, window_ms: float = 2.0,
+                 max_batch_size: int = 32, history_size: int = 1024):
+        """
+        マイクロバッチャーの初期化
+
+        Args:
+            executor: 推論を実行する InferenceExecutor
+            window_ms: バッチ推論中に要求を集める時間（ミリ秒）
+            max_batch_size: 1バッチの最大件数（1 以下の場合はバッチ化しない）
+            history_size: 待ち時間の分位点計算に保持する件数
+        """
+        self.logger = logging.getLogger(__name__)
+        self.executor = executor
+        self.window_ms = max(0.0, float(window_ms))
+        self.max_batch_size = max(1, int(max_batch_size))
+
+        self._pending: Dict[Hashable, List[_Pending]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._in_flight = 0
+
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self._total_delay = 0.0
+        self._max_delay = 0.0
+        self._delays: deque = deque(maxlen=history_size)
+
+    @classmethod
+    def from_env(cls, executor: InferenceExecutor) -> "MicroBatcher":
+        """
+        環境変数から設定を読み込んで生成
+
+        MICRO_BATCH_WINDOW_MS: バッチ推論中に要求を集める時間（ミリ秒、デフォルト 2）
+        MICRO_BATCH_MAX_SIZE: 1バッチの最大件数（デフォルト 32、1 でバッチ化しない）
+        """
+        return cls(
+            executor=executor,
+            window_ms=float(os.getenv('MICRO_BATCH_WINDOW_MS', '2')),
+            max_batch_size=int(os.getenv('MICRO_BATCH_MAX_SIZE', '32'))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """マイクロバッチ化が有効か"""
+        return self.max_batch_size > 1
+
+    async def predict(self, model_loader: ModelLoader, request_data: Dict[str, Any],
+                      fields: Optional[Collection[str]] = None,
+                      cache: Optional[PredictionCache] = None) -> Dict[str, Any]:
+        """
+        単件予測（キャッシュに無い場合は他の要求とまとめて推論）
+
+        Args:
+            model_loader: モデルローダー
+            request_data: API リクエストデータ
+            fields: 結果に含める項目（省略時は全項目）
+            cache: 予測キャッシュ
+
+        Returns:
+            Dict[str, Any]: 予測結果
+        """
+        if not self.enabled:
+            return await self.executor.predict(model_loader, request_data, fields, cache)
+
+        keys, results = (cache.lookup(model_loader, [request_data], fields) if cache is not None
+                         else ([], [None]))
+        if results[0] is not None:
+            return results[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch_key = (model_loader, None if fields is None else frozenset(fields))
+        pending = self._pending.setdefault(batch_key, [])
+        pending.append((request_data, future, time.monotonic()))
+
+        if len(pending) >= self.max_batch_size:
+            self._flush(batch_key)
+        elif len(pending) == 1:
+            delay = self.window_ms / 1000 if self._in_flight else 0.0
+            self._timers[batch_key] = loop.call_later(delay, self._flush, batch_key)
+
+        result = await future
+        if cache is not None:
+            cache.store(model_loader, keys, [result])
+        return result
+
+    def _flush(self, batch_key: Hashable) -> None:
+        """
+        待ち行列の要求をバッチとして実行開始
+        """
+        timer = self._timers.pop(batch_key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(batch_key, None)
+        if batch:
+            asyncio.ensure_future(self._dispatch(batch_key, batch))
+
+    async def _dispatch(self, batch_key: Hashable, batch: List[_Pending]) -> None:
+        """
+        バッチ推論を実行し、各要求の Future に結果を設定
+        """
+        model_loader, fields = batch_key
+        self._record(batch)
+        self._in_flight += 1
+        try:
+            results = await self.executor.submit(
+                model_loader, 'predict_batch', [request_data for request_data, _, _ in batch], fields
+            )
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except InferenceQueueFullError as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        except Exception as e:
+            # 一括推論の失敗時は1件ずつ推論してエラーを該当の要求に限定
+            self.logger.warning(f"Micro-batch of {len(batch)} failed, falling back to per-item: {e}")
+            for request_data, future, _ in batch:
+                try:
+                    result = await self.executor.submit(model_loader, 'predict', request_data, fields)
+                except Exception as item_error:
+                    if not future.done():
+                        future.set_exception(item_error)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._in_flight -= 1
+
+    def _record(self, batch: List[_Pending]) -> None:
+        """
+        バッチサイズ・待ち時間の記録
+        """
+        now = time.monotonic()
+        size = len(batch)
+        bucket = 1 << (size - 1).bit_length()
+        self.batches += 1
+        self.items += size
+        self.batch_sizes[bucket] = self.batch_sizes.get(bucket, 0) + 1
+        for _, _, enqueued_at in batch:
+            delay = now - enqueued_at
+            self._total_delay += delay
+            self._max_delay = max(self._max_delay, delay)
+            self._delays.append(delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        マイクロバッチの統計の取得
+
+        Returns:
+            Dict[str, Any]: 設定値・バッチサイズ分布（上限が2の累乗のバケット）・待ち時間（ミリ秒）
+        """
+        delays = np.array(self._delays) * 1e3
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window_ms,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "items": self.items,
+            "pending": sum(len(batch) for batch in self._pending.values()),
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": {f"<={bucket}": count for bucket, count in sorted(self.batch_sizes.items())},
+            "queue_delay_ms": {
+                "mean": round(self._total_delay * 1e3 / self.items, 3) if self.items else 0.0,
+                "p50": round(float(np.percentile(delays, 50)), 3) if delays.size else 0.0,
+                "p95": round(float(np.percentile(delays, 95)), 3) if delays.size else 0.0,
+                "max": round(self._max_delay * 1e3, 3)
+            }
+        }
@@ -0,0 +1,435 @@
+"""
+単一ファイルのモデル成果物 - JSON ヘッダー + メモリマップ可能な重みブロック
+
+ファイル構成:
+    MAGIC (8 バイト) | ヘッダー長 (uint64, リトルエンディアン) | JSON ヘッダー | float64 重みブロック
+
+JSON ヘッダーには特徴量列・区名/地区の語彙・切片・各配列の位置を、重みブロックには
+回帰係数・スケーラーのパラメータ・予測区間用の係数共分散・ブートストラップ
+アンサンブルの係数行列（木モデルの場合はフラット化した木の配列）を格納する。読み込みは
+json と numpy のみで完結し、pickle と scikit-learn のバージョン互換性に依存しない。
+重みブロックは np.memmap で読み込むため、複数ワーカー間で同じページが共有される。
+"""
+
+import json
+import os
+import struct
+import tempfile
+import numpy as np
+from typing import Dict, Any, Optional, List, Mapping
+
+from inference_engine import scaler_parameters
+
+# 成果物のファイル名・識別子
+ARTIFACT_FILE = "model.bin"
+MAGIC = b"APPRMDL1"
+FORMAT_VERSION = 1
+
+# 予測区間の信頼水準
+INTERVAL_LEVEL = 0.95
+
+# フラット化した木の配列名（成果物では tree_ を付けて格納）
+TREE_ARRAYS = ("feature", "threshold", "left", "right", "value", "missing_left", "roots")
+
+# 木モデルとして書き出せる損失（恒等リンクのため生の予測値の和がそのまま予測価格になる）
+TREE_LOSSES = ("squared_error", "absolute_error", "quantile")
+
+# 重みブロックの開始位置の境界（バイト）
+_ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sQ")
+
+
+class ModelArtifact:
+    """
+    読み込み済みのモデル成果物（配列はメモリマップされた読み取り専用ビュー）
+    """
+
+    def __init__(self, path: str, header: Dict[str, Any], arrays: Dict[str, np.ndarray]):
+        """
+        成果物の初期化
+
+        Args:
+            path: 成果物ファイルのパス
+            header: JSON ヘッダー
+            arrays: 配列名 -> 重みブロック上のビュー
+        """
+        self.path = path
+        self.header = header
+        self.arrays = arrays
+
+    @property
+    def feature_columns(self) -> List[str]:
+        """特徴量列名リスト"""
+        return self.header['feature_columns']
+
+    @property
+    def model_type(self) -> str:
+        """学習時のモデルクラス名"""
+        return self.header['model_type']
+
+    @property
+    def intercept(self) -> float:
+        """回帰モデルの切片（標準化後の特徴量空間）"""
+        return float(self.header['intercept'])
+
+    @property
+    def vocabularies(self) -> Dict[str, List[str]]:
+        """エンコーダー名 -> ソート済みクラス一覧（LabelEncoder.classes_ と同順）"""
+        return self.header.get('vocabularies', {})
+
+    @property
+    def interval_statistics(self) -> Optional[Dict[str, Any]]:
+        """予測区間の統計量（compute_interval_statistics の形式、学習時に未計算の場合はNone）"""
+        interval = self.header.get('interval')
+        if interval is None:
+            return None
+        return dict(
+            interval,
+            covariance=self.arrays['interval_covariance'],
+            center=self.arrays['interval_center']
+        )
+
+    @property
+    def ensemble(self) -> Optional[Dict[str, np.ndarray]]:
+        """ブートストラップアンサンブル（fit_bootstrap_ensemble の形式、学習時に未作成の場合はNone）"""
+        if 'ensemble' not in self.header:
+            return None
+        return {
+            "coef": self.arrays['ensemble_coef'],
+            "intercept": self.arrays['ensemble_intercept']
+        }
+
+    @property
+    def trees(self) -> Optional[Dict[str, Any]]:
+        """フラット化した木（flatten_tree_ensemble の形式、線形モデルの場合はNone）"""
+        if 'trees' not in self.header:
+            return None
+        trees: Dict[str, Any] = {name: self.arrays[f"tree_{name}"] for name in TREE_ARRAYS}
+        trees["baseline"] = self.intercept
+        return trees
+
+    def array(self, name: str) -> Optional[np.ndarray]:
+        """
+        配列の取得
+
+        Args:
+            name: 配列名（'coef' / 'scaler_mean' / 'scaler_scale' など）
+
+        Returns:
+            Optional[np.ndarray]: 配列（存在しない場合はNone）
+        """
+        return self.arrays.get(name)
+
+
+def write_artifact(path: str, header: Dict[str, Any], arrays: Mapping[str, np.ndarray]) -> None:
+    """
+    成果物ファイルを書き込み（一時ファイル経由で置き換えるため読み込み中のプロセスに影響しない）
+
+    Args:
+        path: 出力パス
+        header: JSON ヘッダー（arrays / format_version は自動で設定）
+        arrays: 配列名 -> float64 に変換可能な配列
+    """
+    blocks = []
+    layout = {}
+    offset = 0
+    for name, value in arrays.items():
+        block = np.ascontiguousarray(value, dtype='<f8')
+        layout[name] = {"offset": offset, "shape": list(block.shape)}
+        blocks.append(block)
+        offset += block.size
+
+    header = dict(header, format_version=FORMAT_VERSION, arrays=layout)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    padding = -(_PREFIX.size + len(header_bytes)) % _ALIGNMENT
+    header_bytes += b" " * padding
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".model-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_PREFIX.pack(MAGIC, len(header_bytes)))
+            f.write(header_bytes)
+            for block in blocks:
+                f.write(block.tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def read_artifact(path: str) -> ModelArtifact:
+    """
+    成果物ファイルを読み込み（重みブロックはメモリマップ）
+
+    Args:
+        path: 成果物ファイルのパス
+
+    Returns:
+        ModelArtifact: 読み込み済みの成果物
+    """
+    with open(path, 'rb') as f:
+        magic, header_length = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a model artifact")
+        header = json.loads(f.read(header_length).decode('utf-8'))
+
+    if header.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version: {header.get('format_version')}")
+
+    layout = header.get('arrays', {})
+    total = sum(int(np.prod(spec['shape'], dtype=np.int64)) for spec in layout.values())
+    data_offset = _PREFIX.size + header_length
+    if os.path.getsize(path) != data_offset + total * 8:
+        raise ValueError(f"{path} is truncated or corrupt")
+
+    weights = (np.memmap(path, dtype='<f8', mode='r', offset=data_offset, shape=(total,))
+               if total else np.zeros(0))
+    arrays = {}
+    for name, spec in layout.items():
+        size = int(np.prod(spec['shape'], dtype=np.int64))
+        arrays[name] = weights[spec['offset']:spec['offset'] + size].reshape(spec['shape'])
+
+    return ModelArtifact(path, header, arrays)
+
+
+def compute_interval_statistics(model: Any, X_scaled: Any, y: Any,
+                                level: float = INTERVAL_LEVEL) -> Dict[str, Any]:
+    """
+    学習データから予測区間の統計量を計算（学習スクリプト用、scipy を使用）
+
+    切片は中心化で分離し、標準化後の中心化行列 Zc に対して係数の共分散を
+    σ² * covariance として求める。LinearRegression では covariance = (ZcᵀZc)⁺、
+    Ridge では (ZcᵀZc + αI)⁻¹ ZcᵀZc (ZcᵀZc + αI)⁻¹。One-hot 列の多重共線性に
+    備えて疑似逆行列を使う。
+
+    Args:
+        model: 学習済みの線形回帰モデル
+        X_scaled: 標準化済みの学習データ (n, F)
+        y: 目的変数 (n,)
+        level: 信頼水準
+
+    Returns:
+        Dict[str, Any]: residual_variance, dof, n_train, level, t_critical, covariance (F, F), center (F,)
+    """
+    from scipy import stats
+
+    X = np.asarray(X_scaled, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n_train = X.shape[0]
+
+    center = X.mean(axis=0)
+    centered = X - center
+    gram = centered.T @ centered
+    alpha = float(getattr(model, 'alpha', 0.0) or 0.0)
+    if alpha > 0:
+        inverse = np.linalg.inv(gram + alpha * np.eye(gram.shape[0]))
+        covariance = inverse @ gram @ inverse
+        # 有効パラメータ数 = trace(ハット行列)
+        parameters = float(np.trace(gram @ inverse))
+    else:
+        covariance = np.linalg.pinv(gram)
+        parameters = float(np.linalg.matrix_rank(gram))
+
+    residuals = y - model.predict(X)
+    dof = max(n_train - parameters - 1, 1.0)
+    return {
+        "residual_variance": float(residuals @ residuals / dof),
+        "dof": dof,
+        "n_train": n_train,
+        "level": level,
+        "t_critical": float(stats.t.ppf(0.5 + level / 2, dof)),
+        "covariance": covariance,
+        "center": center
+    }
+
+
+def fit_bootstrap_ensemble(model: Any, X_scaled: Any, y: Any, replicas: int,
+                           n_jobs: int = -1, seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    ブートストラップ標本で回帰モデルを replicas 個学習し、係数を1つの行列にまとめる（学習スクリプト用）
+
+    各レプリカは学習データを復元抽出した標本で model と同じ設定のモデルを学習する。
+    レプリカはコア数に応じて並列に学習する。
+
+    Args:
+        model: 学習済みの線形回帰モデル（設定の複製元）
+        X_scaled: 標準化済みの学習データ (n, F)
+        y: 目的変数 (n,)
+        replicas: レプリカ数 K
+        n_jobs: 並列数（-1 で全コア）
+        seed: 復元抽出の乱数シード
+
+    Returns:
+        Dict[str, np.ndarray]: coef (K, F), intercept (K,)
+    """
+    from joblib import Parallel, delayed
+    from sklearn.base import clone
+
+    X = np.asarray(X_scaled, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    samples = np.random.default_rng(seed).integers(0, X.shape[0], size=(replicas, X.shape[0]))
+
+    # X / y は引数で渡し、joblib のメモリマップ共有でワーカーへのコピーを避ける
+    fitted = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_bootstrap_replica)(clone(model), X, y, rows) for rows in samples
+    )
+    return {
+        "coef": np.vstack([coef for coef, _ in fitted]),
+        "intercept": np.array([intercept for _, intercept in fitted])
+    }
+
+
+def _fit_bootstrap_replica(model: Any, X: np.ndarray, y: np.ndarray, rows: np.ndarray):
+    """
+    復元抽出した行で1レプリカを学習し、(係数, 切片) を返す
+    """
+    model.fit(X[rows], y[rows])
+    return np.ravel(model.coef_), float(np.ravel(model.intercept_)[0])
+
+
+def flatten_tree_ensemble(model: Any) -> Dict[str, Any]:
+    """
+    学習済みの HistGradientBoostingRegressor の全ての木を連結したフラットな配列に変換
+
+    各木のノードは通し番号に振り直し、葉は自身を左右の子・閾値を +inf とする
+    （評価時に深さを揃えて反復するため）。閾値は学習時の特徴量空間（標準化後）のまま。
+
+    Args:
+        model: 学習済みの HistGradientBoostingRegressor
+
+    Returns:
+        Dict[str, Any]: feature / threshold / left / right / value / missing_left (M,), roots (T,), baseline
+    """
+    if not hasattr(model, '_predictors') or not hasattr(model, '_baseline_prediction'):
+        raise TypeError(f"Model {type(model).__name__} is not a histogram gradient boosting model")
+    if getattr(model, 'loss', 'squared_error') not in TREE_LOSSES:
+        raise ValueError(f"Loss '{model.loss}' uses a non-identity link, expected one of {TREE_LOSSES}")
+
+    columns: Dict[str, List[np.ndarray]] = {name: [] for name in TREE_ARRAYS if name != 'roots'}
+    roots = []
+    offset = 0
+    for predictors in model._predictors:
+        if len(predictors) != 1:
+            raise ValueError("Only single-output regression trees are supported")
+        nodes = predictors[0].nodes
+        if nodes['is_categorical'].any():
+            raise ValueError("Categorical splits are not supported")
+
+        leaf = nodes['is_leaf'].astype(bool)
+        index = np.arange(len(nodes)) + offset
+        columns['feature'].append(np.where(leaf, 0, nodes['feature_idx']))
+        columns['threshold'].append(np.where(leaf, np.inf, nodes['num_threshold']))
+        columns['left'].append(np.where(leaf, index, nodes['left'] + offset))
+        columns['right'].append(np.where(leaf, index, nodes['right'] + offset))
+        columns['value'].append(np.where(leaf, nodes['value'], 0.0))
+        columns['missing_left'].append(np.where(leaf, 1, nodes['missing_go_to_left']))
+        roots.append(offset)
+        offset += len(nodes)
+
+    trees: Dict[str, Any] = {name: np.concatenate(parts) for name, parts in columns.items()}
+    trees['roots'] = np.array(roots)
+    trees['baseline'] = float(np.ravel(model._baseline_prediction)[0])
+    return trees
+
+
+def _model_header(model: Any, scaler: Any, feature_columns: List[str],
+                  label_encoders: Optional[Mapping[str, Any]], target_column: str,
+                  intercept: float) -> Dict[str, Any]:
+    """
+    線形・木モデル共通の JSON ヘッダー
+    """
+    return {
+        "model_type": type(model).__name__,
+        "scaler_type": type(scaler).__name__,
+        "target_column": target_column,
+        "feature_columns": list(feature_columns),
+        "intercept": intercept,
+        "vocabularies": {
+            name: [str(value) for value in encoder.classes_]
+            for name, encoder in (label_encoders or {}).items()
+        }
+    }
+
+
+def _scaler_arrays(scaler: Any, feature_count: int) -> Dict[str, np.ndarray]:
+    """
+    スケーラーのパラメータ（適用しない側は平均0・標準偏差1）
+    """
+    mean, scale = scaler_parameters(scaler)
+    return {
+        "scaler_mean": np.zeros(feature_count) if mean is None else mean,
+        "scaler_scale": np.ones(feature_count) if scale is None else scale
+    }
+
+
+def export_tree_model(path: str, model: Any, scaler: Any, feature_columns: List[str],
+                      label_encoders: Optional[Mapping[str, Any]] = None,
+                      target_column: str = 'price') -> None:
+    """
+    学習済みの StandardScaler + HistGradientBoostingRegressor を成果物ファイルに書き出し
+
+    Args:
+        path: 出力パス
+        model: 学習済みの HistGradientBoostingRegressor
+        scaler: mean_ / scale_ を持つ StandardScaler
+        feature_columns: 特徴量列名リスト
+        label_encoders: エンコーダー名 -> LabelEncoder
+        target_column: 目的変数名
+    """
+    trees = flatten_tree_ensemble(model)
+    if trees['feature'].size and trees['feature'].max() >= len(feature_columns):
+        raise ValueError(f"Tree feature index {trees['feature'].max()} exceeds {len(feature_columns)} features")
+
+    header = _model_header(model, scaler, feature_columns, label_encoders, target_column, trees['baseline'])
+    header["trees"] = {"count": len(trees['roots'])}
+    arrays = _scaler_arrays(scaler, len(feature_columns))
+    arrays.update({f"tree_{name}": trees[name] for name in TREE_ARRAYS})
+    write_artifact(path, header, arrays)
+
+
+def export_linear_model(path: str, model: Any, scaler: Any, feature_columns: List[str],
+                        label_encoders: Optional[Mapping[str, Any]] = None,
+                        target_column: str = 'price',
+                        interval_stats: Optional[Mapping[str, Any]] = None,
+                        ensemble: Optional[Mapping[str, Any]] = None) -> None:
+    """
+    学習済みの StandardScaler + 線形回帰モデルを成果物ファイルに書き出し
+
+    Args:
+        path: 出力パス
+        model: coef_ / intercept_ を持つ線形回帰モデル
+        scaler: mean_ / scale_ を持つ StandardScaler
+        feature_columns: 特徴量列名リスト
+        label_encoders: エンコーダー名 -> LabelEncoder
+        target_column: 目的変数名
+        interval_stats: compute_interval_statistics の結果（省略時は予測区間なし）
+        ensemble: fit_bootstrap_ensemble の結果（省略時はアンサンブルなし）
+    """
+    if not hasattr(model, 'coef_') or not hasattr(model, 'intercept_'):
+        raise TypeError(f"Model {type(model).__name__} is not a linear model")
+
+    coef = np.asarray(model.coef_, dtype=np.float64).ravel()
+    if coef.shape[0] != len(feature_columns):
+        raise ValueError(f"Coefficient count {coef.shape[0]} does not match {len(feature_columns)} features")
+
+    header = _model_header(
+        model, scaler, feature_columns, label_encoders, target_column, float(np.ravel(model.intercept_)[0])
+    )
+    arrays = {"coef": coef}
+    arrays.update(_scaler_arrays(scaler, coef.shape[0]))
+    if interval_stats is not None:
+        header["interval"] = {
+            name: value for name, value in interval_stats.items() if name not in ('covariance', 'center')
+        }
+        arrays["interval_covariance"] = interval_stats['covariance']
+        arrays["interval_center"] = interval_stats['center']
+    if ensemble is not None:
+        ensemble_coef = np.asarray(ensemble['coef'], dtype=np.float64)
+        if ensemble_coef.ndim != 2 or ensemble_coef.shape[1] != coef.shape[0]:
+            raise ValueError(f"Ensemble coefficients {ensemble_coef.shape} do not match {coef.shape[0]} features")
+        header["ensemble"] = {"replicas": ensemble_coef.shape[0]}
+        arrays["ensemble_coef"] = ensemble_coef
+        arrays["ensemble_intercept"] = ensemble['intercept']
+    write_artifact(path, header, arrays)
@@ -3,28 +3,95 @@
 """
 
 import os
-import joblib
+import hashlib
 import numpy as np
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Sequence, Tuple, Collection, Union
 import logging
 
+from inference_engine import LinearKernel, TreeEnsembleKernel, IntervalKernel, EnsembleKernel, scaler_parameters
+from feature_layout import FeatureLayout, CategoryEncoder, NUMERIC_DEFAULTS
+from model_artifact import ModelArtifact, ARTIFACT_FILE, read_artifact, flatten_tree_ensemble
+
 
 class ModelLoader:
     """
     機械学習モデルとスケーラーの読み込み・管理クラス
     """
     
-    def __init__(self, model_dir: str = "./models"):
+    # モデルディレクトリ内の成果物ファイル（単一ファイル形式を優先し、無い場合は joblib を読み込む）
+    ARTIFACT_FILE = ARTIFACT_FILE
+    LEGACY_ARTIFACT_FILES = ("model.joblib", "scaler.joblib", "feature_info.joblib")
+    
+    # 予測結果の項目（レスポンスの射影に使用）
+    RESULT_FIELDS = ('predicted_price', 'confidence', 'prediction_interval', 'price_distribution', 'features_used')
+    
+    # 明示的に指定した場合のみ返す項目（explain=true で contributions を追加）
+    OPTIONAL_RESULT_FIELDS = ('contributions',)
+    
+    # 寄与度で区名ブロック（One-hot 列 / ward_encoded 列）をまとめて表す名前
+    WARD_CONTRIBUTION = 'ward'
+    
+    # ブートストラップアンサンブルの予測分布で返すパーセンタイル
+    ENSEMBLE_PERCENTILES = (5, 50, 95)
+    
+    # ウォームアップ・検証用のサンプル入力
+    WARMUP_REQUEST = {
+        'land_area': 120.0,
+        'building_area': 80.0,
+        'building_age': 10,
+        'ward_name': '世田谷区',
+        'district': '世田谷区_1丁目',
+        'year': 2024,
+        'quarter': 1
+    }
+    
+    # 推論精度（float32 は読み込み時の精度検証に合格した場合のみ有効）
+    PRECISIONS = ("float64", "float32")
+    
+    # 精度検証用の参照サンプル（件数・乱数シード・数値入力の範囲）
+    PRECISION_REFERENCE_SIZE = 1024
+    PRECISION_REFERENCE_SEED = 0
+    PRECISION_REFERENCE_RANGES = {
+        'land_area': (30.0, 500.0),
+        'building_area': (20.0, 400.0),
+        'building_age': (0, 60),
+        'year': (2005, 2026),
+        'quarter': (1, 5)
+    }
+    
+    def __init__(self, model_dir: str = "./models", lean: bool = False,
+                 precision: str = "float64", precision_tolerance: float = 1.0):
         """
         モデルローダーの初期化
         
         Args:
             model_dir: モデルファイルが格納されているディレクトリ
+            lean: 軽量ランタイム（model.bin のみ読み込み、joblib・scikit-learn を import しない）
+            precision: 推論精度（float64 / float32）
+            precision_tolerance: float32 を有効にする条件（万円単位に丸めた予測値の float64 との最大差）
         """
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {self.PRECISIONS}")
+        
         self.model_dir = model_dir
+        self.lean = lean
+        self.precision = precision
+        self.precision_tolerance = float(precision_tolerance)
+        self.precision_deviation: Optional[float] = None
         self.model = None
         self.scaler = None
         self.feature_info = None
+        self.artifact: Optional[ModelArtifact] = None
+        self.model_type: Optional[str] = None
+        self.scaler_type: Optional[str] = None
+        self.vocabularies: Dict[str, List[str]] = {}
+        self.kernel: Optional[Union[LinearKernel, TreeEnsembleKernel]] = None
+        self.interval_kernel: Optional[IntervalKernel] = None
+        self.ensemble_kernel: Optional[EnsembleKernel] = None
+        self.layout: Optional[FeatureLayout] = None
+        self.district_encoder: Optional[CategoryEncoder] = None
+        self.model_version: Optional[str] = None
+        self.loaded_paths: List[str] = []
         self.logger = logging.getLogger(__name__)
         
         # 起動時にモデルを読み込み
@@ -34,28 +101,38 @@ class ModelLoader:
         """
         モデル、スケーラー、特徴量情報を読み込み
         
+        単一ファイルの成果物（model.bin）があればメモリマップで読み込み、
+        無い場合は従来の joblib ファイルを読み込む。
+        
         Returns:
             bool: 読み込み成功の可否
         """
         try:
-            model_path = os.path.join(self.model_dir, "model.joblib")
-            scaler_path = os.path.join(self.model_dir, "scaler.joblib")
-            feature_path = os.path.join(self.model_dir, "feature_info.joblib")
-            
-            # ファイル存在確認
-            if not all(os.path.exists(path) for path in [model_path, scaler_path, feature_path]):
-                missing_files = [
-                    path for path in [model_path, scaler_path, feature_path] 
-                    if not os.path.exists(path)
-                ]
-                raise FileNotFoundError(f"Missing model files: {missing_files}")
-            
-            # モデル読み込み
-            self.model = joblib.load(model_path)
-            self.scaler = joblib.load(scaler_path)
-            self.feature_info = joblib.load(feature_path)
-            
-            self.logger.info("Models loaded successfully")
+            artifact_path = os.path.join(self.model_dir, self.ARTIFACT_FILE)
+            if os.path.exists(artifact_path):
+                loaded_paths = self._load_artifact(artifact_path)
+            elif self.lean:
+                raise FileNotFoundError(f"Lean runtime requires {artifact_path}")
+            else:
+                loaded_paths = self._load_joblib()
+            
+            # 特徴量レイアウト・推論カーネルのコンパイル
+            self.layout = FeatureLayout(
+                self.feature_info['feature_columns'],
+                ward_classes=self.vocabularies.get('ward')
+            )
+            self.district_encoder = self._compile_district_encoder()
+            self.kernel = self._compile_kernel()
+            self.interval_kernel = self._compile_interval_kernel()
+            self.ensemble_kernel = self._compile_ensemble_kernel()
+            self._apply_precision()
+            self.model_version = self._compute_version(loaded_paths)
+            self.loaded_paths = loaded_paths
+            
+            self.logger.info(
+                f"Models loaded successfully (version={self.model_version}, "
+                f"format={'artifact' if self.artifact is not None else 'joblib'})"
+            )
             self.logger.info(f"Feature count: {len(self.feature_info['feature_columns'])}")
             
             return True
@@ -64,6 +141,57 @@ class ModelLoader:
             self.logger.error(f"Failed to load models: {e}")
             raise RuntimeError(f"Model loading failed: {e}")
     
+    def _load_artifact(self, artifact_path: str) -> List[str]:
+        """
+        単一ファイルの成果物を読み込み（sklearn・pickle を使用しない）
+        
+        Args:
+            artifact_path: 成果物ファイルのパス
+            
+        Returns:
+            List[str]: 読み込んだファイルのパス
+        """
+        self.artifact = read_artifact(artifact_path)
+        header = self.artifact.header
+        self.model_type = self.artifact.model_type
+        self.scaler_type = header.get('scaler_type')
+        self.vocabularies = self.artifact.vocabularies
+        self.feature_info = {
+            'feature_columns': self.artifact.feature_columns,
+            'target_column': header.get('target_column'),
+            'model_type': self.model_type
+        }
+        return [artifact_path]
+    
+    def _load_joblib(self) -> List[str]:
+        """
+        従来の joblib ファイル（model / scaler / feature_info）を読み込み
+        
+        Returns:
+            List[str]: 読み込んだファイルのパス
+        """
+        paths = [os.path.join(self.model_dir, name) for name in self.LEGACY_ARTIFACT_FILES]
+        
+        # ファイル存在確認
+        missing_files = [path for path in paths if not os.path.exists(path)]
+        if missing_files:
+            raise FileNotFoundError(f"Missing model files: {missing_files}")
+        
+        # 従来形式のみで使用（unpickle により scikit-learn・scipy も import される）
+        import joblib
+        
+        model_path, scaler_path, feature_path = paths
+        self.model = joblib.load(model_path)
+        self.scaler = joblib.load(scaler_path)
+        self.feature_info = joblib.load(feature_path)
+        self.model_type = type(self.model).__name__
+        self.scaler_type = type(self.scaler).__name__
+        self.vocabularies = {
+            name: [str(value) for value in label_encoder.classes_]
+            for name, label_encoder in self.feature_info.get('label_encoders', {}).items()
+        }
+        return paths
+    
     def prepare_features(self, request_data: Dict[str, Any]) -> np.ndarray:
         """
         入力データから特徴量ベクトルを準備
@@ -74,63 +202,167 @@ class ModelLoader:
         Returns:
             np.ndarray: 特徴量ベクトル
         """
+        return self.layout.expand(*self.prepare_compact(request_data))
+    
+    def prepare_features_batch(self, requests_data: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        複数のリクエストデータから特徴量行列を一括で準備
+        
+        Args:
+            requests_data: API リクエストデータのリスト
+            
+        Returns:
+            np.ndarray: 特徴量行列 (N, F)
+        """
+        return self.layout.expand(*self.prepare_compact_batch(requests_data))
+    
+    def prepare_compact(self, request_data: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        入力データから区名ブロックを除いた密な特徴量と区コードを準備
+        
+        Args:
+            request_data: API リクエストデータ
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 密な特徴量 (1, K) と区コード (1,)
+        """
         if not self.is_loaded():
             raise RuntimeError("Models not loaded")
         
-        feature_columns = self.feature_info['feature_columns']
-        feature_vector = np.zeros(len(feature_columns))
+        # 地区エンコーディング
+        district = request_data.get('district')
+        district_code = None
+        if district and self.layout.district_slot is not None:
+            district_code = self._encode_district(district)
+        
+        dense, ward_code = self.layout.encode_row(request_data, district_code)
+        return dense.reshape(1, -1), np.array([ward_code], dtype=np.intp)
+    
+    def prepare_compact_batch(self, requests_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        複数のリクエストデータから密な特徴量と区コードを一括で準備
         
-        # 基本的な数値特徴量
-        numeric_mappings = {
-            'building_area': request_data.get('building_area', 0),
-            'land_area': request_data.get('land_area', 0),
-            'building_age': request_data.get('building_age', 0),
-            'year': request_data.get('year', 2024),
-            'quarter': request_data.get('quarter', 1)
+        Args:
+            requests_data: API リクエストデータのリスト
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 密な特徴量 (N, K) と区コード (N,)
+        """
+        columns = {
+            name: [request_data.get(name) for request_data in requests_data]
+            for name in list(NUMERIC_DEFAULTS) + ['ward_name', 'district']
         }
+        return self.prepare_compact_columns(columns, len(requests_data))
+    
+    def prepare_compact_columns(self, columns: Dict[str, Sequence[Any]],
+                                n_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        列形式の入力データから密な特徴量と区コードを配列演算で準備
         
-        # 面積比率の計算
-        if 'area_ratio' in feature_columns:
-            building_area = numeric_mappings['building_area']
-            land_area = numeric_mappings['land_area']
-            numeric_mappings['area_ratio'] = building_area / (land_area + 1e-6)
+        Args:
+            columns: 列名 -> 値リストの辞書（None は未指定扱い）
+            n_rows: 行数
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 密な特徴量 (N, K) と区コード (N,)
+        """
+        if not self.is_loaded():
+            raise RuntimeError("Models not loaded")
         
-        # 地区エンコーディング
-        district = request_data.get('district')
-        if district and 'district_encoded' in feature_columns:
-            label_encoder = self.feature_info.get('label_encoders', {}).get('district')
-            if label_encoder:
-                try:
-                    encoded_district = label_encoder.transform([district])[0]
-                    numeric_mappings['district_encoded'] = encoded_district
-                except ValueError:
-                    # 未知の地区の場合は0を設定
-                    numeric_mappings['district_encoded'] = 0
-            else:
-                numeric_mappings['district_encoded'] = 0
+        # 地区エンコーディング（未知・未指定の地区は0）
+        district_codes = None
+        if self.layout.district_slot is not None and columns.get('district') is not None:
+            district_codes = self._encode_districts(columns['district'])
         
-        # 区名のOne-hot encoding
-        ward_name = request_data.get('ward_name', '')
-        if ward_name:
-            ward_column = f'ward_{ward_name}'
-            if ward_column in feature_columns:
-                ward_index = feature_columns.index(ward_column)
-                feature_vector[ward_index] = 1
+        return self.layout.encode_columns(columns, n_rows, district_codes)
+    
+    def artifact_paths(self) -> List[str]:
+        """
+        モデル成果物ファイルのパス一覧（更新監視用、形式の切り替えも検知できるよう両形式を含む）
         
-        # 数値特徴量の設定
-        for feature_name, value in numeric_mappings.items():
-            if feature_name in feature_columns:
-                feature_index = feature_columns.index(feature_name)
-                feature_vector[feature_index] = float(value)
+        Returns:
+            List[str]: ARTIFACT_FILE と LEGACY_ARTIFACT_FILES の各ファイルのパス
+        """
+        names = (self.ARTIFACT_FILE,) + self.LEGACY_ARTIFACT_FILES
+        return [os.path.join(self.model_dir, name) for name in names]
+    
+    def warm_up(self) -> None:
+        """
+        サンプル入力で推論経路を一通り実行し、結果の妥当性を検証
+        """
+        single = self.predict(self.WARMUP_REQUEST)
+        batch = self.predict_batch([self.WARMUP_REQUEST, self.WARMUP_REQUEST])
+        prices = [single['predicted_price']] + [result['predicted_price'] for result in batch]
+        if not all(np.isfinite(prices)):
+            raise RuntimeError(f"Warm-up produced invalid predictions: {prices}")
+    
+    @staticmethod
+    def _compute_version(paths: List[str]) -> str:
+        """
+        モデルファイルの内容からバージョン識別子を計算
         
-        return feature_vector.reshape(1, -1)
+        Args:
+            paths: モデルファイルのパスリスト
+            
+        Returns:
+            str: SHA-256 ダイジェストの先頭12文字
+        """
+        digest = hashlib.sha256()
+        for path in paths:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()[:12]
+    
+    def _compile_district_encoder(self) -> Optional[CategoryEncoder]:
+        """
+        地区の語彙（LabelEncoder.classes_）を辞書ベースのエンコーダーに変換
+        
+        Returns:
+            Optional[CategoryEncoder]: 地区エンコーダー（未学習の場合はNone）
+        """
+        classes = self.vocabularies.get('district')
+        if classes is None:
+            return None
+        # 未知の地区の場合は0を設定
+        return CategoryEncoder(classes, fallback_code=0)
     
-    def predict(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _encode_district(self, district: str) -> float:
+        """
+        地区名をラベルエンコード（未知の地区は0）
+        
+        Args:
+            district: 地区名
+            
+        Returns:
+            float: エンコード値
+        """
+        if self.district_encoder is None:
+            return 0
+        return self.district_encoder.encode(district)
+    
+    def _encode_districts(self, districts: Sequence[Optional[str]]) -> np.ndarray:
+        """
+        地区名の配列をラベルエンコード（未知・未指定の地区は0）
+        
+        Args:
+            districts: 地区名のリスト
+            
+        Returns:
+            np.ndarray: エンコード値 (N,)
+        """
+        if self.district_encoder is None:
+            return np.zeros(len(districts))
+        return self.district_encoder.encode_many(districts)
+    
+    def predict(self, request_data: Dict[str, Any],
+                fields: Optional[Collection[str]] = None) -> Dict[str, Any]:
         """
         予測実行
         
         Args:
             request_data: API リクエストデータ
+            fields: 結果に含める項目（RESULT_FIELDS の部分集合、省略時は全項目）
             
         Returns:
             Dict[str, Any]: 予測結果
@@ -139,31 +371,37 @@ class ModelLoader:
             raise RuntimeError("Models not loaded")
         
         try:
-            # 特徴量準備
-            features = self.prepare_features(request_data)
-            
-            # 標準化
-            features_scaled = self.scaler.transform(features)
+            # 特徴量準備（要求された項目に必要な場合のみ特徴量行列へ展開）
+            fields = self._result_fields(fields)
+            dense, ward_codes = self.prepare_compact(request_data)
+            features = self.layout.expand(dense, ward_codes) if self._needs_features(fields) else None
             
             # 予測実行
-            prediction = self.model.predict(features_scaled)[0]
+            prediction = float(self._predict_compact(dense, ward_codes, features)[0])
             
             # 予測値の妥当性チェック
             if prediction < 0:
                 prediction = abs(prediction)
             
+            predicted_price = round(prediction, 0)
+            result = {'predicted_price': predicted_price}
+            
+            if 'confidence' in fields or 'prediction_interval' in fields:
+                intervals, confidences = self._calculate_uncertainty(features, np.array([predicted_price]))
+                if 'confidence' in fields:
+                    result['confidence'] = float(confidences[0]) * 100
+                if 'prediction_interval' in fields:
+                    result['prediction_interval'] = intervals[0]
+            
+            if 'price_distribution' in fields:
+                result['price_distribution'] = self._calculate_distribution(dense, ward_codes)[0]
+            
+            if 'contributions' in fields:
+                result['contributions'] = self._calculate_contributions(dense, ward_codes)[0]
+            
             # 使用された特徴量（デバッグ用、area_ratioを除外）
-            features_used = {}
-            feature_columns = self.feature_info['feature_columns']
-            for i, col in enumerate(feature_columns):
-                if features[0][i] != 0 and col != 'area_ratio':
-                    features_used[col] = float(features[0][i])
-            
-            result = {
-                'predicted_price': round(prediction, 0),
-                'confidence': self._calculate_confidence(features) * 100,
-                'features_used': features_used
-            }
+            if 'features_used' in fields:
+                result['features_used'] = self.layout.features_used(features[0])
             
             self.logger.info(f"Prediction successful: {prediction:.1f}")
             return result
@@ -172,28 +410,419 @@ class ModelLoader:
             self.logger.error(f"Prediction failed: {e}")
             raise RuntimeError(f"Prediction failed: {e}")
     
-    def _calculate_confidence(self, features: np.ndarray) -> float:
+    def predict_batch(self, requests_data: List[Dict[str, Any]],
+                      fields: Optional[Collection[str]] = None) -> List[Dict[str, Any]]:
         """
-        信頼度の計算（簡易版）
+        バッチ予測実行（特徴量準備・推論を1回の行列演算で実行）
         
         Args:
-            features: 特徴量ベクトル
+            requests_data: API リクエストデータのリスト
+            fields: 結果に含める項目（RESULT_FIELDS の部分集合、省略時は全項目）
             
         Returns:
-            float: 信頼度（0-1）
+            List[Dict[str, Any]]: 入力順の予測結果リスト
         """
-        # 簡易的な信頼度計算
-        # 実際には予測区間やアンサンブルモデルを使用する
-        non_zero_features = np.count_nonzero(features)
-        total_features = features.shape[1]
+        if not self.is_loaded():
+            raise RuntimeError("Models not loaded")
         
-        # 特徴量の充実度に基づく信頼度
-        feature_completeness = non_zero_features / total_features
+        if not requests_data:
+            return []
         
-        # 基本的な信頼度（0.7-0.95の範囲）
-        confidence = 0.7 + (feature_completeness * 0.25)
+        try:
+            dense, ward_codes = self.prepare_compact_batch(requests_data)
+            columns = self._result_columns(dense, ward_codes, fields)
+            names = list(columns)
+            results = [dict(zip(names, values)) for values in zip(*columns.values())]
+            
+            self.logger.info(f"Batch prediction successful: {len(results)} items")
+            return results
+            
+        except Exception as e:
+            self.logger.error(f"Batch prediction failed: {e}")
+            raise RuntimeError(f"Batch prediction failed: {e}")
+    
+    def predict_columns(self, columns: Dict[str, Sequence[Any]], n_rows: int,
+                        fields: Optional[Collection[str]] = None) -> Dict[str, List[Any]]:
+        """
+        列形式のバッチ予測実行（行ごとの dict を作らずに列形式の結果を返す）
         
-        return round(min(confidence, 0.95), 3)
+        Args:
+            columns: 列名 -> 値の配列の辞書（検証済み、None・NaN は未指定扱い）
+            n_rows: 行数
+            fields: 結果に含める項目（RESULT_FIELDS の部分集合、省略時は全項目）
+            
+        Returns:
+            Dict[str, List[Any]]: 項目名 -> 入力順の値リスト
+        """
+        if not self.is_loaded():
+            raise RuntimeError("Models not loaded")
+        
+        try:
+            dense, ward_codes = self.prepare_compact_columns(columns, n_rows)
+            results = self._result_columns(dense, ward_codes, fields)
+            
+            self.logger.info(f"Columnar prediction successful: {n_rows} items")
+            return results
+            
+        except Exception as e:
+            self.logger.error(f"Columnar prediction failed: {e}")
+            raise RuntimeError(f"Columnar prediction failed: {e}")
+    
+    def _result_columns(self, dense: np.ndarray, ward_codes: np.ndarray,
+                        fields: Optional[Collection[str]]) -> Dict[str, List[Any]]:
+        """
+        コンパクト表現から要求された項目を列ごとに一括計算
+        
+        Args:
+            dense: 密な特徴量 (N, K)
+            ward_codes: 区コード (N,)
+            fields: 結果に含める項目（省略時は全項目）
+            
+        Returns:
+            Dict[str, List[Any]]: 項目名 -> 値リスト
+        """
+        fields = self._result_fields(fields)
+        features = self.layout.expand(dense, ward_codes) if self._needs_features(fields) else None
+        predictions = self._predict_compact(dense, ward_codes, features)
+        
+        # 予測値の妥当性チェック
+        predictions = np.round(np.abs(predictions), 0)
+        columns = {'predicted_price': predictions.tolist()}
+        
+        if 'confidence' in fields or 'prediction_interval' in fields:
+            intervals, confidences = self._calculate_uncertainty(features, predictions)
+            if 'confidence' in fields:
+                columns['confidence'] = (confidences * 100).tolist()
+            if 'prediction_interval' in fields:
+                columns['prediction_interval'] = intervals
+        
+        if 'price_distribution' in fields:
+            columns['price_distribution'] = self._calculate_distribution(dense, ward_codes)
+        
+        if 'contributions' in fields:
+            columns['contributions'] = self._calculate_contributions(dense, ward_codes)
+        
+        # 使用された特徴量（デバッグ用、area_ratioを除外）
+        if 'features_used' in fields:
+            columns['features_used'] = [self.layout.features_used(row) for row in features]
+        
+        return columns
+    
+    def _result_fields(self, fields: Optional[Collection[str]]) -> Collection[str]:
+        """
+        結果に含める項目（省略時は全項目）
+        """
+        return self.RESULT_FIELDS if fields is None else fields
+    
+    def _needs_features(self, fields: Collection[str]) -> bool:
+        """
+        要求された項目の計算に特徴量行列 (N, F) への展開が必要か
+        
+        線形カーネルの価格予測はコンパクト表現だけで計算できるため、
+        信頼度・予測区間・使用特徴量を返さない場合は展開を省略する。
+        """
+        return (
+            self.kernel is None
+            or 'confidence' in fields
+            or 'prediction_interval' in fields
+            or 'features_used' in fields
+        )
+    
+    def _predict_compact(self, dense: np.ndarray, ward_codes: np.ndarray,
+                         features: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        コンパクト表現からの推論
+        
+        線形モデルは密な特徴量の内積 + 区ごとの寄与テーブル参照、木モデルはフラットな
+        配列の一括評価、それ以外は特徴量行列に展開して sklearn で推論する。
+        
+        Args:
+            dense: 密な特徴量 (N, K)
+            ward_codes: 区コード (N,)
+            features: 展開済みの特徴量行列 (N, F)（木モデル・sklearn 経由の場合に再利用）
+            
+        Returns:
+            np.ndarray: 予測値 (N,)
+        """
+        if isinstance(self.kernel, TreeEnsembleKernel) and features is not None:
+            return self.kernel.predict(features)
+        if self.kernel is not None:
+            return self.kernel.predict_compact(dense, ward_codes)
+        
+        if features is None:
+            features = self.layout.expand(dense, ward_codes)
+        return self.model.predict(self.scaler.transform(features))
+    
+    def _compile_kernel(self) -> Optional[Union[LinearKernel, TreeEnsembleKernel]]:
+        """
+        スケーラーとモデルを1つの推論カーネルに畳み込み
+        
+        線形モデルは重みベクトル、勾配ブースティング木はフラットな木の配列にまとめる。
+        
+        Returns:
+            Optional[Union[LinearKernel, TreeEnsembleKernel]]: 対応外のモデルの場合はNone（sklearn経由で推論）
+        """
+        if self.artifact is not None:
+            # 成果物には sklearn モデルが含まれないためフォールバックせずに失敗させる
+            mean, scale = self.artifact.array('scaler_mean'), self.artifact.array('scaler_scale')
+            trees = self.artifact.trees
+            if trees is not None:
+                kernel = TreeEnsembleKernel.from_arrays(trees, mean, scale)
+            else:
+                kernel = LinearKernel.from_coefficients(
+                    self.artifact.array('coef'), self.artifact.intercept, mean, scale
+                )
+            kernel.bind_layout(self.layout)
+            return kernel
+        
+        try:
+            if hasattr(self.model, '_predictors'):
+                kernel = TreeEnsembleKernel.from_arrays(
+                    flatten_tree_ensemble(self.model), *scaler_parameters(self.scaler)
+                )
+            else:
+                kernel = LinearKernel.from_estimators(self.model, self.scaler)
+        except (TypeError, ValueError) as e:
+            self.logger.warning(f"Inference kernel unavailable, falling back to sklearn: {e}")
+            return None
+        
+        try:
+            kernel.bind_layout(self.layout)
+        except ValueError as e:
+            self.logger.warning(f"Inference kernel layout mismatch, falling back to sklearn: {e}")
+            return None
+        
+        return kernel
+    
+    def _apply_precision(self) -> None:
+        """
+        float32 推論の精度検証と有効化
+        
+        参照サンプルを float64 と float32 のカーネルで推論し、万円単位に丸めた
+        予測値の最大差が precision_tolerance 以内の場合のみ、重み・特徴量バッファを
+        float32 に切り替える。超えた場合は float64 のまま稼働する。
+        """
+        self.precision_deviation = None
+        if self.precision == "float64":
+            return
+        if self.kernel is None:
+            self.logger.warning("Float32 inference requires an inference kernel, keeping float64")
+            return
+        
+        dense, ward_codes = self._precision_reference()
+        candidate = self.kernel.astype(np.float32)
+        reference = np.round(np.abs(self.kernel.predict_compact(dense, ward_codes)), 0)
+        predictions = candidate.predict_compact(dense.astype(np.float32), ward_codes)
+        deviation = float(np.max(np.abs(np.round(np.abs(predictions.astype(np.float64)), 0) - reference)))
+        self.precision_deviation = deviation
+        
+        if deviation > self.precision_tolerance:
+            self.logger.warning(
+                f"Refusing float32 inference: max deviation {deviation:.0f} exceeds "
+                f"tolerance {self.precision_tolerance:.0f} (万円)"
+            )
+            return
+        
+        self.kernel = candidate
+        self.layout.dtype = np.dtype(np.float32)
+        self.logger.info(f"Float32 inference enabled (max deviation {deviation:.0f} 万円)")
+    
+    def _precision_reference(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        精度検証用の参照サンプル（全区・未知の区と地区を含む乱数入力）をコンパクト表現で生成
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 密な特徴量 (N, K) と区コード (N,)
+        """
+        size = self.PRECISION_REFERENCE_SIZE
+        rng = np.random.default_rng(self.PRECISION_REFERENCE_SEED)
+        columns = {}
+        for name, (low, high) in self.PRECISION_REFERENCE_RANGES.items():
+            if isinstance(low, int):
+                columns[name] = rng.integers(low, high, size).tolist()
+            else:
+                columns[name] = rng.uniform(low, high, size).tolist()
+        
+        wards = self.layout.ward_names + [None]
+        districts = list(self.vocabularies.get('district', [])) + [None]
+        columns['ward_name'] = [wards[i] for i in rng.integers(0, len(wards), size)]
+        columns['district'] = [districts[i] for i in rng.integers(0, len(districts), size)]
+        return self.prepare_compact_columns(columns, size)
+    
+    @property
+    def load_options(self) -> Dict[str, Any]:
+        """同じ設定で ModelLoader を再生成するための引数（model_dir 以外）"""
+        return {
+            'lean': self.lean,
+            'precision': self.precision,
+            'precision_tolerance': self.precision_tolerance
+        }
+    
+    @property
+    def active_precision(self) -> str:
+        """稼働中の推論精度"""
+        return "float32" if self.kernel is not None and self.kernel.dtype == np.float32 else "float64"
+    
+    def _compile_interval_kernel(self) -> Optional[IntervalKernel]:
+        """
+        学習時に保存した統計量から予測区間カーネルを生成
+        
+        Returns:
+            Optional[IntervalKernel]: 統計量を持たないモデルの場合はNone（簡易信頼度を使用）
+        """
+        if self.artifact is not None:
+            stats = self.artifact.interval_statistics
+            mean, scale = self.artifact.array('scaler_mean'), self.artifact.array('scaler_scale')
+        else:
+            stats = self.feature_info.get('interval_stats')
+            mean, scale = scaler_parameters(self.scaler)
+        
+        if stats is None:
+            self.logger.info("Model has no interval statistics, using heuristic confidence")
+            return None
+        
+        try:
+            interval_kernel = IntervalKernel.from_statistics(stats, mean, scale)
+        except (KeyError, ValueError) as e:
+            self.logger.warning(f"Prediction intervals unavailable: {e}")
+            return None
+        
+        if interval_kernel.feature_count != self.layout.feature_count:
+            self.logger.warning("Interval statistics do not match the feature layout")
+            return None
+        
+        return interval_kernel
+    
+    def _compile_ensemble_kernel(self) -> Optional[EnsembleKernel]:
+        """
+        学習時に保存したブートストラップアンサンブルの係数行列からカーネルを生成
+        
+        Returns:
+            Optional[EnsembleKernel]: アンサンブルを持たないモデルの場合はNone
+        """
+        if self.artifact is not None:
+            ensemble = self.artifact.ensemble
+            mean, scale = self.artifact.array('scaler_mean'), self.artifact.array('scaler_scale')
+        else:
+            ensemble = self.feature_info.get('ensemble')
+            mean, scale = scaler_parameters(self.scaler)
+        
+        if ensemble is None:
+            return None
+        
+        try:
+            ensemble_kernel = EnsembleKernel.from_coefficients(ensemble['coef'], ensemble['intercept'], mean, scale)
+            ensemble_kernel.bind_layout(self.layout)
+        except (KeyError, ValueError) as e:
+            self.logger.warning(f"Bootstrap ensemble unavailable: {e}")
+            return None
+        
+        self.logger.info(f"Bootstrap ensemble loaded: {ensemble_kernel.replicas} replicas")
+        return ensemble_kernel
+    
+    def _calculate_distribution(self, dense: np.ndarray,
+                                ward_codes: np.ndarray) -> List[Optional[Dict[str, Any]]]:
+        """
+        ブートストラップアンサンブルによる予測価格の分布（平均・標準偏差・パーセンタイル）
+        
+        全レプリカの予測は1回の行列積 (N, K_dense) × (K_dense, K) で求める。
+        分布は回帰係数の推定の不確かさを表し、個別物件のばらつき（予測区間）は含まない。
+        
+        Args:
+            dense: 密な特徴量 (N, K_dense)
+            ward_codes: 区コード (N,)
+            
+        Returns:
+            List[Optional[Dict[str, Any]]]: 予測分布のリスト（アンサンブルを持たないモデルではNone）
+        """
+        if self.ensemble_kernel is None:
+            return [None] * len(ward_codes)
+        
+        replicas = np.abs(self.ensemble_kernel.predict_compact(dense, ward_codes))
+        means = np.round(replicas.mean(axis=1), 0).tolist()
+        stds = np.round(replicas.std(axis=1, ddof=1), 1).tolist()
+        bands = np.round(np.percentile(replicas, self.ENSEMBLE_PERCENTILES, axis=1), 0).T.tolist()
+        names = [f"p{q}" for q in self.ENSEMBLE_PERCENTILES]
+        count = self.ensemble_kernel.replicas
+        return [
+            {'mean': mean, 'std': std, 'percentiles': dict(zip(names, band)), 'replicas': count}
+            for mean, std, band in zip(means, stds, bands)
+        ]
+    
+    def _calculate_contributions(self, dense: np.ndarray,
+                                 ward_codes: np.ndarray) -> List[Optional[Dict[str, Any]]]:
+        """
+        特徴量ごとの価格寄与（万円）の一括計算
+        
+        線形カーネルの 重み × (値 - 学習データの平均) をバッチ全体で1回の要素積として求める。
+        baseline（学習データの平均での予測値）と各寄与の和が負値補正前の予測値になる。
+        
+        Args:
+            dense: 密な特徴量 (N, K)
+            ward_codes: 区コード (N,)
+            
+        Returns:
+            List[Optional[Dict[str, Any]]]: baseline と特徴量名 -> 寄与 のリスト（線形カーネルが無い場合はNone）
+        """
+        if not isinstance(self.kernel, LinearKernel) or self.kernel.dense_baseline is None:
+            return [None] * len(ward_codes)
+        
+        dense_contributions, ward_contributions = self.kernel.contributions_compact(dense, ward_codes)
+        names = [self.layout.feature_columns[slot] for slot in self.layout.dense_slots.tolist()]
+        if self.layout.ward_names:
+            names.append(self.WARD_CONTRIBUTION)
+            dense_contributions = np.column_stack([dense_contributions, ward_contributions])
+        
+        baseline = round(self.kernel.base_value, 1)
+        return [
+            {'baseline': baseline, 'features': dict(zip(names, row))}
+            for row in np.round(dense_contributions.astype(np.float64), 1).tolist()
+        ]
+    
+    def _calculate_uncertainty(self, features: np.ndarray,
+                               prices: np.ndarray) -> Tuple[List[Optional[Dict[str, float]]], np.ndarray]:
+        """
+        予測区間と信頼度の一括計算
+        
+        予測区間は学習時の残差分散と係数共分散による解析解で、信頼度は
+        1 - 区間の半幅 / 予測価格 とする。統計量を持たないモデルでは
+        予測区間を None とし、特徴量の充実度による簡易信頼度を返す。
+        
+        Args:
+            features: 特徴量行列 (N, F)
+            prices: 予測価格 (N,)
+            
+        Returns:
+            Tuple[List[Optional[Dict[str, float]]], np.ndarray]: 予測区間のリストと信頼度（0-1）(N,)
+        """
+        if self.interval_kernel is None:
+            return [None] * len(prices), self._calculate_confidence_batch(features)
+        
+        half_width = self.interval_kernel.half_width(features)
+        lower = np.round(np.maximum(prices - half_width, 0), 0)
+        upper = np.round(prices + half_width, 0)
+        confidence = np.round(np.clip(1 - half_width / np.maximum(prices, 1.0), 0, 1), 3)
+        
+        level = self.interval_kernel.level
+        intervals = [
+            {'lower': low, 'upper': high, 'level': level}
+            for low, high in zip(lower.tolist(), upper.tolist())
+        ]
+        return intervals, confidence
+    
+    def _calculate_confidence_batch(self, features: np.ndarray) -> np.ndarray:
+        """
+        簡易信頼度の一括計算（特徴量の充実度に基づく、予測区間の統計量が無いモデル用）
+        
+        Args:
+            features: 特徴量行列 (N, F)
+            
+        Returns:
+            np.ndarray: 信頼度（0-1）(N,)
+        """
+        feature_completeness = np.count_nonzero(features, axis=1) / features.shape[1]
+        confidence = 0.7 + (feature_completeness * 0.25)
+        return np.round(np.minimum(confidence, 0.95), 3)
     
     def is_loaded(self) -> bool:
         """
@@ -202,11 +831,30 @@ class ModelLoader:
         Returns:
             bool: 読み込み状態
         """
-        return all([
-            self.model is not None,
-            self.scaler is not None,
-            self.feature_info is not None
-        ])
+        # 成果物形式では sklearn のモデル・スケーラーを持たず、カーネルのみで推論する
+        return self.feature_info is not None and (
+            self.kernel is not None or (self.model is not None and self.scaler is not None)
+        )
+    
+    def memory_footprint(self) -> int:
+        """
+        読み込み済みモデルのメモリ使用量の概算（バイト）
+        
+        読み込んだファイルのサイズ（model.bin はメモリマップ、joblib は展開後の
+        sklearn オブジェクトの目安）と、推論カーネル・レイアウトが保持する配列の合計。
+        
+        Returns:
+            int: バイト数
+        """
+        total = sum(os.path.getsize(path) for path in self.loaded_paths if os.path.exists(path))
+        for component in (self.kernel, self.interval_kernel, self.ensemble_kernel, self.layout):
+            if component is None:
+                continue
+            total += sum(
+                value.nbytes for value in vars(component).values()
+                if isinstance(value, np.ndarray) and not isinstance(value, np.memmap)
+            )
+        return total
     
     def get_model_info(self) -> Dict[str, Any]:
         """
@@ -220,8 +868,28 @@ class ModelLoader:
         
         return {
             "status": "loaded",
-            "model_type": type(self.model).__name__,
+            "runtime": "lean" if self.lean else "standard",
+            "model_version": self.model_version,
+            "model_type": self.model_type,
+            "artifact_format": "artifact" if self.artifact is not None else "joblib",
             "feature_count": len(self.feature_info['feature_columns']),
             "features": self.feature_info['feature_columns'][:10],  # 先頭10個
-            "scaler_type": type(self.scaler).__name__
+            "scaler_type": self.scaler_type,
+            "inference_path": self.kernel.INFERENCE_PATH if self.kernel is not None else "sklearn",
+            "precision": {
+                "requested": self.precision,
+                "active": self.active_precision,
+                "max_deviation": self.precision_deviation,
+                "tolerance": self.precision_tolerance
+            },
+            "prediction_interval": (
+                {"level": self.interval_kernel.level,
+                 "residual_std": round(self.interval_kernel.residual_variance ** 0.5, 1)}
+                if self.interval_kernel is not None else None
+            ),
+            "ensemble": (
+                {"replicas": self.ensemble_kernel.replicas, "percentiles": list(self.ENSEMBLE_PERCENTILES)}
+                if self.ensemble_kernel is not None else None
+            ),
+            "district_encoder": self.district_encoder.get_stats() if self.district_encoder else None
         }
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""
+複数モデルのレジストリ - 名前・エイリアスで選択できるモデルを並行して提供
+"""
+
+import logging
+import os
+from typing import Dict, Any, Optional, Callable
+
+from model_loader import ModelLoader
+from model_reloader import ModelReloader, add_reload_signal_handler, remove_reload_signal_handler
+
+
+class ModelRegistry:
+    """
+    名前付きモデルを複数読み込み、リクエストごとに切り替えるレジストリ
+
+    train_model.py（LinearRegression, 区名 One-hot）と fix_model.py
+    （Ridge, ward_encoded）のように特徴量スキーマが異なるモデルも、
+    各 ModelLoader が自身の特徴量レイアウトを持つため同時に提供できる。
+    各モデルは個別の ModelReloader で再読み込みされる。
+    """
+
+    DEFAULT_ALIAS = "default"
+
+    def __init__(self, model_dirs: Dict[str, str], default: Optional[str] = None,
+                 aliases: Optional[Dict[str, str]] = None, watch_interval: float = 0.0,
+                 lean: bool = False, precision: str = "float64", precision_tolerance: float = 1.0,
+                 on_swap: Optional[Callable[[str, ModelLoader, Optional[ModelLoader]], None]] = None):
+        """
+        レジストリの初期化（全モデルの読み込みを含む）
+
+        Args:
+            model_dirs: モデル名 -> モデルディレクトリ
+            default: デフォルトモデル名（省略時は先頭のモデル）
+            aliases: エイリアス -> モデル名
+            watch_interval: ファイル更新監視の間隔（秒、0 以下で監視しない）
+            lean: 軽量ランタイム（model.bin のみ読み込み、scikit-learn を使用しない）
+            precision: 推論精度（float64 / float32）
+            precision_tolerance: float32 を有効にする万円単位の最大差
+            on_swap: モデル差し替え時のコールバック (モデル名, 新モデル, 旧モデル)
+        """
+        if not model_dirs:
+            raise ValueError("At least one model must be registered")
+
+        self.logger = logging.getLogger(__name__)
+        self.on_swap = on_swap
+        self.default_name = default or next(iter(model_dirs))
+        self.aliases = dict(aliases or {})
+        self.aliases.setdefault(self.DEFAULT_ALIAS, self.default_name)
+
+        for alias, name in self.aliases.items():
+            if name not in model_dirs:
+                raise ValueError(f"Alias '{alias}' points to unknown model '{name}'")
+
+        self._loaders: Dict[str, ModelLoader] = {}
+        self.reloaders: Dict[str, ModelReloader] = {
+            name: ModelReloader(
+                model_dir=model_dir,
+                on_swap=self._make_swap_handler(name),
+                watch_interval=watch_interval,
+                lean=lean,
+                precision=precision,
+                precision_tolerance=precision_tolerance
+            )
+            for name, model_dir in model_dirs.items()
+        }
+        self.logger.info(
+            f"Model registry ready: models={list(self.reloaders)}, default={self.default_name}"
+        )
+
+    @classmethod
+    def from_env(cls, on_swap: Optional[Callable[[str, ModelLoader, Optional[ModelLoader]], None]] = None
+                 ) -> "ModelRegistry":
+        """
+        環境変数から設定を読み込んで生成
+
+        MODEL_REGISTRY: "名前=ディレクトリ" のカンマ区切り（未設定時は MODEL_DIR を "default" として登録）
+        MODEL_DEFAULT: デフォルトモデル名（省略時は先頭のモデル）
+        MODEL_ALIASES: "エイリアス=名前" のカンマ区切り
+        MODEL_WATCH_INTERVAL: ファイル更新監視の間隔（秒、デフォルト 0 = 監視しない）
+        MODEL_LEAN_RUNTIME: true で軽量ランタイム（model.bin 必須、デフォルト false）
+        MODEL_PRECISION: 推論精度（float64 / float32、デフォルト float64）
+        MODEL_PRECISION_TOLERANCE: float32 を有効にする万円単位の最大差（デフォルト 1）
+        """
+        model_dirs = cls._parse_pairs(os.getenv('MODEL_REGISTRY', ''))
+        if not model_dirs:
+            model_dirs = {cls.DEFAULT_ALIAS: os.getenv('MODEL_DIR', './models')}
+
+        return cls(
+            model_dirs=model_dirs,
+            default=os.getenv('MODEL_DEFAULT') or None,
+            aliases=cls._parse_pairs(os.getenv('MODEL_ALIASES', '')),
+            watch_interval=float(os.getenv('MODEL_WATCH_INTERVAL', '0')),
+            lean=os.getenv('MODEL_LEAN_RUNTIME', 'false').lower() == 'true',
+            precision=os.getenv('MODEL_PRECISION', 'float64').lower(),
+            precision_tolerance=float(os.getenv('MODEL_PRECISION_TOLERANCE', '1')),
+            on_swap=on_swap
+        )
+
+    @staticmethod
+    def _parse_pairs(value: str) -> Dict[str, str]:
+        """
+        "key=value,key=value" 形式の文字列を辞書に変換
+        """
+        pairs = {}
+        for item in value.split(','):
+            if not item.strip():
+                continue
+            key, sep, val = item.partition('=')
+            if not sep or not key.strip() or not val.strip():
+                raise ValueError(f"Invalid entry '{item}', expected name=value")
+            pairs[key.strip()] = val.strip()
+        return pairs
+
+    def _make_swap_handler(self, name: str) -> Callable[[ModelLoader], None]:
+        """
+        ModelReloader の差し替えをレジストリに反映するハンドラを生成
+        """
+        def handle_swap(loader: ModelLoader) -> None:
+            previous = self._loaders.get(name)
+            self._loaders[name] = loader
+            if self.on_swap:
+                self.on_swap(name, loader, previous)
+        return handle_swap
+
+    def resolve_name(self, name: Optional[str] = None) -> str:
+        """
+        モデル名・エイリアスを登録済みのモデル名に解決
+
+        Args:
+            name: モデル名またはエイリアス（省略時はデフォルト）
+
+        Returns:
+            str: モデル名
+        """
+        if not name:
+            return self.default_name
+        if name in self._loaders:
+            return name
+        if name in self.aliases:
+            return self.aliases[name]
+        raise KeyError(name)
+
+    def get(self, name: Optional[str] = None) -> ModelLoader:
+        """
+        稼働中の ModelLoader を取得
+
+        Args:
+            name: モデル名またはエイリアス（省略時はデフォルト）
+
+        Returns:
+            ModelLoader: モデルローダー
+        """
+        return self._loaders[self.resolve_name(name)]
+
+    @property
+    def names(self):
+        """登録済みのモデル名"""
+        return list(self._loaders)
+
+    async def reload(self, name: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        モデルの再読み込み
+
+        Args:
+            name: モデル名またはエイリアス（省略時は全モデル）
+
+        Returns:
+            Dict[str, Dict[str, Any]]: モデル名 -> 再読み込み後の状態
+        """
+        names = [self.resolve_name(name)] if name else self.names
+        return {model_name: await self.reloaders[model_name].reload() for model_name in names}
+
+    def start(self) -> None:
+        """
+        各モデルのファイル更新監視と SIGHUP による全モデル再読み込みを開始
+        """
+        add_reload_signal_handler(self.reload)
+        for reloader in self.reloaders.values():
+            reloader.start(handle_signals=False)
+
+    async def stop(self) -> None:
+        """
+        各モデルのファイル更新監視と SIGHUP ハンドラを停止
+        """
+        remove_reload_signal_handler()
+        for reloader in self.reloaders.values():
+            await reloader.stop()
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        レジストリ状態の取得
+
+        Returns:
+            Dict[str, Any]: デフォルト・エイリアス・各モデルの状態
+        """
+        models = {}
+        for name, reloader in self.reloaders.items():
+            loader = self._loaders[name]
+            models[name] = {
+                **reloader.get_status(),
+                "model_type": loader.model_type,
+                "precision": loader.active_precision,
+                "feature_count": loader.layout.feature_count
+            }
+        return {
+            "default": self.default_name,
+            "aliases": self.aliases,
+            "models": models
+        }
@@ -0,0 +1,234 @@
+"""
+モデルのホットリロード - バックグラウンド読み込みとアトミックな切り替え
+"""
+
+import asyncio
+import logging
+import os
+import signal
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Callable, Tuple, Awaitable
+
+from model_loader import ModelLoader
+
+
+def add_reload_signal_handler(reload: Callable[[], Awaitable[Any]]) -> None:
+    """
+    SIGHUP 受信時に reload を実行するハンドラを登録（イベントループ上で呼ぶこと）
+
+    Args:
+        reload: 再読み込みを行うコルーチン関数
+    """
+    try:
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGHUP, lambda: asyncio.ensure_future(reload())
+        )
+    except (NotImplementedError, AttributeError, RuntimeError, ValueError):
+        # Windows・メインスレッド以外では未対応
+        logging.getLogger(__name__).info("SIGHUP reload is not available on this platform")
+
+
+def remove_reload_signal_handler() -> None:
+    """
+    SIGHUP ハンドラの登録解除
+    """
+    try:
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+    except (NotImplementedError, AttributeError, RuntimeError, ValueError):
+        pass
+
+
+class ModelReloader:
+    """
+    model_dir のモデルを再読み込みし、稼働中の ModelLoader を差し替えるクラス
+
+    新しい成果物の読み込み・検証・ウォームアップはワーカースレッドで行い、
+    成功した場合のみイベントループ上で参照を差し替える。処理中のリクエストは
+    取得済みの旧 ModelLoader をそのまま使い続けるため、切り替え時に
+    リクエストが失敗することはない。
+    """
+
+    def __init__(self, model_dir: str = "./models",
+                 on_swap: Optional[Callable[[ModelLoader], None]] = None,
+                 watch_interval: float = 0.0, lean: bool = False,
+                 precision: str = "float64", precision_tolerance: float = 1.0):
+        """
+        リローダーの初期化（初回のモデル読み込みを含む）
+
+        Args:
+            model_dir: モデルファイルが格納されているディレクトリ
+            on_swap: 差し替え時に新しい ModelLoader を受け取るコールバック
+            watch_interval: ファイル更新監視の間隔（秒、0 以下で監視しない）
+            lean: 軽量ランタイム（model.bin のみ読み込み、scikit-learn を使用しない）
+            precision: 推論精度（float64 / float32）
+            precision_tolerance: float32 を有効にする万円単位の最大差
+        """
+        self.model_dir = model_dir
+        self.lean = lean
+        self.precision = precision
+        self.precision_tolerance = precision_tolerance
+        self.on_swap = on_swap
+        self.watch_interval = float(watch_interval)
+        self.logger = logging.getLogger(__name__)
+
+        self.reload_count = 0
+        self.last_reload_at: Optional[str] = None
+        self.last_reload_error: Optional[str] = None
+        self._reload_lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+        self._failed_signature: Optional[Tuple] = None
+        self._handles_signals = False
+
+        self.current = self._load()
+        self.loaded_at = self._now()
+        self._signature = self._artifact_signature()
+        if self.on_swap:
+            self.on_swap(self.current)
+
+    @classmethod
+    def from_env(cls, on_swap: Optional[Callable[[ModelLoader], None]] = None) -> "ModelReloader":
+        """
+        環境変数から設定を読み込んで生成
+
+        MODEL_DIR: モデルディレクトリ（デフォルト ./models）
+        MODEL_WATCH_INTERVAL: ファイル更新監視の間隔（秒、デフォルト 0 = 監視しない）
+        MODEL_LEAN_RUNTIME: true で軽量ランタイム（model.bin 必須、デフォルト false）
+        MODEL_PRECISION: 推論精度（float64 / float32、デフォルト float64）
+        MODEL_PRECISION_TOLERANCE: float32 を有効にする万円単位の最大差（デフォルト 1）
+        """
+        return cls(
+            model_dir=os.getenv('MODEL_DIR', './models'),
+            on_swap=on_swap,
+            watch_interval=float(os.getenv('MODEL_WATCH_INTERVAL', '0')),
+            lean=os.getenv('MODEL_LEAN_RUNTIME', 'false').lower() == 'true',
+            precision=os.getenv('MODEL_PRECISION', 'float64').lower(),
+            precision_tolerance=float(os.getenv('MODEL_PRECISION_TOLERANCE', '1'))
+        )
+
+    def _load(self) -> ModelLoader:
+        """
+        新しい ModelLoader を読み込み、ウォームアップで検証
+        """
+        loader = ModelLoader(
+            model_dir=self.model_dir, lean=self.lean,
+            precision=self.precision, precision_tolerance=self.precision_tolerance
+        )
+        loader.warm_up()
+        return loader
+
+    async def reload(self) -> Dict[str, Any]:
+        """
+        モデルを再読み込みし、成功した場合のみ差し替え
+
+        Returns:
+            Dict[str, Any]: 再読み込み後の状態（失敗時は last_reload_error を含む）
+        """
+        async with self._reload_lock:
+            previous_version = self.current.model_version
+            signature = self._artifact_signature()
+            try:
+                new_loader = await asyncio.to_thread(self._load)
+            except Exception as e:
+                self._failed_signature = signature
+                self.last_reload_error = str(e)
+                self.logger.error(f"Model reload failed, keeping version {previous_version}: {e}")
+                return self.get_status()
+
+            # イベントループ上で参照を差し替え（処理中のリクエストは旧モデルを継続使用）
+            self.current = new_loader
+            self.reload_count += 1
+            self.loaded_at = self.last_reload_at = self._now()
+            self.last_reload_error = None
+            self._signature = signature
+            if self.on_swap:
+                self.on_swap(new_loader)
+
+            self.logger.info(f"Model reloaded: {previous_version} -> {new_loader.model_version}")
+            return self.get_status()
+
+    def start(self, handle_signals: bool = True) -> None:
+        """
+        ファイル更新監視と SIGHUP による再読み込みを開始（イベントループ上で呼ぶこと）
+
+        Args:
+            handle_signals: SIGHUP ハンドラを登録するか
+        """
+        self._handles_signals = handle_signals
+        if handle_signals:
+            add_reload_signal_handler(self.reload)
+
+        if self.watch_interval > 0:
+            self._watch_task = asyncio.ensure_future(self._watch())
+            self.logger.info(f"Watching {self.model_dir} every {self.watch_interval}s")
+
+    async def stop(self) -> None:
+        """
+        ファイル更新監視と SIGHUP ハンドラを停止
+        """
+        if self._handles_signals:
+            remove_reload_signal_handler()
+            self._handles_signals = False
+
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def _watch(self) -> None:
+        """
+        成果物ファイルの更新を監視し、変更が落ち着いたら再読み込み
+
+        学習スクリプトは複数ファイルを順に書き込むため、2回連続で同じ
+        シグネチャを観測した時点で書き込み完了とみなす。
+        """
+        pending: Optional[Tuple] = None
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            signature = self._artifact_signature()
+            if signature in (self._signature, self._failed_signature):
+                pending = None
+            elif signature != pending:
+                pending = signature
+            else:
+                pending = None
+                await self.reload()
+
+    @staticmethod
+    def _now() -> str:
+        """
+        現在時刻（UTC, ISO 8601）
+        """
+        return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    def _artifact_signature(self) -> Tuple:
+        """
+        成果物ファイルの (パス, 更新時刻, サイズ) の組
+        """
+        signature = []
+        for path in self.current.artifact_paths():
+            try:
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        再読み込み状態の取得
+
+        Returns:
+            Dict[str, Any]: 稼働中のモデルバージョン・最終再読み込み時刻など
+        """
+        return {
+            "model_dir": self.model_dir,
+            "active_version": self.current.model_version,
+            "loaded_at": self.loaded_at,
+            "reload_count": self.reload_count,
+            "last_reload_at": self.last_reload_at,
+            "last_reload_error": self.last_reload_error,
+            "watching": self._watch_task is not None
+        }
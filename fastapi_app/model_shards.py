@@ -0,0 +1,263 @@
+"""
+地域シャード - 地域ごとのモデルを初回使用時に読み込み、メモリ上限付きの LRU で保持
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Sequence, Mapping, Tuple, FrozenSet
+
+from model_loader import ModelLoader
+
+
+class RegionShards:
+    """
+    地域（東京23区・多摩地域・他府県など）ごとのモデルを必要な時だけ読み込むクラス
+
+    全ての地域のモデルを全ワーカーで読み込むとメモリと起動時間が地域数に比例して
+    増えるため、各シャードはその地域の要求が初めて届いた時に読み込み、読み込み済み
+    モデルのメモリ使用量の合計が max_memory_mb を超えたら最も長く使われていない
+    シャードから破棄する。preload に指定した地域は起動時に読み込み、破棄しない。
+    要求は市区町村コード、区名の順でシャードに振り分ける。
+    """
+
+    def __init__(self, shards: Mapping[str, Mapping[str, Any]], max_memory_mb: float = 512.0,
+                 preload: Sequence[str] = (), load_options: Optional[Dict[str, Any]] = None):
+        """
+        地域シャードの初期化（モデルは読み込まない）
+
+        Args:
+            shards: 地域名 -> {"model_dir": ディレクトリ, "wards": 区名リスト, "area_codes": 市区町村コードリスト}
+            max_memory_mb: 読み込み済みモデルのメモリ使用量の上限（MB）
+            preload: 起動時に読み込み、破棄しない地域名のリスト
+            load_options: ModelLoader の読み込み設定（lean / precision など）
+        """
+        if not shards:
+            raise ValueError("At least one region shard must be configured")
+
+        self.logger = logging.getLogger(__name__)
+        self.max_bytes = int(float(max_memory_mb) * 1024 * 1024)
+        self.load_options = dict(load_options or {})
+        self.model_dirs: Dict[str, str] = {}
+        self.ward_routes: Dict[str, str] = {}
+        self.area_routes: Dict[str, str] = {}
+
+        for region, spec in shards.items():
+            if 'model_dir' not in spec:
+                raise ValueError(f"Region shard '{region}' has no model_dir")
+            self.model_dirs[region] = spec['model_dir']
+            for routes, keys in ((self.ward_routes, spec.get('wards', [])),
+                                 (self.area_routes, spec.get('area_codes', []))):
+                for key in keys:
+                    key = str(key)
+                    if routes.get(key, region) != region:
+                        raise ValueError(f"'{key}' is routed to both '{routes[key]}' and '{region}'")
+                    routes[key] = region
+
+        unknown = [region for region in preload if region not in self.model_dirs]
+        if unknown:
+            raise ValueError(f"Preload regions {unknown} are not configured")
+        self.pinned = list(preload)
+
+        self._loaded: "OrderedDict[str, ModelLoader]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._load_locks = {region: threading.Lock() for region in self.model_dirs}
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+        self.logger.info(
+            f"Region shards configured: regions={list(self.model_dirs)}, "
+            f"max_memory={max_memory_mb}MB, preload={self.pinned}"
+        )
+
+    @property
+    def wards(self) -> FrozenSet[str]:
+        """
+        シャードに振り分ける区名（予測リクエストの区名の許可リストに加える）
+        """
+        return frozenset(self.ward_routes)
+
+    @classmethod
+    def from_env(cls, load_options: Optional[Dict[str, Any]] = None) -> Optional["RegionShards"]:
+        """
+        環境変数で指定された設定ファイルから生成
+
+        MODEL_SHARDS_CONFIG: 地域シャードの設定ファイル（JSON、未設定時は地域シャードを使用しない）
+            {"max_memory_mb": 512, "preload": ["tokyo23"],
+             "shards": {"tama": {"model_dir": "...", "wards": ["八王子市"], "area_codes": ["13201"]}}}
+
+        Args:
+            load_options: ModelLoader の読み込み設定
+
+        Returns:
+            Optional[RegionShards]: 地域シャード（未設定の場合はNone）
+        """
+        path = os.getenv('MODEL_SHARDS_CONFIG')
+        if not path:
+            return None
+
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(
+            shards=config['shards'],
+            max_memory_mb=config.get('max_memory_mb', 512.0),
+            preload=config.get('preload', []),
+            load_options=load_options
+        )
+
+    def route(self, ward_name: Optional[str], area_code: Optional[str] = None) -> Optional[str]:
+        """
+        要求を担当する地域の決定
+
+        Args:
+            ward_name: 区名（市区町村名）
+            area_code: 市区町村コード（指定時は区名より優先）
+
+        Returns:
+            Optional[str]: 地域名（どのシャードも担当しない場合はNone）
+        """
+        if area_code and area_code in self.area_routes:
+            return self.area_routes[area_code]
+        return self.ward_routes.get(ward_name)
+
+    def is_loaded(self, region: str) -> bool:
+        """読み込み済みの地域か"""
+        return region in self._loaded
+
+    def get(self, region: str) -> ModelLoader:
+        """
+        地域のモデルを取得（未読み込みの場合は読み込み、上限を超えたら古いシャードを破棄）
+
+        読み込みはブロッキング処理のため、イベントループからは aget を使う。
+
+        Args:
+            region: 地域名
+
+        Returns:
+            ModelLoader: モデルローダー
+        """
+        with self._lock:
+            loader = self._loaded.get(region)
+            if loader is not None:
+                self._loaded.move_to_end(region)
+                self.hits += 1
+                return loader
+
+        # 同じ地域の同時読み込みは1回にまとめ、他の地域の参照は止めない
+        with self._load_locks[region]:
+            with self._lock:
+                loader = self._loaded.get(region)
+                if loader is not None:
+                    self.hits += 1
+                    return loader
+
+            started = time.monotonic()
+            loader = ModelLoader(model_dir=self.model_dirs[region], **self.load_options)
+            size = loader.memory_footprint()
+            elapsed = time.monotonic() - started
+
+            with self._lock:
+                self._loaded[region] = loader
+                self._sizes[region] = size
+                self.loads += 1
+                self.load_seconds += elapsed
+                self._evict(keep=region)
+            self.logger.info(
+                f"Region shard '{region}' loaded in {elapsed * 1e3:.0f}ms "
+                f"({size / 1024 / 1024:.1f}MB, version={loader.model_version})"
+            )
+            return loader
+
+    async def aget(self, region: str) -> ModelLoader:
+        """
+        地域のモデルを取得（読み込みが必要な場合のみスレッドで実行しイベントループを止めない）
+
+        Args:
+            region: 地域名
+
+        Returns:
+            ModelLoader: モデルローダー
+        """
+        if self.is_loaded(region):
+            return self.get(region)
+        return await asyncio.to_thread(self.get, region)
+
+    async def loaders(self, requests_data: List[Dict[str, Any]],
+                      default: ModelLoader) -> Tuple[List[Optional[str]], List[ModelLoader]]:
+        """
+        要求ごとの地域とモデルの決定（必要な地域のみ読み込み、どの地域にも属さない要求は default）
+
+        Args:
+            requests_data: API リクエストデータのリスト
+            default: シャードが担当しない要求に使うモデル
+
+        Returns:
+            Tuple[List[Optional[str]], List[ModelLoader]]: 要求ごとの地域名（default の場合はNone）とモデル
+        """
+        regions = [self.route(r.get('ward_name'), r.get('area_code')) for r in requests_data]
+        loaded = {}
+        for region in dict.fromkeys(regions):
+            if region is not None:
+                loaded[region] = await self.aget(region)
+        return regions, [default if region is None else loaded[region] for region in regions]
+
+    def _evict(self, keep: str) -> None:
+        """
+        メモリ使用量が上限以下になるまで最も長く使われていないシャードを破棄（ロック取得済みで呼ぶ）
+        """
+        for region in list(self._loaded):
+            if self.memory_bytes <= self.max_bytes:
+                return
+            if region == keep or region in self.pinned:
+                continue
+            del self._loaded[region]
+            size = self._sizes.pop(region)
+            self.evictions += 1
+            self.logger.info(f"Region shard '{region}' evicted ({size / 1024 / 1024:.1f}MB)")
+
+    def preload(self) -> None:
+        """
+        preload に指定した地域の読み込み
+        """
+        for region in self.pinned:
+            self.get(region)
+
+    @property
+    def memory_bytes(self) -> int:
+        """読み込み済みシャードのメモリ使用量の合計（バイト）"""
+        return sum(self._sizes.values())
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        地域シャードの状態の取得
+
+        Returns:
+            Dict[str, Any]: 設定・読み込み済みシャード（LRU 順）・メモリ使用量・読み込み/破棄回数
+        """
+        with self._lock:
+            loaded: List[Dict[str, Any]] = [
+                {
+                    "region": region,
+                    "model_version": loader.model_version,
+                    "memory_mb": round(self._sizes[region] / 1024 / 1024, 2),
+                    "pinned": region in self.pinned
+                }
+                for region, loader in self._loaded.items()
+            ]
+            return {
+                "regions": list(self.model_dirs),
+                "loaded": loaded,
+                "memory_mb": round(self.memory_bytes / 1024 / 1024, 2),
+                "max_memory_mb": round(self.max_bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "load_seconds": round(self.load_seconds, 3)
+            }
@@ -11,7 +11,10 @@ class PredictResult(TypedDict):
     """予測処理の戻り値型定義"""
     predicted_price: float
     confidence: Optional[float]
+    prediction_interval: Optional[Dict[str, float]]
+    price_distribution: Optional[Dict[str, Any]]
     features_used: Optional[Dict[str, float]]
+    contributions: Optional[Dict[str, Any]]
 
 
 class BatchPredictResponse(BaseModel):
@@ -21,6 +24,7 @@ class BatchPredictResponse(BaseModel):
     total_processed: int = Field(..., description="処理された総件数")
     successful: int = Field(..., description="成功件数")
     failed: int = Field(..., description="失敗件数")
+    duplicates: int = Field(0, description="同一条件として1回の推論にまとめた件数")
     
     class Config:
         json_schema_extra = {
@@ -50,6 +54,74 @@ class BatchPredictResponse(BaseModel):
         }
 
 
+class ColumnarPredictResponse(BaseModel):
+    """列形式のバッチ予測レスポンスのPydanticモデル"""
+    results: Dict[str, List[Any]] = Field(..., description="項目名 -> 入力順の値リスト（無効な行は null）")
+    valid: List[bool] = Field(..., description="行ごとの検証結果のマスク")
+    errors: Dict[str, List[int]] = Field(default_factory=dict, description="列名 -> 制約に違反した行番号")
+    total_processed: int = Field(..., description="処理された総件数")
+    successful: int = Field(..., description="成功件数")
+    failed: int = Field(..., description="失敗件数")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "results": {"predicted_price": [8500.0, None]},
+                "valid": [True, False],
+                "errors": {"land_area": [1]},
+                "total_processed": 2,
+                "successful": 1,
+                "failed": 1
+            }
+        }
+
+
+class JobResponse(BaseModel):
+    """非同期ジョブの状態のPydanticモデル"""
+    job_id: str = Field(..., description="ジョブID")
+    status: str = Field(..., description="状態（uploading / queued / running / succeeded / failed / cancelled）")
+    model: str = Field(..., description="使用するモデル名")
+    model_version: Optional[str] = Field(None, description="モデルのバージョン")
+    shards: bool = Field(..., description="地域シャードに振り分けるか")
+    fields: Optional[List[str]] = Field(None, description="結果に含める項目（null は全項目）")
+    page_size: int = Field(..., description="結果1ページの件数")
+    input_bytes: int = Field(..., description="入力のバイト数")
+    total_rows: Optional[int] = Field(None, description="入力の件数（実行開始時に確定）")
+    processed_rows: int = Field(..., description="処理済みの件数")
+    failed_rows: int = Field(..., description="失敗した件数")
+    pages: int = Field(..., description="ダウンロードできる結果のページ数")
+    progress: float = Field(..., description="進捗率（0〜1）")
+    cancel_requested: bool = Field(..., description="キャンセルが要求されたか")
+    error: Optional[str] = Field(None, description="ジョブが失敗した理由")
+    created_at: str = Field(..., description="受付時刻（ISO 8601）")
+    started_at: Optional[str] = Field(None, description="実行開始時刻（ISO 8601）")
+    finished_at: Optional[str] = Field(None, description="終了時刻（ISO 8601）")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "job_id": "3f2b6c1e9a7d4e0f8b5a2c9d1e6f7a8b",
+                "status": "running",
+                "model": "default",
+                "model_version": "20240101",
+                "shards": False,
+                "fields": None,
+                "page_size": 1000,
+                "input_bytes": 2480000,
+                "total_rows": 20000,
+                "processed_rows": 5000,
+                "failed_rows": 3,
+                "pages": 5,
+                "progress": 0.25,
+                "cancel_requested": False,
+                "error": None,
+                "created_at": "2024-01-01T00:00:00+00:00",
+                "started_at": "2024-01-01T00:00:01+00:00",
+                "finished_at": None
+            }
+        }
+
+
 class ErrorDetail(TypedDict):
     """エラー詳細の型定義"""
     index: int
@@ -2,8 +2,30 @@
 不動産価格予測API用の入力スキーマ定義
 """
 
-from pydantic import BaseModel, Field, validator
-from typing import Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pydantic import BaseModel, Field, ValidationInfo, field_validator, validator
+from typing import Dict, FrozenSet, Iterator, List, Optional
+
+from regions import TOKYO_23KU_WARDS
+
+# context を渡せない検証（FastAPI のリクエストボディ）で受け付ける区名（ward_validation_context で設定）
+_context_wards: ContextVar[Optional[FrozenSet[str]]] = ContextVar('context_wards', default=None)
+
+
+@contextmanager
+def ward_validation_context(wards: FrozenSet[str]) -> Iterator[None]:
+    """
+    この中で行う PredictRequest の検証で受け付ける区名を指定
+
+    Args:
+        wards: 受け付ける区名の許可リスト（app.state.allowed_wards）
+    """
+    token = _context_wards.set(wards)
+    try:
+        yield
+    finally:
+        _context_wards.reset(token)
 
 
 class PredictRequest(BaseModel):
@@ -14,23 +36,22 @@ class PredictRequest(BaseModel):
     building_area: float = Field(..., gt=0, description="建物面積（㎡）")
     building_age: float = Field(..., ge=0, le=100, description="築年数（年）")
     ward_name: str = Field(..., description="区名（例：世田谷区）")
+    area_code: Optional[str] = Field(
+        None, pattern=r"^\d{5}$", description="市区町村コード（例：13112、地域モデルの選択で区名より優先）"
+    )
     district: Optional[str] = Field(None, description="地区名（詳細）")
     year: Optional[int] = Field(2024, ge=2020, le=2030, description="査定年")
     quarter: Optional[int] = Field(1, ge=1, le=4, description="四半期")
 
-    @validator('ward_name')
-    def validate_ward_name(cls, v):
+    @field_validator('ward_name')
+    @classmethod
+    def validate_ward_name(cls, v, info: ValidationInfo):
         """
-        東京23区の区名バリデーション
+        区名バリデーション（context={"wards": ...} または ward_validation_context の許可リスト、未指定時は東京23区）
         """
-        valid_wards = {
-            "千代田区", "中央区", "港区", "新宿区", "文京区", "台東区", "墨田区", "江東区",
-            "品川区", "目黒区", "大田区", "世田谷区", "渋谷区", "中野区", "杉並区", "豊島区",
-            "北区", "荒川区", "板橋区", "練馬区", "足立区", "葛飾区", "江戸川区"
-        }
-        
-        if v not in valid_wards:
-            raise ValueError(f"Invalid ward name. Must be one of: {', '.join(sorted(valid_wards))}")
+        wards = (info.context or {}).get('wards') or _context_wards.get() or TOKYO_23KU_WARDS
+        if v not in wards:
+            raise ValueError(f"Invalid ward name. Must be one of: {', '.join(sorted(wards))}")
         
         return v
 
@@ -61,19 +82,82 @@ class PredictRequest(BaseModel):
         }
 
 
+class ColumnarPredictRequest(BaseModel):
+    """
+    列形式のバッチ予測リクエストのスキーマ（各列は同じ長さ、制約は PredictRequest と同じ）
+
+    OpenAPI の定義用。検証は ColumnarBatch が列ごとの配列演算で行い、
+    制約に違反した行はリクエスト全体ではなくその行のみ無効になる。
+    """
+    land_area: List[Optional[float]] = Field(..., description="土地面積（㎡、> 0）")
+    building_area: List[Optional[float]] = Field(..., description="建物面積（㎡、> 0）")
+    building_age: List[Optional[float]] = Field(..., description="築年数（年、0-100）")
+    ward_name: List[Optional[str]] = Field(..., description="区名")
+    area_code: Optional[List[Optional[str]]] = Field(None, description="市区町村コード（5桁）")
+    district: Optional[List[Optional[str]]] = Field(None, description="地区名")
+    year: Optional[List[Optional[int]]] = Field(None, description="査定年（2020-2030、省略時 2024）")
+    quarter: Optional[List[Optional[int]]] = Field(None, description="四半期（1-4、省略時 1）")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "land_area": [120.0, 95.5],
+                "building_area": [80.0, 60.0],
+                "building_age": [10, 25],
+                "ward_name": ["世田谷区", "杉並区"]
+            }
+        }
+
+
+class PredictionInterval(BaseModel):
+    """
+    予測区間のスキーマ
+    """
+    lower: float = Field(..., description="下限（万円）")
+    upper: float = Field(..., description="上限（万円）")
+    level: float = Field(..., description="信頼水準（例：0.95）")
+
+
+class PriceDistribution(BaseModel):
+    """
+    ブートストラップアンサンブルによる予測価格の分布
+    """
+    mean: float = Field(..., description="平均（万円）")
+    std: float = Field(..., description="標準偏差（万円）")
+    percentiles: Dict[str, float] = Field(..., description="パーセンタイル（例：p5, p50, p95、万円）")
+    replicas: int = Field(..., description="レプリカ数")
+
+
+class PriceContributions(BaseModel):
+    """
+    特徴量ごとの価格寄与（baseline と寄与の和が予測価格）
+    """
+    baseline: float = Field(..., description="学習データの平均的な物件の予測価格（万円）")
+    features: Dict[str, float] = Field(..., description="特徴量名 -> 価格寄与（万円、区名は ward にまとめる）")
+
+
 class PredictResponse(BaseModel):
     """
     予測レスポンスのスキーマ
     """
     predicted_price: float = Field(..., description="予測価格（万円）")
     confidence: Optional[float] = Field(None, description="信頼度（0-1）")
+    prediction_interval: Optional[PredictionInterval] = Field(None, description="予測区間")
+    price_distribution: Optional[PriceDistribution] = Field(None, description="ブートストラップによる予測価格の分布")
     features_used: Optional[dict] = Field(None, description="使用された特徴量")
+    contributions: Optional[PriceContributions] = Field(None, description="特徴量ごとの価格寄与（explain=true の場合）")
     
     class Config:
         schema_extra = {
             "example": {
                 "predicted_price": 8500.0,
                 "confidence": 0.85,
+                "prediction_interval": {"lower": 7300.0, "upper": 9700.0, "level": 0.95},
+                "price_distribution": {
+                    "mean": 8498.0, "std": 61.2,
+                    "percentiles": {"p5": 8399.0, "p50": 8497.0, "p95": 8601.0},
+                    "replicas": 50
+                },
                 "features_used": {
                     "building_area": 80.0,
                     "land_area": 120.0,
@@ -0,0 +1,220 @@
+"""
+予測結果のインプロセスキャッシュ（LRU + TTL）
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple, Hashable, Collection
+
+from model_loader import ModelLoader
+
+
+class PredictionCache:
+    """
+    正規化したリクエストをキーとする予測結果のLRUキャッシュ
+
+    Django フォームからの入力は項目が少なく同一査定の繰り返しが多いため、
+    InferenceExecutor.predict / predict_batch が推論の手前で lookup / store により
+    結果を再利用する。キーにはモデルバージョンを含めるため、複数モデルを並行して提供しても結果が混ざらない。モデルが
+    再読み込みされたら invalidate_version で旧バージョンのエントリを破棄する。
+    """
+
+    def __init__(self, capacity: int = 1024, ttl_seconds: float = 300.0):
+        """
+        キャッシュの初期化
+
+        Args:
+            capacity: 最大保持件数（0 の場合はキャッシュ無効）
+            ttl_seconds: 有効期限（秒、0 以下の場合は無期限）
+        """
+        self.capacity = max(0, int(capacity))
+        self.ttl_seconds = float(ttl_seconds)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "PredictionCache":
+        """
+        環境変数から設定を読み込んで生成
+
+        PREDICTION_CACHE_SIZE: 最大保持件数（デフォルト 1024、0 で無効）
+        PREDICTION_CACHE_TTL: 有効期限（秒、デフォルト 300）
+        """
+        return cls(
+            capacity=int(os.getenv('PREDICTION_CACHE_SIZE', '1024')),
+            ttl_seconds=float(os.getenv('PREDICTION_CACHE_TTL', '300'))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """キャッシュが有効か"""
+        return self.capacity > 0
+
+    @staticmethod
+    def make_key(request_data: Dict[str, Any], fields: Optional[Collection[str]] = None) -> Hashable:
+        """
+        リクエストデータを正規化したキャッシュキーを生成
+
+        数値は float に揃え（10 と 10.0 を同一視）、項目順に依存しないようソートする。
+        返す項目を絞った結果は全項目の結果と別のエントリとして保持する。
+
+        Args:
+            request_data: API リクエストデータ
+            fields: 結果に含める項目（省略時は全項目）
+
+        Returns:
+            Hashable: キャッシュキー
+        """
+        request_key = tuple(sorted(
+            (name, float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value)
+            for name, value in request_data.items()
+        ))
+        return (None if fields is None else tuple(sorted(fields)), request_key)
+
+    def get(self, key: Hashable, model_version: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュ参照
+
+        Args:
+            key: キャッシュキー
+            model_version: 現在のモデルバージョン
+
+        Returns:
+            Optional[Dict[str, Any]]: キャッシュされた予測結果（無い場合はNone）
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            key = (model_version, key)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: Hashable, result: Dict[str, Any], model_version: Optional[str]) -> None:
+        """
+        キャッシュ登録（容量超過時は最も古い参照のエントリを破棄）
+
+        Args:
+            key: キャッシュキー
+            result: 予測結果
+            model_version: 予測に使用したモデルバージョン
+        """
+        if not self.enabled:
+            return
+
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else float('inf')
+        key = (model_version, key)
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def lookup(self, model_loader: ModelLoader, requests_data: List[Dict[str, Any]],
+               fields: Optional[Collection[str]] = None
+               ) -> Tuple[List[Hashable], List[Optional[Dict[str, Any]]]]:
+        """
+        キャッシュ済みの予測結果を参照（推論を別スレッド・別プロセスで行う場合に使用）
+
+        Args:
+            model_loader: モデルローダー
+            requests_data: API リクエストデータのリスト
+            fields: 結果に含める項目（省略時は全項目）
+
+        Returns:
+            Tuple[List[Hashable], List[Optional[Dict[str, Any]]]]: キャッシュキーと結果（無い項目はNone）
+        """
+        model_version = model_loader.model_version
+        keys = [self.make_key(request_data, fields) for request_data in requests_data]
+        return keys, [self.get(key, model_version) for key in keys]
+
+    def store(self, model_loader: ModelLoader, keys: List[Hashable],
+              results: List[Dict[str, Any]]) -> None:
+        """
+        lookup で得たキーに予測結果を登録
+
+        Args:
+            model_loader: 予測に使用したモデルローダー
+            keys: キャッシュキー
+            results: キーと同順の予測結果
+        """
+        for key, result in zip(keys, results):
+            self.put(key, result, model_loader.model_version)
+
+    def invalidate_version(self, model_version: Optional[str]) -> None:
+        """
+        指定したモデルバージョンのエントリを破棄
+
+        Args:
+            model_version: 破棄するモデルバージョン
+        """
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == model_version]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self.invalidations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        キャッシュ統計の取得
+
+        Returns:
+            Dict[str, Any]: 設定値・件数・ヒット/ミス/破棄数
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "capacity": self.capacity,
+                "ttl_seconds": self.ttl_seconds,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+def deduplicate(requests_data: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """
+    正規化キーが同じリクエストを1件にまとめる
+
+    同じ建物の住戸など同一条件の物件が並ぶバッチで、一意な入力のみ推論するために使う。
+    結果は results[positions[i]] で元の順序に戻す。
+
+    Args:
+        requests_data: API リクエストデータのリスト
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[int]]: 一意なリクエストのリスト（初出順）と各リクエストの位置
+    """
+    unique: List[Dict[str, Any]] = []
+    positions: List[int] = []
+    seen: Dict[Hashable, int] = {}
+    for request_data in requests_data:
+        position = seen.setdefault(PredictionCache.make_key(request_data), len(unique))
+        if position == len(unique):
+            unique.append(request_data)
+        positions.append(position)
+    return unique, positions
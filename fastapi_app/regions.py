@@ -0,0 +1,48 @@
+"""
+地域の定義 - 区名・市区町村コードと、予測リクエストで受け付ける区名
+"""
+
+from typing import FrozenSet, Iterable
+
+# 東京23区の市区町村コード
+TOKYO_23KU_CODES = {
+    "千代田区": "13101",
+    "中央区": "13102",
+    "港区": "13103",
+    "新宿区": "13104",
+    "文京区": "13105",
+    "台東区": "13106",
+    "墨田区": "13107",
+    "江東区": "13108",
+    "品川区": "13109",
+    "目黒区": "13110",
+    "大田区": "13111",
+    "世田谷区": "13112",
+    "渋谷区": "13113",
+    "中野区": "13114",
+    "杉並区": "13115",
+    "豊島区": "13116",
+    "北区": "13117",
+    "荒川区": "13118",
+    "板橋区": "13119",
+    "練馬区": "13120",
+    "足立区": "13121",
+    "葛飾区": "13122",
+    "江戸川区": "13123"
+}
+
+# 地域シャードを使用しない場合に受け付ける区名
+TOKYO_23KU_WARDS: FrozenSet[str] = frozenset(TOKYO_23KU_CODES)
+
+
+def build_allowed_wards(extra_wards: Iterable[str] = ()) -> FrozenSet[str]:
+    """
+    予測リクエストで受け付ける区名の許可リスト（起動時に設定から生成）
+
+    Args:
+        extra_wards: 東京23区に加えて受け付ける区名（地域シャードの設定の区名など）
+
+    Returns:
+        FrozenSet[str]: 受け付ける区名
+    """
+    return TOKYO_23KU_WARDS | frozenset(extra_wards)
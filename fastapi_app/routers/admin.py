@@ -0,0 +1,78 @@
+"""
+管理用エンドポイントのルーター
+"""
+
+import hmac
+import logging
+import os
+import uuid
+from typing import Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, status, Request, Header, Query
+
+from model_registry import ModelRegistry
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def verify_admin_token(authorization: Optional[str]) -> None:
+    """
+    管理用トークンの検証（ADMIN_TOKEN 未設定の場合は管理用エンドポイントを無効化）
+    
+    Args:
+        authorization: Authorization ヘッダー（"Bearer <token>"）
+    """
+    admin_token = os.getenv('ADMIN_TOKEN')
+    if not admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin endpoints are disabled"
+        )
+    
+    expected = f"Bearer {admin_token}"
+    if not authorization or not hmac.compare_digest(authorization, expected):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid admin token"
+        )
+
+
+@router.post("/reload")
+async def reload_model(
+    request: Request,
+    model: Optional[str] = Query(None, description="再読み込みするモデル名またはエイリアス（省略時は全モデル）"),
+    authorization: Optional[str] = Header(None)
+) -> Dict[str, Any]:
+    """
+    モデル再読み込みエンドポイント
+    
+    新しいモデルをバックグラウンドで読み込み・検証し、成功した場合のみ差し替える。
+    失敗した場合は現在のモデルで稼働を継続する。
+    """
+    request_id = str(uuid.uuid4())[:8]
+    verify_admin_token(authorization)
+    logger.info(f"[request_id={request_id}] Model reload requested: {model or 'all'}")
+    
+    # 依存性注入：app.stateからModelRegistryを取得
+    model_registry: ModelRegistry = request.app.state.model_registry
+    try:
+        result = await model_registry.reload(model)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown model: {model}"
+        )
+    
+    failed = {name: state['last_reload_error'] for name, state in result.items() if state['last_reload_error']}
+    if failed:
+        logger.error(f"[request_id={request_id}] Model reload failed: {failed}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Model reload failed: {failed}"
+        )
+    
+    versions = {name: state['active_version'] for name, state in result.items()}
+    logger.info(f"[request_id={request_id}] Model reload completed: {versions}")
+    return {"models": result}
@@ -4,10 +4,19 @@
 
 import logging
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, status, Request
 
 from model_loader import ModelLoader
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache
+from inference_executor import InferenceExecutor
+from micro_batcher import MicroBatcher
+from stream_predictor import StreamPredictor
+from columnar_batch import ColumnarPredictor
+from csv_predictor import CSVPredictor
+from job_manager import JobManager
+from model_shards import RegionShards
 
 # ロガー設定
 logger = logging.getLogger(__name__)
@@ -38,8 +47,17 @@ async def health_check(request: Request) -> Dict[str, Any]:
     request_id = str(uuid.uuid4())[:8]
     logger.info(f"[request_id={request_id}] Health check requested")
     
-    # 依存性注入：app.stateからModelLoaderを取得
-    model_loader: ModelLoader = request.app.state.model_loader
+    # 依存性注入：app.stateからModelRegistryを取得（モデル情報はデフォルトモデル）
+    model_registry: ModelRegistry = request.app.state.model_registry
+    model_loader: ModelLoader = model_registry.get()
+    prediction_cache: PredictionCache = request.app.state.prediction_cache
+    inference_executor: InferenceExecutor = request.app.state.inference_executor
+    micro_batcher: MicroBatcher = request.app.state.micro_batcher
+    stream_predictor: StreamPredictor = request.app.state.stream_predictor
+    columnar_predictor: ColumnarPredictor = request.app.state.columnar_predictor
+    csv_predictor: CSVPredictor = request.app.state.csv_predictor
+    job_manager: JobManager = request.app.state.job_manager
+    region_shards: Optional[RegionShards] = getattr(request.app.state, 'region_shards', None)
     
     if not model_loader.is_loaded():
         logger.error(f"[request_id={request_id}] Health check failed: Model not loaded")
@@ -54,5 +72,14 @@ async def health_check(request: Request) -> Dict[str, Any]:
     return {
         "status": "healthy",
         "model_loaded": True,
-        "model_info": model_info
+        "model_info": model_info,
+        "models": model_registry.get_status(),
+        "prediction_cache": prediction_cache.get_stats(),
+        "inference_executor": inference_executor.get_stats(),
+        "micro_batcher": micro_batcher.get_stats(),
+        "stream_predictor": stream_predictor.get_stats(),
+        "columnar_predictor": columnar_predictor.get_stats(),
+        "csv_predictor": csv_predictor.get_stats(),
+        "job_manager": job_manager.get_stats(),
+        "region_shards": region_shards.get_status() if region_shards is not None else None
     }
\ No newline at end of file
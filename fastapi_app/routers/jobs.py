@@ -0,0 +1,237 @@
+"""
+非同期ジョブのエンドポイントのルーター
+"""
+
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, FrozenSet
+import orjson
+from fastapi import APIRouter, HTTPException, status, Request, Response, Depends, Query
+from fastapi.responses import StreamingResponse
+
+from predict_schema import ErrorResponse
+from model_types import JobResponse
+from model_loader import ModelLoader
+from model_shards import RegionShards
+from job_manager import JobManager, JobQueueFullError
+from stream_predictor import NDJSONStreamingResponse
+from dependencies import get_model_loader, get_result_fields, model_headers, get_region_shards
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+async def get_job(job_manager: JobManager, job_id: str) -> Dict[str, Any]:
+    """
+    ジョブの状態を取得（存在しない場合は 404）
+    """
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown job: {job_id}"
+        )
+    return job
+
+
+@router.post(
+    "",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=JobResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "Input too large or unknown fields"},
+        404: {"model": ErrorResponse, "description": "Unknown model"},
+        503: {"model": ErrorResponse, "description": "Job queue is full or disabled"}
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "description": "1行1物件の PredictRequest（NDJSON、チャンク転送可）",
+            "content": {NDJSONStreamingResponse.media_type: {"schema": {"type": "string"}}}
+        }
+    }
+)
+async def submit_job(request: Request, response: Response,
+                     model_loader: ModelLoader = Depends(get_model_loader),
+                     fields: Optional[FrozenSet[str]] = Depends(get_result_fields),
+                     shards: Optional[RegionShards] = Depends(get_region_shards)) -> Dict[str, Any]:
+    """
+    ジョブ投入エンドポイント（件数上限なし、NDJSON 入力）
+
+    入力を受信し終えた時点でジョブ ID を返し、推論はバックグラウンドで行う。
+    進捗は GET /jobs/{job_id}（ポーリング）または GET /jobs/{job_id}/events（SSE）、
+    結果は GET /jobs/{job_id}/results?page= でページごとに取得する。
+
+    Args:
+        request: FastAPIリクエストオブジェクト（ボディを NDJSON として逐次保存する）
+        response: FastAPIレスポンスオブジェクト
+        model_loader: 使用するモデル（?model= / X-Model-Name で選択、省略時はデフォルト）
+        fields: 返す項目（?fields= / ?lean=true で指定、省略時は全項目）
+        shards: 区名・市区町村コードで振り分ける地域シャード（モデル指定時は使用しない）
+
+    Returns:
+        JobResponse: 受け付けたジョブの状態（Location ヘッダーにジョブの URL）
+    """
+    request_id = str(uuid.uuid4())[:8]
+
+    # 依存性注入：app.stateからJobManagerを取得
+    job_manager: JobManager = request.app.state.job_manager
+
+    try:
+        job = await job_manager.submit(
+            request.stream(), model_headers(response)["X-Model-Name"], fields, use_shards=shards is not None
+        )
+    except JobQueueFullError as e:
+        logger.warning(f"[request_id={request_id}] Job rejected: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        logger.warning(f"[request_id={request_id}] Invalid job input: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid input: {str(e)}"
+        )
+
+    logger.info(f"[request_id={request_id}] Job submitted: {job['job_id']}")
+    response.headers["Location"] = f"{request.url.path.rstrip('/')}/{job['job_id']}"
+    return job
+
+
+@router.get("", response_model=List[JobResponse])
+async def list_jobs(request: Request) -> List[Dict[str, Any]]:
+    """
+    ジョブ一覧エンドポイント（新しい順、保持期間内の終了済みジョブを含む）
+    """
+    job_manager: JobManager = request.app.state.job_manager
+    return await job_manager.list()
+
+
+@router.get(
+    "/{job_id}",
+    response_model=JobResponse,
+    responses={404: {"model": ErrorResponse, "description": "Unknown job"}}
+)
+async def get_job_status(job_id: str, request: Request) -> Dict[str, Any]:
+    """
+    ジョブ状態エンドポイント（ポーリング用）
+    """
+    job_manager: JobManager = request.app.state.job_manager
+    return await get_job(job_manager, job_id)
+
+
+@router.get(
+    "/{job_id}/events",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "状態が変わるたびに progress イベント（JobResponse）"},
+        404: {"model": ErrorResponse, "description": "Unknown job"}
+    }
+)
+async def job_events(job_id: str, request: Request) -> StreamingResponse:
+    """
+    ジョブ進捗エンドポイント（Server-Sent Events、ジョブの終了で接続を閉じる）
+
+    変化が無い間も15秒ごとにコメント行を送り、ALB・CloudFront のアイドルタイムアウトで切断されないようにする。
+    """
+    job_manager: JobManager = request.app.state.job_manager
+    await get_job(job_manager, job_id)
+
+    async def events():
+        async for job in job_manager.watch(job_id):
+            if job is None:
+                yield b": keepalive\n\n"
+            else:
+                yield b"event: progress\ndata: " + orjson.dumps(job) + b"\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get(
+    "/{job_id}/results",
+    response_class=NDJSONStreamingResponse,
+    responses={
+        200: {"description": "1ページ分の予測結果（{index, result} または {index, error, input}）"},
+        404: {"model": ErrorResponse, "description": "Unknown job or page not available yet"}
+    }
+)
+async def get_job_results(job_id: str, request: Request,
+                          page: int = Query(0, ge=0, description="ページ番号（0 から、1ページ page_size 件）")
+                          ) -> Response:
+    """
+    ジョブ結果エンドポイント（実行中でも処理済みのページは取得可能）
+
+    X-Page-Count ヘッダーで現在取得できるページ数、X-Job-Status ヘッダーでジョブの状態を返す。
+    """
+    job_manager: JobManager = request.app.state.job_manager
+    job = await get_job(job_manager, job_id)
+
+    content = await job_manager.read_page(job_id, page)
+    if content is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Page {page} is not available ({job['pages']} pages, job is {job['status']})"
+        )
+
+    return Response(
+        content=content,
+        media_type=NDJSONStreamingResponse.media_type,
+        headers={"X-Page-Count": str(job['pages']), "X-Job-Status": job['status']}
+    )
+
+
+@router.post(
+    "/{job_id}/cancel",
+    response_model=JobResponse,
+    responses={404: {"model": ErrorResponse, "description": "Unknown job"}}
+)
+async def cancel_job(job_id: str, request: Request) -> Dict[str, Any]:
+    """
+    ジョブキャンセルエンドポイント（実行中のジョブは処理中のチャンクの完了後に停止、処理済みのページは残す）
+    """
+    request_id = str(uuid.uuid4())[:8]
+    job_manager: JobManager = request.app.state.job_manager
+    try:
+        job = await job_manager.cancel(job_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown job: {job_id}"
+        )
+    logger.info(f"[request_id={request_id}] Job cancel requested: {job_id} ({job['status']})")
+    return job
+
+
+@router.delete(
+    "/{job_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        404: {"model": ErrorResponse, "description": "Unknown job"},
+        409: {"model": ErrorResponse, "description": "Job is still queued or running"}
+    }
+)
+async def delete_job(job_id: str, request: Request) -> Response:
+    """
+    ジョブ削除エンドポイント（終了したジョブの入力・結果を削除）
+    """
+    job_manager: JobManager = request.app.state.job_manager
+    try:
+        await job_manager.delete(job_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown job: {job_id}"
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -4,12 +4,25 @@
 
 import logging
 import uuid
-from typing import List
-from fastapi import APIRouter, HTTPException, status, Request
+from typing import List, Optional, FrozenSet
+from fastapi import APIRouter, HTTPException, status, Request, Response, Depends, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
 
-from predict_schema import PredictRequest, PredictResponse, ErrorResponse
-from model_types import BatchPredictResponse, ErrorDetail, PredictResult
+from predict_schema import PredictRequest, PredictResponse, ErrorResponse, ColumnarPredictRequest
+from model_types import BatchPredictResponse, ColumnarPredictResponse, ErrorDetail, PredictResult
 from model_loader import ModelLoader
+from prediction_cache import PredictionCache, deduplicate
+from inference_executor import InferenceExecutor, InferenceQueueFullError
+from micro_batcher import MicroBatcher
+from stream_predictor import StreamPredictor, NDJSONStreamingResponse
+from columnar_batch import ColumnarPredictor, ColumnarBodyTooLargeError, ARROW_MEDIA_TYPE
+from csv_predictor import CSVPredictor, content_disposition
+from fast_response import FastJSONResponse, prediction_content, batch_content
+from model_shards import RegionShards
+from dependencies import (
+    get_model_loader, get_result_fields, model_headers, get_region_shards, route_to_shards,
+    get_allowed_wards
+)
 
 # ロガー設定
 logger = logging.getLogger(__name__)
@@ -23,54 +36,60 @@ router = APIRouter(prefix="/predict", tags=["prediction"])
     responses={
         200: {"model": PredictResponse, "description": "Successful prediction"},
         400: {"model": ErrorResponse, "description": "Invalid input data"},
+        404: {"model": ErrorResponse, "description": "Unknown model"},
         503: {"model": ErrorResponse, "description": "Service unavailable"}
     }
 )
-async def predict_price(request: Request, predict_request: PredictRequest) -> PredictResponse:
+async def predict_price(request: Request, predict_request: PredictRequest, response: Response,
+                        model_loader: ModelLoader = Depends(get_model_loader),
+                        fields: Optional[FrozenSet[str]] = Depends(get_result_fields),
+                        shards: Optional[RegionShards] = Depends(get_region_shards)
+                        ) -> FastJSONResponse:
     """
     不動産価格予測エンドポイント
     
     Args:
         request: FastAPIリクエストオブジェクト
         predict_request: 予測リクエストデータ
+        response: FastAPIレスポンスオブジェクト
+        model_loader: 使用するモデル（?model= / X-Model-Name で選択、省略時はデフォルト）
+        fields: 返す項目（?fields= / ?lean=true で指定、省略時は全項目）
+        shards: 区名・市区町村コードで振り分ける地域シャード（モデル指定時は使用しない）
         
     Returns:
-        PredictResponse: 予測結果
+        PredictResponse: 予測結果（項目指定時は指定項目のみ）
     """
     request_id = str(uuid.uuid4())[:8]
     logger.info(f"[request_id={request_id}] Prediction request started")
     
-    # 依存性注入：app.stateからModelLoaderを取得
-    model_loader: ModelLoader = request.app.state.model_loader
+    # 依存性注入：app.stateからPredictionCache・MicroBatcherを取得
+    prediction_cache: PredictionCache = request.app.state.prediction_cache
+    micro_batcher: MicroBatcher = request.app.state.micro_batcher
     
-    # モデル読み込み確認
-    if not model_loader.is_loaded():
-        logger.error(f"[request_id={request_id}] Model not loaded")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Model not available"
-        )
+    # リクエストデータを辞書に変換し、地域シャードが設定されていれば区名でモデルを選択
+    request_data = predict_request.dict()
+    model_loader = (await route_to_shards(shards, model_loader, [request_data], response))[0]
     
     try:
-        # リクエストデータを辞書に変換
-        request_data = predict_request.dict()
-        
         logger.info(f"[request_id={request_id}] Processing prediction: {request_data}")
         
-        # 予測実行（型安全な戻り値）
-        result: PredictResult = model_loader.predict(request_data)
-        
-        # レスポンス作成
-        response = PredictResponse(
-            predicted_price=result['predicted_price'],
-            confidence=result.get('confidence'),
-            features_used=result.get('features_used')
+        # 予測実行（型安全な戻り値、キャッシュ経由・同時リクエストとまとめてイベントループ外で推論）
+        result: PredictResult = await micro_batcher.predict(
+            model_loader, request_data, fields, prediction_cache
         )
         
         logger.info(f"[request_id={request_id}] Prediction successful: {result['predicted_price']:.1f}万円")
         
-        return response
+        # モデル検証を省略して JSON に直接変換（項目指定時は指定項目のみ）
+        return FastJSONResponse(content=prediction_content(result, fields), headers=model_headers(response))
         
+    except InferenceQueueFullError as e:
+        logger.warning(f"[request_id={request_id}] Prediction rejected: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    
     except ValueError as e:
         logger.warning(f"[request_id={request_id}] Invalid input data: {e}")
         raise HTTPException(
@@ -87,29 +106,31 @@ async def predict_price(request: Request, predict_request: PredictRequest) -> Pr
 
 
 @router.post("/batch", response_model=BatchPredictResponse)
-async def predict_batch(request: Request, requests: List[PredictRequest]) -> BatchPredictResponse:
+async def predict_batch(request: Request, requests: List[PredictRequest], response: Response,
+                        model_loader: ModelLoader = Depends(get_model_loader),
+                        fields: Optional[FrozenSet[str]] = Depends(get_result_fields),
+                        shards: Optional[RegionShards] = Depends(get_region_shards)
+                        ) -> FastJSONResponse:
     """
     バッチ予測エンドポイント（複数物件の一括予測）
     
     Args:
         request: FastAPIリクエストオブジェクト
         requests: 予測リクエストのリスト
+        response: FastAPIレスポンスオブジェクト
+        model_loader: 使用するモデル（?model= / X-Model-Name で選択、省略時はデフォルト）
+        fields: 返す項目（?fields= / ?lean=true で指定、省略時は全項目）
+        shards: 区名・市区町村コードで振り分ける地域シャード（モデル指定時は使用しない）
         
     Returns:
-        BatchPredictResponse: バッチ予測結果
+        BatchPredictResponse: バッチ予測結果（項目指定時は指定項目のみ）
     """
     request_id = str(uuid.uuid4())[:8]
     logger.info(f"[request_id={request_id}] Batch prediction started with {len(requests)} items")
     
-    # 依存性注入：app.stateからModelLoaderを取得
-    model_loader: ModelLoader = request.app.state.model_loader
-    
-    if not model_loader.is_loaded():
-        logger.error(f"[request_id={request_id}] Model not loaded for batch prediction")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Model not available"
-        )
+    # 依存性注入：app.stateからPredictionCache・InferenceExecutorを取得
+    prediction_cache: PredictionCache = request.app.state.prediction_cache
+    inference_executor: InferenceExecutor = request.app.state.inference_executor
     
     if len(requests) > 100:
         logger.warning(f"[request_id={request_id}] Too many requests: {len(requests)}")
@@ -118,26 +139,52 @@ async def predict_batch(request: Request, requests: List[PredictRequest]) -> Bat
             detail="Too many requests. Maximum 100 requests per batch."
         )
     
-    results: List[PredictResponse | None] = []
+    results: List[PredictResult | None] = []
     errors: List[ErrorDetail] = []
+    requests_data = [predict_request.dict() for predict_request in requests]
     
-    for i, predict_request in enumerate(requests):
+    # 同一条件の物件は1回だけ推論し、結果を元の位置に戻す
+    unique_data, positions = deduplicate(requests_data)
+    duplicates = len(requests_data) - len(unique_data)
+    if duplicates:
+        logger.info(f"[request_id={request_id}] Collapsed {duplicates} duplicate items")
+    item_loaders = await route_to_shards(shards, model_loader, unique_data, response)
+    
+    # モデルごとに一括推論（失敗時は1件ずつ推論してエラー箇所を特定）
+    try:
+        batch_results: List[PredictResult | Exception] = await inference_executor.predict_grouped(
+            item_loaders, unique_data, fields, prediction_cache
+        )
+    except InferenceQueueFullError as e:
+        logger.warning(f"[request_id={request_id}] Batch prediction rejected: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.warning(f"[request_id={request_id}] Vectorized batch prediction failed, falling back to per-item: {e}")
+        batch_results = []
+        for request_data, item_loader in zip(unique_data, item_loaders):
+            try:
+                batch_results.append(
+                    await inference_executor.submit(item_loader, 'predict', request_data, fields)
+                )
+            except Exception as item_error:
+                batch_results.append(item_error)
+    
+    for i, request_data in enumerate(requests_data):
         try:
-            request_data = predict_request.dict()
-            result: PredictResult = model_loader.predict(request_data)
+            result = batch_results[positions[i]]
+            if isinstance(result, Exception):
+                raise result
             
-            response = PredictResponse(
-                predicted_price=result['predicted_price'],
-                confidence=result.get('confidence'),
-                features_used=result.get('features_used')
-            )
-            results.append(response)
+            results.append(result)
             
         except Exception as e:
             error_detail: ErrorDetail = {
                 "index": i,
                 "error": str(e),
-                "input": predict_request.dict()
+                "input": request_data
             }
             errors.append(error_detail)
             results.append(None)
@@ -147,10 +194,204 @@ async def predict_batch(request: Request, requests: List[PredictRequest]) -> Bat
     successful_count = len([r for r in results if r is not None])
     logger.info(f"[request_id={request_id}] Batch prediction completed: {successful_count}/{len(requests)} successful")
     
-    return BatchPredictResponse(
-        results=results,
-        errors=errors,
-        total_processed=len(requests),
-        successful=successful_count,
-        failed=len(errors)
-    )
\ No newline at end of file
+    # モデル検証を省略して JSON に直接変換（項目指定時は指定項目のみ）
+    return FastJSONResponse(
+        content=batch_content(results, errors, duplicates, fields),
+        headers=model_headers(response)
+    )
+
+
+@router.post(
+    "/stream",
+    response_class=NDJSONStreamingResponse,
+    responses={
+        200: {"description": "1行1物件の予測結果（{index, result} または {index, error, input}）"},
+        404: {"model": ErrorResponse, "description": "Unknown model"}
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "description": "1行1物件の PredictRequest（NDJSON、チャンク転送可）",
+            "content": {NDJSONStreamingResponse.media_type: {"schema": {"type": "string"}}}
+        }
+    }
+)
+async def predict_stream(request: Request, response: Response,
+                         model_loader: ModelLoader = Depends(get_model_loader),
+                         fields: Optional[FrozenSet[str]] = Depends(get_result_fields),
+                         shards: Optional[RegionShards] = Depends(get_region_shards)
+                         ) -> NDJSONStreamingResponse:
+    """
+    ストリーミング予測エンドポイント（件数上限なし、NDJSON 入出力）
+    
+    入力を一定件数ごとに一括推論して結果を逐次返すため、件数に関わらずメモリ使用量は一定。
+    
+    Args:
+        request: FastAPIリクエストオブジェクト（ボディを NDJSON として逐次読み込む）
+        response: FastAPIレスポンスオブジェクト
+        model_loader: 使用するモデル（?model= / X-Model-Name で選択、省略時はデフォルト）
+        fields: 返す項目（?fields= / ?lean=true で指定、省略時は全項目）
+        shards: 区名・市区町村コードで振り分ける地域シャード（モデル指定時は使用しない）
+        
+    Returns:
+        NDJSONStreamingResponse: 入力順の予測結果（NDJSON、不正な行・失敗した行はその行のエラー）
+    """
+    request_id = str(uuid.uuid4())[:8]
+    logger.info(f"[request_id={request_id}] Prediction stream started")
+    
+    # 依存性注入：app.stateからPredictionCache・StreamPredictorを取得
+    prediction_cache: PredictionCache = request.app.state.prediction_cache
+    stream_predictor: StreamPredictor = request.app.state.stream_predictor
+    
+    return NDJSONStreamingResponse(
+        stream_predictor.stream(request.stream(), model_loader, fields, prediction_cache, shards),
+        headers=model_headers(response)
+    )
+
+
+@router.post(
+    "/columns",
+    response_model=ColumnarPredictResponse,
+    responses={
+        200: {"model": ColumnarPredictResponse, "description": "Successful prediction (columnar)"},
+        400: {"model": ErrorResponse, "description": "Malformed columns or too many rows"},
+        404: {"model": ErrorResponse, "description": "Unknown model"},
+        413: {"model": ErrorResponse, "description": "Request body exceeds COLUMNAR_MAX_BYTES"},
+        415: {"model": ErrorResponse, "description": "Arrow IPC input without pyarrow"},
+        503: {"model": ErrorResponse, "description": "Service unavailable"}
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": ColumnarPredictRequest.model_json_schema()},
+                ARROW_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}
+            }
+        }
+    }
+)
+async def predict_columns(request: Request, response: Response,
+                          model_loader: ModelLoader = Depends(get_model_loader),
+                          fields: Optional[FrozenSet[str]] = Depends(get_result_fields),
+                          shards: Optional[RegionShards] = Depends(get_region_shards)) -> FastJSONResponse:
+    """
+    列形式のバッチ予測エンドポイント（列名 -> 値の配列の JSON、または Arrow IPC ストリーム）
+    
+    制約は行ごとの pydantic 検証ではなく列ごとの配列演算で検証し、違反した行は
+    valid マスクと列ごとの行番号で返す（他の行は予測する）。
+    
+    Args:
+        request: FastAPIリクエストオブジェクト（ボディを列形式として読み込む）
+        response: FastAPIレスポンスオブジェクト
+        model_loader: 使用するモデル（?model= / X-Model-Name で選択、省略時はデフォルト）
+        fields: 返す項目（?fields= / ?lean=true で指定、省略時は全項目）
+        shards: 区名・市区町村コードで振り分ける地域シャード（モデル指定時は使用しない）
+        
+    Returns:
+        ColumnarPredictResponse: 列形式の予測結果（項目指定時は指定項目のみ）
+    """
+    request_id = str(uuid.uuid4())[:8]
+    
+    # 依存性注入：app.stateからColumnarPredictorを取得
+    columnar_predictor: ColumnarPredictor = request.app.state.columnar_predictor
+    wards = get_allowed_wards(request)
+    
+    try:
+        batch = await columnar_predictor.read(
+            request.stream(), request.headers.get('content-type', ''),
+            request.headers.get('content-length'), wards
+        )
+    except ColumnarBodyTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=str(e)
+        )
+    except ImportError:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Arrow IPC input requires pyarrow"
+        )
+    except ValueError as e:
+        logger.warning(f"[request_id={request_id}] Invalid columnar input: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid input: {str(e)}"
+        )
+    
+    logger.info(f"[request_id={request_id}] Columnar prediction: {batch.n_rows} rows, {batch.n_rows - int(batch.valid.sum())} invalid")
+    
+    try:
+        content = await columnar_predictor.predict(batch, model_loader, fields, shards)
+    except InferenceQueueFullError as e:
+        logger.warning(f"[request_id={request_id}] Columnar prediction rejected: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except RuntimeError as e:
+        logger.error(f"[request_id={request_id}] Columnar prediction failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Prediction service error: {str(e)}"
+        )
+    
+    # モデル検証を省略して JSON に直接変換
+    return FastJSONResponse(content=content, headers=model_headers(response))
+
+
+@router.post(
+    "/csv",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/csv": {}}, "description": "元の列に predicted_price・error 列を加えた CSV"},
+        400: {"model": ErrorResponse, "description": "Unknown encoding or missing columns"},
+        404: {"model": ErrorResponse, "description": "Unknown model"}
+    }
+)
+async def predict_csv(request: Request, response: Response,
+                      file: UploadFile = File(..., description="ヘッダー行付きの CSV（1行1物件）"),
+                      encoding: str = Query('utf-8-sig', description="CSV の文字コード（Excel の CSV は cp932）"),
+                      model_loader: ModelLoader = Depends(get_model_loader),
+                      shards: Optional[RegionShards] = Depends(get_region_shards)) -> StreamingResponse:
+    """
+    CSV 予測エンドポイント（件数上限なし、multipart/form-data の CSV ファイル）
+    
+    CSV を一定行数ごとに読み込んで一括推論し、結果を逐次返すため、行数に関わらずメモリ使用量は一定。
+    
+    Args:
+        request: FastAPIリクエストオブジェクト
+        response: FastAPIレスポンスオブジェクト
+        file: アップロードされた CSV（列はヘッダー名で PredictRequest の項目に対応付け）
+        encoding: CSV の文字コード（結果も同じ文字コード）
+        model_loader: 使用するモデル（?model= / X-Model-Name で選択、省略時はデフォルト）
+        shards: 区名・市区町村コードで振り分ける地域シャード（モデル指定時は使用しない）
+        
+    Returns:
+        StreamingResponse: 入力順の CSV（無効な行・失敗した行は error 列にエラー）
+    """
+    request_id = str(uuid.uuid4())[:8]
+    
+    # 依存性注入：app.stateからCSVPredictorを取得
+    csv_predictor: CSVPredictor = request.app.state.csv_predictor
+    
+    try:
+        source = csv_predictor.open(file.file, encoding)
+    except ValueError as e:
+        logger.warning(f"[request_id={request_id}] Invalid CSV upload: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid input: {str(e)}"
+        )
+    
+    logger.info(f"[request_id={request_id}] CSV prediction started: {file.filename}")
+    
+    return StreamingResponse(
+        csv_predictor.stream(source, model_loader, shards),
+        media_type=source.media_type,
+        headers={**model_headers(response), "Content-Disposition": content_disposition(file.filename)}
+    )
@@ -0,0 +1,313 @@
+"""
+ストリーミング予測 - NDJSON の入力を一定件数ごとに一括推論し、結果を NDJSON で逐次返す
+"""
+
+import logging
+import os
+import time
+from typing import Dict, Any, Optional, List, Collection, AsyncIterable, AsyncIterator, Tuple, FrozenSet
+
+import orjson
+from pydantic import ValidationError
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from starlette.types import Scope, Receive, Send
+
+from fast_response import prediction_content
+from inference_executor import InferenceExecutor, InferenceQueueFullError
+from model_loader import ModelLoader
+from model_shards import RegionShards
+from predict_schema import PredictRequest
+from prediction_cache import PredictionCache, deduplicate
+from regions import TOKYO_23KU_WARDS
+
+# 1行分（入力行番号, 検証済みリクエストデータ, エラー行）
+_Row = Tuple[int, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    リクエストボディを読みながら結果を返す NDJSON ストリーミングレスポンス
+
+    StreamingResponse は ASGI spec 2.4 未満（uvicorn は 2.3）では切断検知のために
+    receive() を並行して待ち受けるため、request.stream() が読むはずのボディを
+    横取りして止まる。切断はボディの読み込み中に ClientDisconnect として検知
+    できるため、待ち受けを行わずに送信する。
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
+class StreamPredictor:
+    """
+    NDJSON（1行1物件）の入力を chunk_size 件ずつ読み込んで一括推論し、
+    結果を1行ずつ NDJSON で返すクラス
+
+    入力全体を読み込まずに chunk_size 件ごとに推論して書き出すため、件数に
+    関わらずメモリ使用量は1チャンク分に収まる。出力は入力と同じ順序で、
+    1入力行につき {"index", "result"} または {"index", "error", "input"} の1行を返す。
+    不正な行・推論に失敗した行はその行のエラーとして返し、ストリームは継続する。
+    出力が読まれない間は入力の読み込みも止まるため、クライアントは送信と並行して受信する。
+    推論の待ち行列が満杯の間は queue_wait 秒まで空きを待ち、それでも空かない場合は
+    未処理の先頭行番号を示すエラー行でストリームを終える（行のエラーにはしない）。
+    """
+
+    def __init__(self, executor: InferenceExecutor, chunk_size: int = 512,
+                 max_line_bytes: int = 65536, wards: FrozenSet[str] = TOKYO_23KU_WARDS,
+                 queue_wait: float = 60.0):
+        """
+        ストリーミング予測の初期化
+
+        Args:
+            executor: 推論を実行する InferenceExecutor
+            chunk_size: 1回の一括推論の件数
+            max_line_bytes: 1行の最大バイト数（超えた行はエラー）
+            wards: 受け付ける区名の許可リスト（app.state.allowed_wards）
+            queue_wait: 推論の待ち行列が満杯の場合に1チャンクで空きを待つ最大秒数
+        """
+        self.logger = logging.getLogger(__name__)
+        self.executor = executor
+        self.chunk_size = max(1, int(chunk_size))
+        self.max_line_bytes = max(1, int(max_line_bytes))
+        self.wards = wards
+        self.queue_wait = max(0.0, float(queue_wait))
+
+        self.streams = 0
+        self.active = 0
+        self.chunks = 0
+        self.rows = 0
+        self.failed = 0
+
+    @classmethod
+    def from_env(cls, executor: InferenceExecutor,
+                 wards: FrozenSet[str] = TOKYO_23KU_WARDS) -> "StreamPredictor":
+        """
+        環境変数から設定を読み込んで生成
+
+        STREAM_CHUNK_SIZE: 1回の一括推論の件数（デフォルト 512）
+        STREAM_MAX_LINE_BYTES: 1行の最大バイト数（デフォルト 65536）
+        STREAM_QUEUE_WAIT: 推論の待ち行列が満杯の場合に空きを待つ最大秒数（デフォルト 60）
+
+        Args:
+            executor: 推論を実行する InferenceExecutor
+            wards: 受け付ける区名の許可リスト
+        """
+        return cls(
+            executor=executor,
+            chunk_size=int(os.getenv('STREAM_CHUNK_SIZE', '512')),
+            max_line_bytes=int(os.getenv('STREAM_MAX_LINE_BYTES', '65536')),
+            wards=wards,
+            queue_wait=float(os.getenv('STREAM_QUEUE_WAIT', '60'))
+        )
+
+    async def stream(self, body: AsyncIterable[bytes], model_loader: ModelLoader,
+                     fields: Optional[Collection[str]] = None,
+                     cache: Optional[PredictionCache] = None,
+                     shards: Optional[RegionShards] = None) -> AsyncIterator[bytes]:
+        """
+        NDJSON の入力を予測し、チャンクごとの結果を NDJSON のバイト列で返す
+
+        Args:
+            body: リクエストボディ（チャンク転送の断片で可）
+            model_loader: 使用するモデル（地域シャードが担当しない行）
+            fields: 結果に含める項目（省略時は全項目）
+            cache: 予測キャッシュ
+            shards: 区名・市区町村コードで振り分ける地域シャード
+
+        Yields:
+            bytes: チャンク分の結果行
+        """
+        self.streams += 1
+        self.active += 1
+        started = time.monotonic()
+        rows = 0
+        failed = 0
+        try:
+            async for payload, chunk_rows, chunk_failed in self.predict_chunks(body, model_loader, fields, cache, shards):
+                rows += chunk_rows
+                failed += chunk_failed
+                yield payload
+        except InferenceQueueFullError as e:
+            # 過負荷が続いた場合は、再送すべき先頭の行番号を示して終える
+            self.logger.warning(f"Prediction stream stopped at row {rows}: {e}")
+            yield orjson.dumps({"index": rows, "error": f"Stream stopped: {e}", "input": None}) + b"\n"
+        finally:
+            self.active -= 1
+            self.rows += rows
+            self.failed += failed
+            self.logger.info(
+                f"Prediction stream finished: {rows} rows, {failed} failed "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+
+    async def predict_chunks(self, body: AsyncIterable[bytes], model_loader: ModelLoader,
+                             fields: Optional[Collection[str]] = None,
+                             cache: Optional[PredictionCache] = None,
+                             shards: Optional[RegionShards] = None) -> AsyncIterator[Tuple[bytes, int, int]]:
+        """
+        NDJSON の入力を chunk_size 件ずつ予測（統計は更新しない）
+
+        Args:
+            body: リクエストボディ（チャンク転送の断片で可）
+            model_loader: 使用するモデル（地域シャードが担当しない行）
+            fields: 結果に含める項目（省略時は全項目）
+            cache: 予測キャッシュ
+            shards: 区名・市区町村コードで振り分ける地域シャード
+
+        Yields:
+            Tuple[bytes, int, int]: チャンク分の結果行・行数・失敗行数
+
+        Raises:
+            InferenceQueueFullError: queue_wait 秒待っても推論の待ち行列が空かなかった
+        """
+        rows = 0
+        chunk: List[_Row] = []
+        async for line in self._lines(body):
+            chunk.append(self._parse(rows, line))
+            rows += 1
+            if len(chunk) < self.chunk_size:
+                continue
+            payload, failed = await self._process(chunk, model_loader, fields, cache, shards)
+            yield payload, len(chunk), failed
+            chunk = []
+        if chunk:
+            payload, failed = await self._process(chunk, model_loader, fields, cache, shards)
+            yield payload, len(chunk), failed
+
+    async def _lines(self, body: AsyncIterable[bytes]) -> AsyncIterator[Optional[bytes]]:
+        """
+        ボディの断片から空行以外の行を取り出す（max_line_bytes を超えた行は None）
+        """
+        buffer = b""
+        oversized = False
+        async for data in body:
+            lines = (buffer + data).split(b"\n")
+            buffer = lines.pop()
+            for line in lines:
+                if oversized or len(line) > self.max_line_bytes:
+                    oversized = False
+                    yield None
+                elif line.strip():
+                    yield line
+            # 改行が届かないまま上限を超えた行は読み捨てる
+            if len(buffer) > self.max_line_bytes:
+                buffer, oversized = b"", True
+        if oversized:
+            yield None
+        elif buffer.strip():
+            yield buffer
+
+    def _parse(self, index: int, line: Optional[bytes]) -> _Row:
+        """
+        1行を PredictRequest として検証（失敗時はエラー行を返す）
+        """
+        if line is None:
+            return index, None, {"index": index, "error": f"Line exceeds {self.max_line_bytes} bytes", "input": None}
+
+        try:
+            raw = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            return index, None, {"index": index, "error": f"Invalid JSON: {e}",
+                                 "input": line.decode('utf-8', 'replace')}
+
+        if not isinstance(raw, dict):
+            return index, None, {"index": index, "error": "Invalid input: each line must be a JSON object",
+                                 "input": raw}
+
+        try:
+            return index, PredictRequest.model_validate(raw, context={'wards': self.wards}).dict(), None
+        except ValidationError as e:
+            details = "; ".join(
+                f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in e.errors()
+            )
+            return index, None, {"index": index, "error": f"Invalid input: {details}", "input": raw}
+
+    async def _process(self, chunk: List[_Row], model_loader: ModelLoader,
+                       fields: Optional[Collection[str]], cache: Optional[PredictionCache],
+                       shards: Optional[RegionShards]) -> Tuple[bytes, int]:
+        """
+        1チャンクの推論と結果行の生成（同一条件の行は1回だけ推論、結果行と失敗行数を返す）
+        """
+        unique_data, positions = deduplicate([data for _, data, error in chunk if error is None])
+        results = await self._predict(unique_data, model_loader, fields, cache, shards)
+        self.chunks += 1
+
+        lines = []
+        failed = 0
+        valid = iter(positions)
+        for index, data, error in chunk:
+            if error is None:
+                result = results[next(valid)]
+                if not isinstance(result, Exception):
+                    lines.append(orjson.dumps({"index": index, "result": prediction_content(result, fields)}))
+                    continue
+                error = {"index": index, "error": str(result), "input": data}
+            failed += 1
+            lines.append(orjson.dumps(error))
+        return b"\n".join(lines) + b"\n", failed
+
+    async def _predict(self, requests_data: List[Dict[str, Any]], model_loader: ModelLoader,
+                       fields: Optional[Collection[str]], cache: Optional[PredictionCache],
+                       shards: Optional[RegionShards]) -> List[Any]:
+        """
+        モデルごとの一括推論（失敗時は1件ずつ推論し、失敗した行は例外を結果とする）
+
+        待ち行列が満杯の場合は queue_wait 秒まで空きを待ち、それでも空かない場合は
+        InferenceQueueFullError を送出する（チャンクの全行をエラーにはしない）。
+        """
+        if not requests_data:
+            return []
+
+        if shards is None:
+            loaders = [model_loader] * len(requests_data)
+        else:
+            try:
+                _, loaders = await shards.loaders(requests_data, model_loader)
+            except RuntimeError as e:
+                self.logger.error(f"Region shard loading failed: {e}")
+                return [RuntimeError("Region model not available")] * len(requests_data)
+
+        try:
+            return await self.executor.predict_grouped(loaders, requests_data, fields, cache, self.queue_wait)
+        except InferenceQueueFullError:
+            raise
+        except Exception as e:
+            self.logger.warning(f"Vectorized stream chunk failed, falling back to per-item: {e}")
+
+        results: List[Any] = []
+        for request_data, item_loader in zip(requests_data, loaders):
+            try:
+                results.append(await self.executor.submit(
+                    item_loader, 'predict', request_data, fields, queue_wait=self.queue_wait
+                ))
+            except InferenceQueueFullError:
+                raise
+            except Exception as item_error:
+                results.append(item_error)
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ストリーミング予測の統計の取得
+
+        Returns:
+            Dict[str, Any]: 設定値・ストリーム数・処理行数・失敗行数
+        """
+        return {
+            "chunk_size": self.chunk_size,
+            "max_line_bytes": self.max_line_bytes,
+            "queue_wait": self.queue_wait,
+            "streams": self.streams,
+            "active": self.active,
+            "chunks": self.chunks,
+            "rows": self.rows,
+            "failed": self.failed
+        }
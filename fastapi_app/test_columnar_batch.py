@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+列形式のバッチ予測の単体テスト（サーバー不要）
+"""
+
+import asyncio
+import json
+
+import numpy as np
+from pydantic import ValidationError
+
+from columnar_batch import ColumnarBatch, ColumnarPredictor, ColumnarBodyTooLargeError
+from inference_executor import InferenceExecutor
+from predict_schema import PredictRequest
+from test_inference import load_sample_loader, sample_requests
+
+
+def to_columns(requests_data: list) -> dict:
+    """
+    行形式のリクエストデータを列形式に変換
+    """
+    names = ['land_area', 'building_area', 'building_age', 'ward_name', 'area_code', 'district', 'year', 'quarter']
+    return {name: [request_data.get(name) for request_data in requests_data] for name in names}
+
+
+def test_array_validation_matches_pydantic():
+    """
+    配列演算による検証で無効になる行が、行ごとの PredictRequest の検証で失敗する行と一致すること
+    """
+    base = sample_requests(1)[0]
+    rows = [
+        base,
+        dict(base, land_area=0),
+        dict(base, building_area=-5.0),
+        dict(base, building_age=100.5),
+        dict(base, building_age=None),
+        dict(base, ward_name="無効区"),
+        dict(base, ward_name=None),
+        dict(base, year=2019),
+        dict(base, year=2024.5),
+        dict(base, year=None, quarter=None),
+        dict(base, quarter=5),
+        dict(base, land_area="abc"),
+        dict(base, land_area="120.5"),
+        dict(base, area_code="1311"),
+        dict(base, area_code="13112"),
+        dict(base, district=""),
+        dict(base, district=12),
+    ]
+
+    expected = []
+    for row in rows:
+        try:
+            PredictRequest(**row)
+            expected.append(True)
+        except ValidationError:
+            expected.append(False)
+
+    batch = ColumnarBatch(to_columns(rows))
+    assert batch.valid.tolist() == expected
+    assert batch.error_rows() == {
+        'land_area': [1, 11], 'building_area': [2], 'building_age': [3, 4], 'year': [7, 8], 'quarter': [10],
+        'ward_name': [5, 6], 'area_code': [13], 'district': [16]
+    }
+    assert batch.columns['district'][15] == f"{base['ward_name']}_1丁目"
+
+    for columns in ({'land_area': [1.0]}, dict(to_columns(rows[:2]), ward_name=["世田谷区"]),
+                    dict(to_columns(rows[:1]), land_area=1.0)):
+        try:
+            ColumnarBatch(columns)
+            raise AssertionError("malformed columns should be rejected")
+        except ValueError:
+            pass
+
+
+def test_columnar_results_match_batch():
+    """
+    有効な行の列形式の結果が predict_batch と一致し、無効な行は null になること
+    """
+    loader = load_sample_loader()
+    requests_data = sample_requests(30)
+    columns = to_columns(requests_data)
+    columns['land_area'][4] = -1.0
+    columns['ward_name'][9] = "無効区"
+    del columns['area_code']
+
+    predictor = ColumnarPredictor(InferenceExecutor(mode="inline"))
+    content = asyncio.run(predictor.predict(ColumnarBatch(columns), loader))
+
+    valid = [i for i in range(30) if i not in (4, 9)]
+    expected = loader.predict_batch([requests_data[i] for i in valid])
+    results = content['results']
+    assert content['valid'] == [i in valid for i in range(30)]
+    assert content['errors'] == {'land_area': [4], 'ward_name': [9]}
+    assert (content['successful'], content['failed']) == (28, 2)
+    assert [results['predicted_price'][i] for i in valid] == [r['predicted_price'] for r in expected]
+    assert [results['prediction_interval'][i] for i in valid] == [r['prediction_interval'] for r in expected]
+    assert results['predicted_price'][4] is None and results['contributions'] == [None] * 30
+
+    lean = asyncio.run(predictor.predict(ColumnarBatch(columns), loader, fields=['predicted_price']))
+    assert lean['results'] == {'predicted_price': results['predicted_price']}
+
+    arrays = {name: np.asarray(values) for name, values in columns.items() if name in ColumnarBatch.NUMERIC_COLUMNS}
+    arrays.update(ward_name=columns['ward_name'], district=columns['district'])
+    assert asyncio.run(predictor.predict(ColumnarBatch(arrays), loader))['results'] == results
+
+
+def test_size_limits_are_checked_before_validation():
+    """
+    ボディのバイト数（Content-Length・受信量）と行数の上限は、列の変換・検証の前に確認されること
+    """
+    body = json.dumps(to_columns(sample_requests(5)), ensure_ascii=False).encode()
+    predictor = ColumnarPredictor(InferenceExecutor(mode="inline"), max_rows=4, max_bytes=len(body))
+
+    async def pieces(data: bytes, consumed: list):
+        for start in range(0, len(data), 100):
+            consumed.append(start)
+            yield data[start:start + 100]
+
+    async def scenario():
+        outcomes = []
+        for data, content_length in ((body, str(len(body) + 1)), (body + b" " * 500, None), (body, str(len(body)))):
+            consumed = []
+            try:
+                await predictor.read(pieces(data, consumed), 'application/json', content_length)
+            except ValueError as e:
+                outcomes.append((type(e), str(e), len(consumed)))
+        return outcomes
+
+    declared, streamed, rows = asyncio.run(scenario())
+    assert declared[0] is ColumnarBodyTooLargeError and declared[2] == 0
+    assert streamed[0] is ColumnarBodyTooLargeError and streamed[2] < len(body) // 100 + 6
+    assert rows[0] is ValueError and rows[1].startswith("Too many rows")
+
+    # 行数の上限は変換できない値を含む列の検証より先に確認する
+    columns = dict(to_columns(sample_requests(5)), land_area=[object()] * 5)
+    try:
+        ColumnarBatch(columns, max_rows=4)
+        raise AssertionError("too many rows should be rejected")
+    except ValueError as e:
+        assert str(e).startswith("Too many rows")
+
+
+TESTS = [
+    test_array_validation_matches_pydantic,
+    test_columnar_results_match_batch,
+    test_size_limits_are_checked_before_validation,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+CSV 予測の単体テスト（サーバー不要）
+"""
+
+import asyncio
+import csv
+import io
+
+from csv_predictor import CSVPredictor
+from inference_executor import InferenceExecutor
+from model_loader import ModelLoader
+from test_inference_executor import BlockingLoader
+from test_inference import load_sample_loader, sample_requests
+
+
+def run_csv(predictor: CSVPredictor, body: bytes, loader: ModelLoader, encoding: str = 'utf-8-sig') -> tuple:
+    """
+    CSV を予測し、(チャンク数, 結果の行) を返す
+    """
+    source = predictor.open(io.BytesIO(body), encoding)
+
+    async def scenario():
+        return [chunk async for chunk in predictor.stream(source, loader)]
+
+    chunks = asyncio.run(scenario())
+    return len(chunks), list(csv.reader(io.StringIO(b"".join(chunks).decode(encoding))))
+
+
+def test_csv_matches_batch_in_chunks():
+    """
+    ヘッダー名で対応付けた列が chunk_rows 行ごとに推論され、元の列に予測価格とエラーが加わること
+    """
+    loader = load_sample_loader()
+    requests_data = sample_requests(12)
+    header = ['物件ID', ' Land_Area ', 'building_area', 'building_age', 'ward_name', 'district', 'year', 'quarter']
+    lines = [header]
+    for i, r in enumerate(requests_data):
+        lines.append([f"P{i}", r['land_area'], r['building_area'], r['building_age'], r['ward_name'],
+                      r.get('district') or '', r['year'], r['quarter']])
+    lines[3][1] = '-1'
+    lines[5][4] = '無効区'
+    lines[7] = lines[7][:4]
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(lines)
+    body = buffer.getvalue().encode('cp932')
+
+    predictor = CSVPredictor(InferenceExecutor(mode="inline"), chunk_rows=5)
+    chunks, rows = run_csv(predictor, body, loader, encoding='cp932')
+
+    assert chunks == 4
+    assert rows[0] == header + ['predicted_price', 'error']
+    assert [row[:-2] for row in rows[1:]] == [[str(v) for v in line] for line in lines[1:]]
+    invalid = {2: 'Invalid input: land_area', 4: 'Invalid input: ward_name', 6: 'Invalid input: ward_name'}
+    valid = [i for i in range(12) if i not in invalid]
+    expected = loader.predict_batch([dict(requests_data[i], area_code=None) for i in valid])
+    assert [float(rows[i + 1][-2]) for i in valid] == [r['predicted_price'] for r in expected]
+    assert {i: rows[i + 1][-1] for i in range(12) if rows[i + 1][-1]} == invalid
+    assert predictor.get_stats()['rows'] == 12 and predictor.get_stats()['failed'] == 3
+
+
+def test_invalid_uploads_are_rejected():
+    """
+    必須列の欠落・空のファイル・未知の文字コードは ValueError、途中の壊れた行はエラー行で終わること
+    """
+    predictor = CSVPredictor(InferenceExecutor(mode="inline"))
+    for body, encoding in ((b"land_area,ward_name\n1,x\n", 'utf-8'), (b"", 'utf-8'), (b"a\n", 'no-such-codec')):
+        try:
+            predictor.open(io.BytesIO(body), encoding)
+            raise AssertionError("invalid upload should be rejected")
+        except ValueError:
+            pass
+
+    r = sample_requests(1)[0]
+    header = "land_area,building_area,building_age,ward_name,year,quarter\n"
+    row = f"{r['land_area']},{r['building_area']},{r['building_age']},{r['ward_name']},{r['year']},{r['quarter']}\n"
+    _, rows = run_csv(predictor, (header + row + '"x' + 'y' * 200000).encode(), load_sample_loader())
+    assert len(rows) == 3 and rows[1][-1] == '' and rows[2][-1].startswith("Malformed CSV")
+
+
+def test_full_queue_waits_instead_of_failing_rows():
+    """
+    推論の待ち行列が満杯の間は空きを待って推論し、queue_wait を過ぎたら再送を始める行を示して終えること
+    """
+    loader = load_sample_loader()
+    header = "land_area,building_area,building_age,ward_name,year,quarter\n"
+    body = header + "".join(
+        f"{r['land_area']},{r['building_area']},{r['building_age']},{r['ward_name']},{r['year']},{r['quarter']}\n"
+        for r in sample_requests(4)
+    )
+
+    async def scenario(queue_wait):
+        executor = InferenceExecutor(mode="thread", max_workers=1, max_queue=0)
+        blocking = BlockingLoader()
+        busy = asyncio.ensure_future(executor.submit(blocking, 'predict', {}))
+        await asyncio.to_thread(blocking.started.wait, 10)
+        asyncio.get_running_loop().call_later(0.2, blocking.release.set)
+
+        predictor = CSVPredictor(executor, chunk_rows=2, queue_wait=queue_wait)
+        chunks = [chunk async for chunk in predictor.stream(predictor.open(io.BytesIO(body.encode())), loader)]
+        await busy
+        executor.shutdown()
+        return list(csv.reader(io.StringIO(b"".join(chunks).decode()))), executor.get_stats()
+
+    rows, stats = asyncio.run(scenario(5.0))
+    assert len(rows) == 5 and all(row[-2] and not row[-1] for row in rows[1:])
+    assert stats['retried'] > 0 and stats['rejected'] == 0
+
+    rows, stats = asyncio.run(scenario(0.0))
+    assert len(rows) == 2 and rows[1][-2] == '' and rows[1][-1].startswith("Stopped at data row 1")
+
+
+TESTS = [
+    test_csv_matches_batch_in_chunks,
+    test_invalid_uploads_are_rejected,
+    test_full_queue_waits_instead_of_failing_rows,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
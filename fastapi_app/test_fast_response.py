@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+高速レスポンスの単体テスト（サーバー不要）
+"""
+
+import tempfile
+
+from fast_response import FastJSONResponse, prediction_content, batch_content
+from model_loader import ModelLoader
+from model_types import BatchPredictResponse
+from predict_schema import PredictResponse
+from test_inference import build_sample_models, sample_requests
+
+
+def test_fast_response_matches_pydantic_serialization():
+    """
+    検証を省略した JSON が PredictResponse / BatchPredictResponse のシリアライズ結果とバイト単位で一致すること
+    """
+    model_dir = tempfile.mkdtemp(prefix="appraisal_models_")
+    build_sample_models(model_dir, artifact=True, ensemble=8)
+    loader = ModelLoader(model_dir=model_dir)
+    requests_data = sample_requests(20)
+
+    results = loader.predict_batch(requests_data)
+    results.append(loader.predict(requests_data[0]))
+    results.append(loader.predict(requests_data[1], ModelLoader.RESULT_FIELDS + ('contributions',)))
+    for result in results:
+        expected = PredictResponse(**result).model_dump_json().encode()
+        assert FastJSONResponse(content=prediction_content(result)).body == expected
+
+    # 項目指定時は指定項目のみ
+    lean = loader.predict(requests_data[2], ['predicted_price'])
+    assert FastJSONResponse(content=prediction_content(lean, ['predicted_price'])).body == \
+        f'{{"predicted_price":{lean["predicted_price"]}}}'.encode()
+
+    # 失敗した要求は null、エラー情報は入力順
+    batch = results[:3] + [None]
+    errors = [{"index": 3, "error": "Prediction failed", "input": requests_data[3]}]
+    expected = BatchPredictResponse(
+        results=[None if r is None else PredictResponse(**r) for r in batch], errors=errors,
+        total_processed=4, successful=3, failed=1, duplicates=2
+    ).model_dump_json().encode()
+    assert FastJSONResponse(content=batch_content(batch, errors, duplicates=2)).body == expected
+
+
+TESTS = [
+    test_fast_response_matches_pydantic_serialization,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+推論パスの単体テスト（サーバー不要）
+
+合成データで学習したモデルを一時ディレクトリに保存し、
+ModelLoader の高速推論パスが sklearn の推論結果と一致することを確認する。
+"""
+
+import os
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from feature_layout import CategoryEncoder, FeatureLayout
+from model_artifact import (
+    ARTIFACT_FILE, compute_interval_statistics, export_linear_model, export_tree_model,
+    fit_bootstrap_ensemble, flatten_tree_ensemble
+)
+from inference_engine import TreeEnsembleKernel, scaler_parameters
+from model_loader import ModelLoader
+
+WARDS = [
+    "千代田区", "中央区", "港区", "新宿区", "文京区", "台東区", "墨田区", "江東区",
+    "品川区", "目黒区", "大田区", "世田谷区", "渋谷区", "中野区", "杉並区", "豊島区",
+    "北区", "荒川区", "板橋区", "練馬区", "足立区", "葛飾区", "江戸川区"
+]
+
+
+def sample_training_frame(num_records: int = 500, seed: int = 0) -> pd.DataFrame:
+    """
+    合成の学習データ（価格は面積・築年数の線形式 + 標準偏差300のノイズ）
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'building_area': rng.uniform(20, 200, num_records),
+        'land_area': rng.uniform(30, 300, num_records),
+        'building_age': rng.uniform(0, 50, num_records),
+        'year': rng.integers(2020, 2025, num_records),
+        'quarter': rng.integers(1, 5, num_records),
+        'ward_name': rng.choice(WARDS, num_records),
+    })
+    df['district'] = df['ward_name'] + "_" + rng.integers(1, 6, num_records).astype(str) + "丁目"
+    df['price'] = (
+        df['building_area'] * 60 + df['land_area'] * 20 - df['building_age'] * 40
+        + rng.normal(0, 300, num_records) + 2000
+    )
+    return df
+
+
+def build_sample_models(model_dir: str, num_records: int = 500, seed: int = 0,
+                        schema: str = "one_hot", artifact: bool = False, ensemble: int = 0,
+                        trees: bool = False) -> None:
+    """
+    合成モデルを保存
+
+    schema="one_hot" は train_model.py（区名 One-hot + area_ratio）、
+    schema="label" は fix_model.py（ward_encoded + total_area, Ridge）と同じ特徴量構成。
+    artifact=True の場合は単一ファイルの成果物（model.bin）も書き出す。
+    ensemble > 0 の場合はそのレプリカ数のブートストラップアンサンブルも保存する。
+    trees=True の場合は線形モデルの代わりに HistGradientBoostingRegressor を学習する。
+    """
+    df = sample_training_frame(num_records, seed)
+
+    label_encoders = {}
+    le_district = LabelEncoder()
+    df['district_encoded'] = le_district.fit_transform(df['district'])
+    label_encoders['district'] = le_district
+    df['area_ratio'] = df['building_area'] / (df['land_area'] + 1e-6)
+    feature_columns = ['building_area', 'land_area', 'building_age', 'year', 'quarter']
+
+    if schema == "label":
+        df['total_area'] = df['building_area'] + df['land_area']
+        le_ward = LabelEncoder()
+        df['ward_encoded'] = le_ward.fit_transform(df['ward_name'])
+        label_encoders['ward'] = le_ward
+        feature_columns += ['area_ratio', 'total_area', 'ward_encoded', 'district_encoded']
+        model = Ridge(alpha=100.0)
+    else:
+        ward_dummies = pd.get_dummies(df['ward_name'], prefix='ward')
+        df = pd.concat([df, ward_dummies], axis=1)
+        feature_columns += ['district_encoded', 'area_ratio'] + ward_dummies.columns.tolist()
+        model = LinearRegression()
+
+    scaler = StandardScaler()
+    X = scaler.fit_transform(df[feature_columns].astype(float))
+    if trees:
+        model = HistGradientBoostingRegressor(max_iter=50, max_leaf_nodes=15, random_state=seed)
+    model.fit(X, df['price'])
+    interval_stats = None if trees else compute_interval_statistics(model, X, df['price'])
+    bootstrap = fit_bootstrap_ensemble(model, X, df['price'], ensemble, n_jobs=1) if ensemble else None
+
+    joblib.dump(model, os.path.join(model_dir, "model.joblib"))
+    joblib.dump(scaler, os.path.join(model_dir, "scaler.joblib"))
+    joblib.dump({
+        'feature_columns': feature_columns,
+        'label_encoders': label_encoders,
+        'target_column': 'price',
+        'interval_stats': interval_stats,
+        'ensemble': bootstrap
+    }, os.path.join(model_dir, "feature_info.joblib"))
+    if artifact and trees:
+        export_tree_model(os.path.join(model_dir, ARTIFACT_FILE), model, scaler,
+                          feature_columns, label_encoders)
+    elif artifact:
+        export_linear_model(os.path.join(model_dir, ARTIFACT_FILE), model, scaler,
+                            feature_columns, label_encoders, interval_stats=interval_stats,
+                            ensemble=bootstrap)
+
+
+def sample_requests(count: int, seed: int = 1) -> list:
+    """
+    テスト用のリクエストデータを生成
+    """
+    rng = np.random.default_rng(seed)
+    requests = []
+    for _ in range(count):
+        ward_name = str(rng.choice(WARDS))
+        requests.append({
+            'land_area': float(rng.uniform(30, 300)),
+            'building_area': float(rng.uniform(20, 200)),
+            'building_age': float(rng.uniform(0, 50)),
+            'ward_name': ward_name,
+            'district': f"{ward_name}_{rng.integers(1, 8)}丁目",
+            'year': int(rng.integers(2020, 2025)),
+            'quarter': int(rng.integers(1, 5)),
+        })
+    return requests
+
+
+def load_sample_loader(schema: str = "one_hot") -> ModelLoader:
+    """
+    合成モデルを読み込んだ ModelLoader を生成
+    """
+    model_dir = tempfile.mkdtemp(prefix="appraisal_models_")
+    build_sample_models(model_dir, schema=schema)
+    return ModelLoader(model_dir=model_dir)
+
+
+def sklearn_predict(loader: ModelLoader, request_data: dict) -> float:
+    """
+    sklearn の transform / predict による参照予測
+    """
+    features = loader.prepare_features(request_data)
+    return float(loader.model.predict(loader.scaler.transform(features))[0])
+
+
+def test_linear_kernel_matches_sklearn():
+    """
+    畳み込みカーネルが sklearn の推論結果と一致すること
+    """
+    loader = load_sample_loader()
+    assert loader.kernel is not None
+
+    for request_data in sample_requests(200):
+        features = loader.prepare_features(request_data)
+        expected = sklearn_predict(loader, request_data)
+        actual = float(loader.kernel.predict(features)[0])
+        assert np.isclose(actual, expected, rtol=1e-9, atol=1e-6)
+
+
+def test_predict_uses_kernel():
+    """
+    predict() の結果が sklearn パスの丸め結果と一致すること
+    """
+    loader = load_sample_loader()
+
+    for request_data in sample_requests(50):
+        expected = round(abs(sklearn_predict(loader, request_data)), 0)
+        assert loader.predict(request_data)['predicted_price'] == expected
+    assert loader.get_model_info()['inference_path'] == "linear_kernel"
+
+
+def test_batch_matches_single_predictions():
+    """
+    一括特徴量生成・バッチ予測が1件ずつの結果と一致すること
+    """
+    loader = load_sample_loader()
+    requests_data = sample_requests(100)
+    requests_data[0]['district'] = None
+    requests_data[1]['district'] = "存在しない地区"
+    requests_data[2]['ward_name'] = "未知区"
+
+    features = loader.prepare_features_batch(requests_data)
+    expected = np.vstack([loader.prepare_features(r) for r in requests_data])
+    np.testing.assert_array_equal(features, expected)
+
+    batch_results = loader.predict_batch(requests_data)
+    assert batch_results == [loader.predict(r) for r in requests_data]
+    assert loader.predict_batch([]) == []
+
+
+def test_feature_layout_slots():
+    """
+    レイアウトが列インデックス・派生特徴量フラグを正しく保持すること
+    """
+    layout = FeatureLayout(['building_area', 'land_area', 'ward_encoded', 'area_ratio', 'ward_港区'])
+
+    assert [slot for _, slot, _ in layout.numeric_slots] == [0, 1]
+    assert layout.dense_slots.tolist() == [0, 1, 2, 3]
+    assert layout.area_ratio_slot == 3
+    assert layout.district_slot is None
+    assert layout.ward_codes == {'港区': 0}
+
+    dense, ward_code = layout.encode_row({'building_area': 50.0, 'land_area': 100.0, 'ward_name': '港区'})
+    row = layout.expand(dense.reshape(1, -1), np.array([ward_code]))[0]
+    assert layout.features_used(row) == {'building_area': 50.0, 'land_area': 100.0, 'ward_港区': 1.0}
+
+
+def test_ward_bias_table_matches_sklearn_for_both_schemas():
+    """
+    区ごとの寄与テーブルによる推論が One-hot / ward_encoded 両スキーマで sklearn と一致すること
+    """
+    for schema in ["one_hot", "label"]:
+        loader = load_sample_loader(schema)
+        requests_data = sample_requests(100)
+        requests_data[0]['ward_name'] = "未知区"
+
+        dense, ward_codes = loader.prepare_compact_batch(requests_data)
+        features = loader.layout.expand(dense, ward_codes)
+        expected = loader.model.predict(loader.scaler.transform(features))
+        np.testing.assert_allclose(loader.kernel.predict_compact(dense, ward_codes), expected, rtol=1e-9)
+
+    # ward_encoded スキーマでは区名がラベル値、total_area が和として入ること
+    row = loader.prepare_features({'building_area': 50.0, 'land_area': 100.0, 'ward_name': '港区'})[0]
+    columns = loader.layout.feature_columns
+    assert row[columns.index('total_area')] == 150.0
+    assert row[columns.index('ward_encoded')] == sorted(WARDS).index('港区')
+
+
+def test_category_encoder_counts_unknown():
+    """
+    未知の値を例外なしでフォールバックし、件数を記録すること
+    """
+    encoder = CategoryEncoder(sorted(['港区_1丁目', '港区_2丁目', '渋谷区_1丁目']), fallback_code=-1)
+
+    assert encoder.encode('港区_2丁目') == 2
+    assert encoder.encode('未知') == -1
+    np.testing.assert_array_equal(
+        encoder.encode_many(['渋谷区_1丁目', None, '未知', '港区_1丁目', '']),
+        [0, 0, -1, 1, 0]
+    )
+    assert encoder.get_stats() == {'classes': 3, 'lookups': 5, 'unknown': 2}
+
+
+def test_prediction_interval_matches_ols_formula():
+    """
+    予測区間の半幅が切片付き計画行列による OLS の公式 t * σ * sqrt(1 + x̃ᵀ(X̃ᵀX̃)⁺x̃) と一致すること
+    """
+    model_dir = tempfile.mkdtemp(prefix="appraisal_models_")
+    build_sample_models(model_dir, num_records=300)
+    loader = ModelLoader(model_dir=model_dir)
+    stats = loader.feature_info['interval_stats']
+    assert abs(stats['residual_variance'] ** 0.5 - 300) < 45
+
+    # 学習データから X̃ = [1, 標準化後の特徴量] を再構成
+    train_requests = sample_training_frame(300).to_dict('records')
+    train_design = np.column_stack([
+        np.ones(len(train_requests)),
+        loader.scaler.transform(loader.prepare_features_batch(train_requests))
+    ])
+    gram_inverse = np.linalg.pinv(train_design.T @ train_design)
+
+    requests_data = sample_requests(50)
+    features = loader.prepare_features_batch(requests_data)
+    design = np.column_stack([np.ones(len(features)), loader.scaler.transform(features)])
+    leverage = np.einsum('ij,jk,ik->i', design, gram_inverse, design)
+    expected = stats['t_critical'] * np.sqrt(stats['residual_variance'] * (1 + leverage))
+    np.testing.assert_allclose(loader.interval_kernel.half_width(features), expected, rtol=1e-6)
+
+    result = loader.predict(requests_data[0])
+    interval = result['prediction_interval']
+    assert interval['lower'] < result['predicted_price'] < interval['upper']
+    assert interval['level'] == 0.95 and 0 < result['confidence'] <= 100
+
+
+def test_field_projection_skips_feature_expansion():
+    """
+    項目を絞った結果が全項目の結果の部分集合と一致し、価格のみの場合は特徴量を展開しないこと
+    """
+    loader = load_sample_loader()
+    requests_data = sample_requests(20)
+    full = loader.predict_batch(requests_data)
+
+    subset = ('predicted_price', 'confidence')
+    assert loader.predict_batch(requests_data, subset) == [
+        {name: result[name] for name in subset} for result in full
+    ]
+    assert loader.predict(requests_data[0], ['predicted_price']) == {
+        'predicted_price': full[0]['predicted_price']
+    }
+
+    expand = loader.layout.expand
+    def fail_expand(*args):
+        raise AssertionError("features should not be expanded")
+    loader.layout.expand = fail_expand
+    try:
+        lean = loader.predict_batch(requests_data, ['predicted_price'])
+    finally:
+        loader.layout.expand = expand
+    assert [r['predicted_price'] for r in lean] == [r['predicted_price'] for r in full]
+
+
+def test_float32_precision_guard():
+    """
+    float32 推論は精度検証に合格した場合のみ有効になり、予測値が float64 と許容差内で一致すること
+    """
+    for schema in ("one_hot", "label"):
+        reference = load_sample_loader(schema)
+        loader = ModelLoader(model_dir=reference.model_dir, precision="float32")
+        assert loader.active_precision == "float32", schema
+        assert loader.kernel.dense_weights.dtype == np.float32
+        assert loader.prepare_compact_batch(sample_requests(2))[0].dtype == np.float32
+        assert loader.precision_deviation <= loader.precision_tolerance
+
+        requests_data = sample_requests(200)
+        expected = [r['predicted_price'] for r in reference.predict_batch(requests_data)]
+        actual = [r['predicted_price'] for r in loader.predict_batch(requests_data)]
+        assert max(abs(a - b) for a, b in zip(actual, expected)) <= loader.precision_tolerance
+        assert loader.predict(requests_data[0])['predicted_price'] == actual[0]
+
+        refused = ModelLoader(model_dir=reference.model_dir, precision="float32", precision_tolerance=-1)
+        assert refused.active_precision == "float64"
+        assert refused.get_model_info()['precision']['requested'] == "float32"
+
+
+def test_bootstrap_ensemble_distribution():
+    """
+    アンサンブルカーネルの1回の行列積が各レプリカの sklearn 推論と一致し、分布が返ること
+    """
+    for schema in ("one_hot", "label"):
+        for artifact in (False, True):
+            model_dir = tempfile.mkdtemp(prefix="appraisal_models_")
+            build_sample_models(model_dir, schema=schema, artifact=artifact, ensemble=8)
+            loader = ModelLoader(model_dir=model_dir)
+            assert loader.ensemble_kernel.replicas == 8
+
+            requests_data = sample_requests(50)
+            dense, ward_codes = loader.prepare_compact_batch(requests_data)
+            features = loader.layout.expand(dense, ward_codes)
+            ensemble = joblib.load(os.path.join(model_dir, "feature_info.joblib"))['ensemble']
+            scaler = joblib.load(os.path.join(model_dir, "scaler.joblib"))
+            expected = scaler.transform(features) @ ensemble['coef'].T + ensemble['intercept']
+            np.testing.assert_allclose(loader.ensemble_kernel.predict_compact(dense, ward_codes), expected, rtol=1e-9)
+            np.testing.assert_allclose(loader.ensemble_kernel.predict(features), expected, rtol=1e-9)
+
+            results = loader.predict_batch(requests_data, ['predicted_price', 'price_distribution'])
+            for result in results:
+                distribution = result['price_distribution']
+                bands = distribution['percentiles']
+                assert distribution['replicas'] == 8 and distribution['std'] > 0
+                assert bands['p5'] <= bands['p50'] <= bands['p95']
+                assert abs(distribution['mean'] - result['predicted_price']) < 5 * distribution['std'] + 1
+            assert loader.predict(requests_data[0], ['price_distribution'])['price_distribution'] == \
+                results[0]['price_distribution']
+
+    assert load_sample_loader().predict(sample_requests(1)[0])['price_distribution'] is None
+
+
+def test_contributions_sum_to_prediction():
+    """
+    baseline と特徴量ごとの寄与の和が負値補正前の予測値と一致し、単件とバッチで同じであること
+    """
+    for schema in ("one_hot", "label"):
+        for artifact in (False, True):
+            model_dir = tempfile.mkdtemp(prefix="appraisal_models_")
+            build_sample_models(model_dir, schema=schema, artifact=artifact)
+            loader = ModelLoader(model_dir=model_dir)
+
+            requests_data = sample_requests(50) + [dict(sample_requests(1)[0], ward_name="未知区")]
+            dense, ward_codes = loader.prepare_compact_batch(requests_data)
+            raw = loader.kernel.predict_compact(dense, ward_codes)
+            results = loader.predict_batch(requests_data, ['predicted_price', 'contributions'])
+            for result, expected in zip(results, raw):
+                contributions = result['contributions']
+                assert list(contributions['features']) == \
+                    [loader.layout.feature_columns[slot] for slot in loader.layout.dense_slots] + ['ward']
+                total = contributions['baseline'] + sum(contributions['features'].values())
+                assert abs(total - expected) <= 0.05 * (len(contributions['features']) + 1)
+            assert loader.predict(requests_data[0], ['contributions'])['contributions'] == \
+                results[0]['contributions']
+
+            # 未知の区は区名ブロックが0のため、寄与は平均的な区との差の符号反転になる
+            unknown_ward = results[-1]['contributions']['features']['ward']
+            assert unknown_ward == round(-loader.kernel.ward_baseline, 1)
+
+    assert 'contributions' not in load_sample_loader().predict(sample_requests(1)[0])
+
+
+def test_tree_kernel_matches_sklearn():
+    """
+    フラットな配列による木の一括評価が sklearn の HistGradientBoostingRegressor と一致すること
+    """
+    for schema in ("one_hot", "label"):
+        for artifact in (False, True):
+            model_dir = tempfile.mkdtemp(prefix="appraisal_models_")
+            build_sample_models(model_dir, schema=schema, artifact=artifact, trees=True)
+            loader = ModelLoader(model_dir=model_dir)
+            assert isinstance(loader.kernel, TreeEnsembleKernel)
+            assert loader.kernel.tree_count == 50
+            assert loader.get_model_info()['inference_path'] == "tree_kernel"
+
+            model = joblib.load(os.path.join(model_dir, "model.joblib"))
+            scaler = joblib.load(os.path.join(model_dir, "scaler.joblib"))
+            requests_data = sample_requests(200) + [dict(sample_requests(1)[0], ward_name="未知区")]
+            features = loader.prepare_features_batch(requests_data)
+            expected = model.predict(scaler.transform(features))
+            np.testing.assert_allclose(loader.kernel.predict(features), expected, rtol=1e-9)
+
+            dense, ward_codes = loader.prepare_compact_batch(requests_data)
+            np.testing.assert_allclose(loader.kernel.predict_compact(dense, ward_codes), expected, rtol=1e-9)
+
+            results = loader.predict_batch(requests_data)
+            assert [r['predicted_price'] for r in results] == np.round(np.abs(expected), 0).tolist()
+            assert results == [loader.predict(r) for r in requests_data]
+
+    # 欠損値は学習時に決めた側の子に進む
+    features[::3, 0] = np.nan
+    np.testing.assert_allclose(loader.kernel.predict(features), model.predict(scaler.transform(features)), rtol=1e-9)
+
+
+
+def test_tree_kernel_folds_partial_scaler():
+    """
+    平均のみ・標準偏差のみのスケーラー（with_std=False / with_mean=False）でも閾値が畳み込まれ、sklearn と一致すること
+    """
+    columns = ['building_area', 'land_area', 'building_age']
+    train = sample_training_frame()
+    features = sample_training_frame(num_records=200, seed=1)[columns].to_numpy(dtype=np.float64)
+    for with_mean, with_std in ((True, False), (False, True)):
+        scaler = StandardScaler(with_mean=with_mean, with_std=with_std).fit(train[columns])
+        model = HistGradientBoostingRegressor(max_iter=20, random_state=0)
+        model.fit(scaler.transform(train[columns].to_numpy()), train['price'])
+        kernel = TreeEnsembleKernel.from_arrays(
+            flatten_tree_ensemble(model), *scaler_parameters(scaler)
+        )
+        expected = model.predict(scaler.transform(features))
+        np.testing.assert_allclose(kernel.predict(features), expected, rtol=1e-9)
+
+
+TESTS = [
+    test_linear_kernel_matches_sklearn,
+    test_predict_uses_kernel,
+    test_batch_matches_single_predictions,
+    test_feature_layout_slots,
+    test_ward_bias_table_matches_sklearn_for_both_schemas,
+    test_category_encoder_counts_unknown,
+    test_prediction_interval_matches_ols_formula,
+    test_field_projection_skips_feature_expansion,
+    test_float32_precision_guard,
+    test_bootstrap_ensemble_distribution,
+    test_contributions_sum_to_prediction,
+    test_tree_kernel_matches_sklearn,
+    test_tree_kernel_folds_partial_scaler,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+推論実行器の単体テスト（サーバー不要）
+"""
+
+import asyncio
+import threading
+
+from inference_executor import InferenceExecutor, InferenceQueueFullError
+from prediction_cache import PredictionCache
+from test_inference import load_sample_loader, sample_requests
+
+
+class BlockingLoader:
+    """
+    release されるまで推論を返さないモデルローダー（実行中・待ちの状態を作るため）
+    """
+
+    model_version = "blocking"
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def predict(self, request_data, fields=None):
+        self.started.set()
+        self.release.wait(timeout=10)
+        return {'predicted_price': 1.0}
+
+
+def test_bounded_queue_rejects_and_keeps_loop_responsive():
+    """
+    実行中はイベントループが止まらず、同時実行数 + 待ち行列を超える要求は拒否されること
+    """
+    async def scenario():
+        executor = InferenceExecutor(mode="thread", max_workers=1, max_queue=1)
+        loader = BlockingLoader()
+        running = asyncio.ensure_future(executor.submit(loader, 'predict', {}))
+        await asyncio.to_thread(loader.started.wait, 10)
+        waiting = asyncio.ensure_future(executor.submit(loader, 'predict', {}))
+        await asyncio.sleep(0)
+
+        stats = executor.get_stats()
+        assert (stats['active'], stats['queue_depth']) == (1, 1)
+        try:
+            await executor.submit(loader, 'predict', {})
+            raise AssertionError("queue overflow should be rejected")
+        except InferenceQueueFullError:
+            pass
+
+        loader.release.set()
+        assert await asyncio.gather(running, waiting) == [{'predicted_price': 1.0}] * 2
+        stats = executor.get_stats()
+        executor.shutdown()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert (stats['active'], stats['queue_depth'], stats['completed'], stats['rejected']) == (0, 0, 2, 1)
+
+
+def test_executor_modes_match_direct_prediction():
+    """
+    thread / process / inline のいずれでも直接推論と同じ結果を返し、キャッシュを共有すること
+    """
+    loader = load_sample_loader()
+    requests_data = sample_requests(20)
+    expected = loader.predict_batch(requests_data)
+
+    async def scenario(mode):
+        executor = InferenceExecutor(mode=mode, max_workers=2)
+        cache = PredictionCache(capacity=64)
+        try:
+            single = await executor.predict(loader, requests_data[0], cache=cache)
+            batch = await executor.predict_batch(loader, requests_data, cache=cache)
+            lean = await executor.predict_batch(loader, requests_data, ['predicted_price'])
+        finally:
+            executor.shutdown()
+        return single, batch, lean, cache.get_stats()
+
+    for mode in InferenceExecutor.MODES:
+        single, batch, lean, cache_stats = asyncio.run(scenario(mode))
+        assert single == loader.predict(requests_data[0]), mode
+        assert batch == expected, mode
+        assert lean == [{'predicted_price': r['predicted_price']} for r in expected], mode
+        assert cache_stats['hits'] == 1, mode
+
+
+TESTS = [
+    test_bounded_queue_rejects_and_keeps_loop_responsive,
+    test_executor_modes_match_direct_prediction,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
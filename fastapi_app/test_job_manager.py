@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+非同期ジョブの単体テスト（サーバー不要）
+"""
+
+import asyncio
+import json
+import os
+import socket
+import tempfile
+
+from job_manager import JobManager, JobQueueFullError
+from job_store import FileJobStore, SQLiteJobStore
+from model_registry import ModelRegistry
+from test_inference import build_sample_models, sample_requests
+
+
+def build_registry() -> ModelRegistry:
+    """
+    合成モデル1つのレジストリを生成
+    """
+    model_dir = tempfile.mkdtemp(prefix="appraisal_models_")
+    build_sample_models(model_dir)
+    return ModelRegistry({"linear": model_dir})
+
+
+def ndjson(requests_data: list) -> bytes:
+    """
+    リクエストデータを NDJSON に変換
+    """
+    return "\n".join(json.dumps(r, ensure_ascii=False) for r in requests_data).encode()
+
+
+async def pieces(body: bytes, size: int = 1000):
+    """
+    ボディを size バイトずつ返す
+    """
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def test_jobs_run_in_pages_on_both_stores():
+    """
+    ジョブは chunk_size 件ごとのページとして保存され、結果は一括推論と一致し、watch は終了まで状態を返すこと
+    """
+    registry = build_registry()
+    loader = registry.get("linear")
+    requests_data = sample_requests(25)
+    requests_data[7] = dict(requests_data[7], land_area=-1)
+    expected = loader.predict_batch([r for i, r in enumerate(requests_data) if i != 7])
+
+    for store in (FileJobStore(tempfile.mkdtemp(prefix="jobs_")),
+                  SQLiteJobStore(os.path.join(tempfile.mkdtemp(prefix="jobs_"), "jobs.sqlite3"))):
+        async def scenario():
+            manager = JobManager(store, registry, chunk_size=10)
+            await manager.start()
+            job = await manager.submit(pieces(ndjson(requests_data) + b"\n\n"), "linear", ['predicted_price'])
+            assert job['status'] == "queued" and 'owner' not in job
+            states = [state async for state in manager.watch(job['job_id'], poll_interval=0.05)]
+            pages = [await manager.read_page(job['job_id'], page) for page in range(4)]
+            await manager.stop()
+            return states, pages, manager.get_stats()
+
+        states, pages, stats = asyncio.run(scenario())
+        final = states[-1]
+        assert final['status'] == "succeeded" and final['progress'] == 1.0
+        assert (stats['succeeded'], stats['rows']) == (1, 25)
+        assert (final['total_rows'], final['processed_rows'], final['failed_rows'], final['pages']) == (25, 25, 1, 3)
+        assert pages[3] is None
+
+        lines = [json.loads(line) for page in pages[:3] for line in page.splitlines()]
+        assert [line['index'] for line in lines] == list(range(25))
+        assert lines[7]['error'].startswith("Invalid input: land_area")
+        results = [line['result'] for line in lines if 'result' in line]
+        assert results == [{'predicted_price': r['predicted_price']} for r in expected]
+
+
+def test_cancel_limits_and_recovery():
+    """
+    実行待ちのキャンセル・待ち行列と入力サイズの上限・終了したプロセスのジョブの再実行
+    """
+    registry = build_registry()
+    store = FileJobStore(tempfile.mkdtemp(prefix="jobs_"))
+    body = ndjson(sample_requests(5))
+
+    async def limits():
+        # ワーカーを起動しないため、ジョブは実行待ちのまま
+        manager = JobManager(store, registry, max_queued=1, max_input_bytes=len(body))
+        queued = await manager.submit(pieces(body), "linear")
+        try:
+            await manager.submit(pieces(body), "linear")
+            raise AssertionError("full queue should reject jobs")
+        except JobQueueFullError:
+            pass
+        try:
+            await manager.delete(queued['job_id'])
+            raise AssertionError("active job should not be deleted")
+        except ValueError:
+            pass
+        cancelled = await manager.cancel(queued['job_id'])
+        await manager.delete(queued['job_id'])
+
+        manager = JobManager(store, registry, max_input_bytes=len(body) - 1)
+        try:
+            await manager.submit(pieces(body), "linear")
+            raise AssertionError("oversized input should be rejected")
+        except ValueError:
+            pass
+        return cancelled
+
+    cancelled = asyncio.run(limits())
+    assert cancelled['status'] == "cancelled" and store.list() == []
+
+    async def recovery():
+        manager = JobManager(store, registry)
+        job = await manager.submit(pieces(body), "linear")
+        # 実行中に終了したプロセス（存在しない PID）が保持していたジョブ
+        store.update(job['job_id'], {"status": "running", "owner": f"{socket.gethostname()}:999999999", "pages": 1})
+
+        manager = JobManager(store, registry)
+        await manager.start()
+        states = [state async for state in manager.watch(job['job_id'], poll_interval=0.05)]
+        await manager.stop()
+        return states[-1], store.get(job['job_id'])['owner'], manager.owner
+
+    final, owner, new_owner = asyncio.run(recovery())
+    assert final['status'] == "succeeded" and final['processed_rows'] == 5 and owner == new_owner
+
+
+TESTS = [
+    test_jobs_run_in_pages_on_both_stores,
+    test_cancel_limits_and_recovery,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+マイクロバッチャーの単体テスト（サーバー不要）
+"""
+
+import asyncio
+
+from inference_executor import InferenceExecutor
+from micro_batcher import MicroBatcher
+from prediction_cache import PredictionCache
+from test_inference import load_sample_loader, sample_requests
+
+
+def run_concurrently(batcher: MicroBatcher, calls: list) -> list:
+    """
+    (model_loader, request_data, fields) の組を同時に予測し、結果または例外を返す
+    """
+    async def scenario():
+        try:
+            return await asyncio.gather(
+                *(batcher.predict(loader, request_data, fields) for loader, request_data, fields in calls),
+                return_exceptions=True
+            )
+        finally:
+            batcher.executor.shutdown()
+    return asyncio.run(scenario())
+
+
+def test_concurrent_requests_are_batched():
+    """
+    同時に届いた要求が max_batch_size ごとのバッチにまとめられ、結果は単件推論と一致すること
+    """
+    loader = load_sample_loader()
+    requests_data = sample_requests(20)
+    batcher = MicroBatcher(InferenceExecutor(mode="thread", max_workers=2), max_batch_size=8)
+
+    results = run_concurrently(batcher, [(loader, request_data, None) for request_data in requests_data])
+    assert results == [loader.predict(request_data) for request_data in requests_data]
+
+    stats = batcher.get_stats()
+    assert (stats['batches'], stats['items'], stats['pending']) == (3, 20, 0)
+    assert stats['batch_size_histogram'] == {"<=4": 1, "<=8": 2}
+    assert stats['queue_delay_ms']['max'] >= stats['queue_delay_ms']['p50'] >= 0
+
+
+def test_failures_are_isolated_and_fields_batched_separately():
+    """
+    不正な要求は該当の呼び出しのみ失敗し、返す項目が異なる要求は別バッチになること
+    """
+    loader = load_sample_loader()
+    first, second = sample_requests(2)
+    batcher = MicroBatcher(InferenceExecutor(mode="inline"), max_batch_size=8)
+
+    results = run_concurrently(batcher, [
+        (loader, first, None),
+        (loader, dict(second, land_area="abc"), None),
+        (loader, second, ('predicted_price',)),
+    ])
+    assert results[0] == loader.predict(first)
+    assert isinstance(results[1], RuntimeError)
+    assert results[2] == {'predicted_price': loader.predict(second)['predicted_price']}
+    assert batcher.get_stats()['batches'] == 2
+
+
+def test_cache_hits_skip_batching():
+    """
+    キャッシュ済みの要求はバッチに加わらず即座に返ること
+    """
+    loader = load_sample_loader()
+    request_data = sample_requests(1)[0]
+    cache = PredictionCache(capacity=8)
+    batcher = MicroBatcher(InferenceExecutor(mode="inline"))
+
+    async def scenario():
+        first = await batcher.predict(loader, request_data, cache=cache)
+        second = await batcher.predict(loader, request_data, cache=cache)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert batcher.get_stats()['items'] == 1
+
+
+TESTS = [
+    test_concurrent_requests_are_batched,
+    test_failures_are_isolated_and_fields_batched_separately,
+    test_cache_hits_skip_batching,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+単一ファイルのモデル成果物の単体テスト（サーバー不要）
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from model_artifact import ARTIFACT_FILE, read_artifact
+from model_loader import ModelLoader
+from test_inference import build_sample_models, sample_requests
+
+
+def test_artifact_matches_joblib_for_both_schemas():
+    """
+    成果物から読み込んだモデルが sklearn なしで joblib 版と同じ予測を返すこと
+    """
+    for schema in ["one_hot", "label"]:
+        joblib_dir = tempfile.mkdtemp(prefix="appraisal_joblib_")
+        artifact_dir = tempfile.mkdtemp(prefix="appraisal_artifact_")
+        build_sample_models(joblib_dir, schema=schema)
+        build_sample_models(artifact_dir, schema=schema, artifact=True)
+
+        expected_loader = ModelLoader(model_dir=joblib_dir)
+        loader = ModelLoader(model_dir=artifact_dir)
+        assert loader.model is None and loader.scaler is None and loader.is_loaded()
+        assert isinstance(loader.artifact.array('coef').base, np.memmap)
+        assert loader.model_type == expected_loader.model_type
+        assert loader.layout.ward_names == expected_loader.layout.ward_names
+
+        requests_data = sample_requests(100)
+        requests_data[0]['ward_name'] = "未知区"
+        requests_data[1]['district'] = "存在しない地区"
+        assert loader.predict_batch(requests_data) == expected_loader.predict_batch(requests_data)
+        assert loader.get_model_info()['artifact_format'] == "artifact"
+
+
+def test_corrupt_artifact_is_rejected():
+    """
+    切り詰められた成果物・別形式のファイルは読み込みエラーになること
+    """
+    model_dir = tempfile.mkdtemp(prefix="appraisal_artifact_")
+    build_sample_models(model_dir, artifact=True)
+    path = os.path.join(model_dir, ARTIFACT_FILE)
+    assert read_artifact(path).feature_columns[0] == 'building_area'
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    for broken in (data[:-8], b"NOTMODEL" + data[8:]):
+        with open(path, 'wb') as f:
+            f.write(broken)
+        try:
+            read_artifact(path)
+            assert False, "corrupt artifact should be rejected"
+        except ValueError:
+            pass
+
+
+def test_lean_runtime_does_not_import_sklearn():
+    """
+    軽量ランタイムは scikit-learn・joblib を import せず、model.bin が無い場合は読み込みに失敗すること
+    """
+    model_dir = tempfile.mkdtemp(prefix="appraisal_artifact_")
+    build_sample_models(model_dir, artifact=True)
+    script = (
+        "import sys\n"
+        "from model_loader import ModelLoader\n"
+        "loader = ModelLoader(model_dir=sys.argv[1], lean=True)\n"
+        "loader.warm_up()\n"
+        "print(sorted(name for name in ('sklearn', 'joblib', 'scipy', 'pandas') if name in sys.modules))\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", script, model_dir],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+    )
+    assert completed.stdout.strip() == "[]"
+
+    os.remove(os.path.join(model_dir, ARTIFACT_FILE))
+    try:
+        ModelLoader(model_dir=model_dir, lean=True)
+        assert False, "lean runtime should require model.bin"
+    except RuntimeError:
+        pass
+
+
+TESTS = [
+    test_artifact_matches_joblib_for_both_schemas,
+    test_corrupt_artifact_is_rejected,
+    test_lean_runtime_does_not_import_sklearn,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+複数モデルレジストリの単体テスト（サーバー不要）
+"""
+
+import asyncio
+import tempfile
+
+from inference_executor import InferenceExecutor
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache
+from test_inference import build_sample_models, sample_requests
+
+
+def build_registry(**kwargs) -> ModelRegistry:
+    """
+    One-hot（LinearRegression）と ward_encoded（Ridge）の2モデルを登録したレジストリ
+    """
+    model_dirs = {}
+    for name, schema in (("linear", "one_hot"), ("ridge", "label")):
+        model_dirs[name] = tempfile.mkdtemp(prefix=f"appraisal_{name}_")
+        build_sample_models(model_dirs[name], schema=schema)
+    return ModelRegistry(model_dirs, default="linear", aliases={"candidate": "ridge"}, **kwargs)
+
+
+def test_registry_routes_by_name_and_alias():
+    """
+    特徴量スキーマが異なるモデルを名前・エイリアスで選択できること
+    """
+    registry = build_registry()
+
+    assert registry.get() is registry.get("linear") is registry.get("default")
+    assert registry.get("candidate") is registry.get("ridge")
+    assert type(registry.get("ridge").model).__name__ == "Ridge"
+    assert registry.get("linear").layout.feature_count != registry.get("ridge").layout.feature_count
+    try:
+        registry.get("unknown")
+        assert False, "unknown model should raise KeyError"
+    except KeyError:
+        pass
+
+    request_data = sample_requests(1)[0]
+    for name in registry.names:
+        assert registry.get(name).predict(request_data)['predicted_price'] > 0
+
+    status = registry.get_status()
+    assert status['default'] == "linear" and set(status['models']) == {"linear", "ridge"}
+
+
+def test_cache_is_separated_per_model_and_invalidated_on_reload():
+    """
+    キャッシュはモデルごとに分かれ、再読み込みしたモデルのエントリだけが破棄されること
+    """
+    cache = PredictionCache(capacity=10, ttl_seconds=60)
+    executor = InferenceExecutor(mode="inline")
+    swaps = []
+
+    def on_swap(name, loader, previous):
+        swaps.append(name)
+        if previous is not None:
+            cache.invalidate_version(previous.model_version)
+
+    registry = build_registry(on_swap=on_swap)
+    request_data = sample_requests(1)[0]
+    linear_result = asyncio.run(executor.predict(registry.get("linear"), request_data, None, cache))
+    ridge_result = asyncio.run(executor.predict(registry.get("ridge"), request_data, None, cache))
+    assert linear_result != ridge_result
+    assert cache.get_stats()['size'] == 2
+
+    build_sample_models(registry.reloaders["ridge"].model_dir, schema="label", seed=1)
+    asyncio.run(registry.reload("candidate"))
+    assert swaps == ["linear", "ridge", "ridge"]
+
+    assert asyncio.run(executor.predict(registry.get("linear"), request_data, None, cache)) is linear_result
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['invalidations'], stats['size']) == (1, 1, 1)
+
+
+TESTS = [
+    test_registry_routes_by_name_and_alias,
+    test_cache_is_separated_per_model_and_invalidated_on_reload,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
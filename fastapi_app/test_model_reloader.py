@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+モデルのホットリロードの単体テスト（サーバー不要）
+"""
+
+import asyncio
+import os
+import tempfile
+
+from model_reloader import ModelReloader
+from test_inference import build_sample_models
+
+
+def test_reload_swaps_and_keeps_old_model_on_failure():
+    """
+    再読み込み成功時は差し替え、失敗時は旧モデルで稼働を継続すること
+    """
+    model_dir = tempfile.mkdtemp(prefix="appraisal_models_")
+    build_sample_models(model_dir, seed=0)
+    swapped = []
+    reloader = ModelReloader(model_dir=model_dir, on_swap=swapped.append)
+    old_loader = reloader.current
+
+    build_sample_models(model_dir, seed=1)
+    status = asyncio.run(reloader.reload())
+    assert status['reload_count'] == 1 and status['last_reload_error'] is None
+    assert reloader.current is not old_loader
+    assert reloader.current.model_version != old_loader.model_version
+    assert swapped == [old_loader, reloader.current]
+
+    # 処理中のリクエストが保持している旧モデルは引き続き利用可能
+    assert old_loader.predict(old_loader.WARMUP_REQUEST)['predicted_price'] > 0
+
+    active_loader = reloader.current
+    with open(os.path.join(model_dir, "model.joblib"), 'wb') as f:
+        f.write(b"broken")
+    status = asyncio.run(reloader.reload())
+    assert status['last_reload_error'] is not None
+    assert reloader.current is active_loader
+
+
+TESTS = [
+    test_reload_swaps_and_keeps_old_model_on_failure,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
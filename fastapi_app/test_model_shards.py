@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+地域シャードの単体テスト（サーバー不要）
+"""
+
+import asyncio
+import tempfile
+
+from pydantic import ValidationError
+
+from inference_executor import InferenceExecutor
+from model_loader import ModelLoader
+from model_shards import RegionShards
+from predict_schema import PredictRequest, ward_validation_context
+from regions import build_allowed_wards
+from test_inference import build_sample_models, load_sample_loader, sample_requests
+
+
+def build_shards(regions: list, max_memory_mb: float = 512.0, preload: tuple = ()) -> RegionShards:
+    """
+    地域ごとに合成モデルを保存した RegionShards を生成（区名は "<地域>市"、市区町村コードは連番）
+    """
+    shards = {}
+    for i, region in enumerate(regions):
+        model_dir = tempfile.mkdtemp(prefix=f"appraisal_{region}_")
+        build_sample_models(model_dir, seed=i, artifact=True)
+        shards[region] = {"model_dir": model_dir, "wards": [f"{region}市"], "area_codes": [f"9{i:04d}"]}
+    return RegionShards(shards, max_memory_mb=max_memory_mb, preload=preload)
+
+
+def test_lazy_load_and_lru_eviction():
+    """
+    シャードは初回使用時に読み込まれ、メモリ上限を超えると最も長く使われていない（preload 以外の）シャードが破棄されること
+    """
+    size_mb = ModelLoader(build_shards(["probe"]).model_dirs["probe"]).memory_footprint() / 1024 / 1024
+    shards = build_shards(["tokyo", "tama", "osaka", "nagoya"], max_memory_mb=size_mb * 2.5, preload=("tokyo",))
+    assert shards.get_status()['loaded'] == []
+
+    shards.preload()
+    tama = shards.get("tama")
+    assert shards.get("tama") is tama
+    shards.get("osaka")
+    assert [s['region'] for s in shards.get_status()['loaded']] == ["tokyo", "osaka"]
+
+    shards.get("tama")
+    shards.get("nagoya")
+    status = shards.get_status()
+    assert [s['region'] for s in status['loaded']] == ["tokyo", "nagoya"]
+    assert (status['loads'], status['evictions'], status['hits']) == (5, 3, 1)
+    assert status['memory_mb'] <= status['max_memory_mb']
+    assert status['loaded'][0]['pinned'] and not status['loaded'][1]['pinned']
+
+
+def test_routing_and_grouped_batch():
+    """
+    市区町村コード・区名の順でシャードに振り分けられ、担当外の要求はデフォルトモデルで推論されること
+    """
+    shards = build_shards(["tama", "osaka"])
+    default = load_sample_loader()
+    assert shards.route("tama市") == "tama"
+    assert shards.route("tama市", area_code="90001") == "osaka"
+    assert shards.route("世田谷区", area_code="13112") is None
+
+    # 設定した区名は許可リストに加えた場合のみ受け付ける（シャードを生成しただけでは変わらない）
+    raw = dict(sample_requests(1)[0], ward_name="osaka市")
+    try:
+        PredictRequest(**raw)
+        raise AssertionError("ward outside the allow-list should be rejected")
+    except ValidationError:
+        pass
+    wards = build_allowed_wards(shards.wards)
+    request_data = PredictRequest.model_validate(raw, context={'wards': wards}).dict()
+    with ward_validation_context(wards):
+        assert PredictRequest(**raw).dict() == request_data
+
+    requests_data = sample_requests(6)
+    requests_data[1] = dict(requests_data[1], ward_name="tama市")
+    requests_data[4] = dict(requests_data[4], area_code="90000")
+    requests_data.append(request_data)
+
+    async def scenario():
+        executor = InferenceExecutor(mode="inline")
+        regions, loaders = await shards.loaders(requests_data, default)
+        results = await executor.predict_grouped(loaders, requests_data)
+        return regions, loaders, results
+
+    regions, loaders, results = asyncio.run(scenario())
+    assert regions == [None, "tama", None, None, "tama", None, "osaka"]
+    assert loaders[0] is default and loaders[1] is loaders[4] is shards.get("tama")
+    assert results == [loader.predict(r) for loader, r in zip(loaders, requests_data)]
+
+    try:
+        RegionShards({"a": {"model_dir": "x", "wards": ["北区"]}, "b": {"model_dir": "y", "wards": ["北区"]}})
+        raise AssertionError("duplicate ward routes should be rejected")
+    except ValueError:
+        pass
+
+
+TESTS = [
+    test_lazy_load_and_lru_eviction,
+    test_routing_and_grouped_batch,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
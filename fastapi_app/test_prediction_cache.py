@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+予測キャッシュの単体テスト（サーバー不要）
+"""
+
+import asyncio
+
+from inference_executor import InferenceExecutor
+from prediction_cache import PredictionCache, deduplicate
+from test_inference import load_sample_loader, sample_requests
+
+
+def predict(loader, request_data, cache, fields=None):
+    """
+    キャッシュ経由の単件予測（実行器をインラインで使用）
+    """
+    return asyncio.run(InferenceExecutor(mode="inline").predict(loader, request_data, fields, cache))
+
+
+def test_cache_hit_miss_and_eviction():
+    """
+    同一リクエストはキャッシュから返り、容量超過で古いエントリが破棄されること
+    """
+    loader = load_sample_loader()
+    cache = PredictionCache(capacity=2, ttl_seconds=60)
+    first, second, third = sample_requests(3)
+
+    result = predict(loader, first, cache)
+    assert predict(loader, dict(first, year=float(first['year'])), cache) is result
+    predict(loader, second, cache)
+    predict(loader, third, cache)
+
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['size']) == (1, 3, 1, 2)
+
+
+def test_batch_computes_only_misses():
+    """
+    バッチ予測はキャッシュ済み項目を再利用し、結果は非キャッシュ時と一致すること
+    """
+    loader = load_sample_loader()
+    cache = PredictionCache(capacity=100, ttl_seconds=60)
+    requests_data = sample_requests(10)
+
+    executor = InferenceExecutor(mode="inline")
+    asyncio.run(executor.predict_batch(loader, requests_data[:4], None, cache))
+    results = asyncio.run(executor.predict_batch(loader, requests_data, None, cache))
+
+    assert results == loader.predict_batch(requests_data)
+    assert cache.get_stats()['hits'] == 4
+
+
+def test_cache_invalidated_on_model_reload():
+    """
+    モデルバージョンごとにキャッシュが分かれ、旧バージョンの破棄で新バージョンは残ること
+    """
+    loader = load_sample_loader()
+    cache = PredictionCache(capacity=10, ttl_seconds=60)
+    request_data = sample_requests(1)[0]
+
+    previous_version = loader.model_version
+    predict(loader, request_data, cache)
+    loader.model_version = "reloaded"
+    predict(loader, request_data, cache)
+    cache.invalidate_version(previous_version)
+
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['invalidations'], stats['size']) == (0, 1, 1)
+
+
+def test_cache_separates_projected_results():
+    """
+    項目を絞った結果と全項目の結果が別エントリとしてキャッシュされること
+    """
+    loader = load_sample_loader()
+    cache = PredictionCache(capacity=8, ttl_seconds=60)
+    request_data = sample_requests(1)[0]
+
+    lean = predict(loader, request_data, cache, frozenset(['predicted_price']))
+    full = predict(loader, request_data, cache)
+    assert set(lean) == {'predicted_price'}
+    assert set(full) == set(loader.RESULT_FIELDS)
+    assert predict(loader, request_data, cache, ['predicted_price']) is lean
+    assert cache.get_stats()['hits'] == 1
+
+
+def test_deduplicate_scatters_back_to_positions():
+    """
+    正規化キーが同じリクエストは1件にまとめられ、位置から元の順序の結果に戻せること
+    """
+    loader = load_sample_loader()
+    first, second = sample_requests(2)
+    requests_data = [first, second, dict(first, year=float(first['year'])), first, dict(second, quarter=second['quarter'] % 4 + 1)]
+
+    unique, positions = deduplicate(requests_data)
+    assert unique == [first, second, requests_data[4]]
+    assert positions == [0, 1, 0, 0, 2]
+
+    unique_results = loader.predict_batch(unique)
+    assert [unique_results[position] for position in positions] == loader.predict_batch(requests_data)
+    assert deduplicate([]) == ([], [])
+
+
+TESTS = [
+    test_cache_hit_miss_and_eviction,
+    test_batch_computes_only_misses,
+    test_cache_invalidated_on_model_reload,
+    test_cache_separates_projected_results,
+    test_deduplicate_scatters_back_to_positions,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+ストリーミング予測の単体テスト（サーバー不要）
+"""
+
+import asyncio
+import json
+
+from inference_executor import InferenceExecutor
+from test_inference_executor import BlockingLoader
+from model_loader import ModelLoader
+from prediction_cache import PredictionCache
+from stream_predictor import StreamPredictor
+from test_inference import load_sample_loader, sample_requests
+
+
+def run_stream(predictor: StreamPredictor, body: bytes, loader: ModelLoader, fields=None,
+               piece_size: int = 7) -> list:
+    """
+    ボディを piece_size バイトずつ送ってストリーミング予測し、(チャンク数, 結果行) を返す
+    """
+    async def pieces():
+        for start in range(0, len(body), piece_size):
+            yield body[start:start + piece_size]
+
+    async def scenario():
+        return [chunk async for chunk in predictor.stream(pieces(), loader, fields, PredictionCache())]
+
+    chunks = asyncio.run(scenario())
+    return len(chunks), [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+
+
+def test_stream_matches_batch_in_chunks():
+    """
+    入力は chunk_size 件ごとに推論され、結果は入力順で一括推論と一致すること（空行は無視）
+    """
+    loader = load_sample_loader()
+    requests_data = sample_requests(25)
+    requests_data[10] = requests_data[3]
+    body = "\n\n".join(json.dumps(r, ensure_ascii=False) for r in requests_data).encode()
+
+    predictor = StreamPredictor(InferenceExecutor(mode="inline"), chunk_size=10)
+    chunks, lines = run_stream(predictor, body, loader)
+    expected = loader.predict_batch([dict(r) for r in requests_data])
+    assert chunks == 3
+    assert [line['index'] for line in lines] == list(range(25))
+    assert [line['result']['predicted_price'] for line in lines] == [r['predicted_price'] for r in expected]
+    assert lines[0]['result']['prediction_interval'] == expected[0]['prediction_interval']
+
+    _, lean = run_stream(predictor, body + b"\n", loader, fields=['predicted_price'], piece_size=4096)
+    assert lean[0] == {"index": 0, "result": {"predicted_price": expected[0]['predicted_price']}}
+    assert predictor.get_stats()['rows'] == 50 and predictor.get_stats()['failed'] == 0
+
+
+def test_invalid_rows_are_reported_inline():
+    """
+    不正な JSON・検証エラー・長すぎる行はその行のエラーとして返し、ストリームは継続すること
+    """
+    loader = load_sample_loader()
+    first, second = sample_requests(2)
+    rows = [
+        json.dumps(first, ensure_ascii=False),
+        '{"land_area": ',
+        json.dumps(dict(first, land_area=-1), ensure_ascii=False),
+        '["not", "an", "object"]',
+        'x' * 300,
+        json.dumps(second, ensure_ascii=False),
+    ]
+    predictor = StreamPredictor(InferenceExecutor(mode="inline"), chunk_size=4, max_line_bytes=256)
+    _, lines = run_stream(predictor, "\n".join(rows).encode(), loader)
+
+    assert [line['index'] for line in lines] == list(range(6))
+    assert lines[0]['result'] == dict(loader.predict(first), contributions=None)
+    assert lines[1]['error'].startswith("Invalid JSON") and lines[1]['input'] == '{"land_area": '
+    assert lines[2]['error'].startswith("Invalid input: land_area")
+    assert lines[3]['input'] == ["not", "an", "object"]
+    assert lines[4] == {"index": 4, "error": "Line exceeds 256 bytes", "input": None}
+    assert lines[5]['result']['predicted_price'] == loader.predict(second)['predicted_price']
+    assert predictor.get_stats()['failed'] == 4
+
+
+def test_full_queue_waits_instead_of_failing_rows():
+    """
+    推論の待ち行列が満杯の間は空きを待って推論し、queue_wait を過ぎたら未処理の行番号を示して終えること
+    """
+    loader = load_sample_loader()
+    requests_data = sample_requests(6)
+    body = "\n".join(json.dumps(r, ensure_ascii=False) for r in requests_data).encode()
+
+    async def scenario(queue_wait):
+        executor = InferenceExecutor(mode="thread", max_workers=1, max_queue=0)
+        blocking = BlockingLoader()
+        busy = asyncio.ensure_future(executor.submit(blocking, 'predict', {}))
+        await asyncio.to_thread(blocking.started.wait, 10)
+        asyncio.get_running_loop().call_later(0.2, blocking.release.set)
+
+        async def pieces():
+            yield body
+
+        predictor = StreamPredictor(executor, chunk_size=3, queue_wait=queue_wait)
+        chunks = [chunk async for chunk in predictor.stream(pieces(), loader)]
+        await busy
+        executor.shutdown()
+        return [json.loads(line) for chunk in chunks for line in chunk.splitlines()], executor.get_stats()
+
+    lines, stats = asyncio.run(scenario(5.0))
+    assert [line['index'] for line in lines] == list(range(6)) and all('result' in line for line in lines)
+    assert stats['retried'] > 0 and stats['rejected'] == 0
+
+    lines, stats = asyncio.run(scenario(0.0))
+    assert lines == [{"index": 0, "error": lines[0]['error'], "input": None}]
+    assert lines[0]['error'].startswith("Stream stopped") and stats['rejected'] == 1
+
+
+TESTS = [
+    test_stream_matches_batch_in_chunks,
+    test_invalid_rows_are_reported_inline,
+    test_full_queue_waits_instead_of_failing_rows,
+]
+
+
+if __name__ == "__main__":
+    for test in TESTS:
+        test()
+        print(f"✅ {test.__name__}")
@@ -10,17 +10,28 @@ from sklearn.linear_model import Ridge  # 正則化付き回帰
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 import joblib
+import os
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+# 成果物の形式は推論側（fastapi_app/model_artifact.py）と共有する
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fastapi_app'))
+from model_artifact import (
+    ARTIFACT_FILE, compute_interval_statistics, export_linear_model, fit_bootstrap_ensemble
+)
+
 class ImprovedRealEstateModelTrainer:
-    def __init__(self, data_path: str = "data/tokyo_23ku_2020_2024.csv"):
+    def __init__(self, data_path: str = "data/tokyo_23ku_2020_2024.csv", bootstrap_replicas: int = 0):
         self.data_path = data_path
+        self.bootstrap_replicas = bootstrap_replicas
         self.model = None
         self.scaler = None
         self.label_encoders = {}
         self.feature_columns = []
         self.target_column = 'price'
+        self.interval_stats = None
+        self.ensemble = None
         
     def load_data(self) -> pd.DataFrame:
         """
@@ -102,6 +113,18 @@ class ImprovedRealEstateModelTrainer:
         self.model = Ridge(alpha=100.0)  # 正則化パラメータ
         self.model.fit(X_train_scaled, y_train)
         
+        # 予測区間用の統計量（残差分散・係数共分散）
+        self.interval_stats = compute_interval_statistics(self.model, X_train_scaled, y_train)
+        print(f"Residual std: {self.interval_stats['residual_variance'] ** 0.5:,.0f} "
+              f"(dof={self.interval_stats['dof']:.0f})")
+        
+        # ブートストラップアンサンブル（K 個のレプリカを全コアで並列学習し (K, F) の係数行列に保存）
+        if self.bootstrap_replicas > 0:
+            self.ensemble = fit_bootstrap_ensemble(
+                self.model, X_train_scaled, y_train, self.bootstrap_replicas
+            )
+            print(f"Bootstrap ensemble: {self.bootstrap_replicas} replicas")
+        
         # 予測
         y_train_pred = self.model.predict(X_train_scaled)
         y_test_pred = self.model.predict(X_test_scaled)
@@ -160,10 +183,22 @@ class ImprovedRealEstateModelTrainer:
             'feature_columns': self.feature_columns,
             'label_encoders': self.label_encoders,
             'target_column': self.target_column,
+            'interval_stats': self.interval_stats,
+            'ensemble': self.ensemble,
             'model_type': 'Ridge'
         }
         joblib.dump(feature_info, feature_path)
         
+        # 単一ファイルの成果物（FastAPI はこちらを優先し、sklearn なしでメモリマップ読み込みする）
+        artifact_path = os.path.join(model_dir, ARTIFACT_FILE)
+        export_linear_model(
+            artifact_path, self.model, self.scaler,
+            self.feature_columns, self.label_encoders, self.target_column,
+            interval_stats=self.interval_stats,
+            ensemble=self.ensemble
+        )
+        print(f"Model artifact saved to: {artifact_path}")
+        
         print(f"Improved model saved to: {model_dir}")
 
 def main():
@@ -171,7 +206,8 @@ def main():
     改善されたモデルの訓練と保存
     """
     try:
-        trainer = ImprovedRealEstateModelTrainer()
+        # BOOTSTRAP_REPLICAS: ブートストラップアンサンブルのレプリカ数（0 で作成しない）
+        trainer = ImprovedRealEstateModelTrainer(bootstrap_replicas=int(os.getenv('BOOTSTRAP_REPLICAS', '0')))
         
         # データ読み込み
         df = trainer.load_data()
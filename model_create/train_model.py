@@ -8,20 +8,39 @@ import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
+from sklearn.ensemble import HistGradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 import joblib
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+# 成果物の形式は推論側（fastapi_app/model_artifact.py）と共有する
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fastapi_app'))
+from model_artifact import (
+    ARTIFACT_FILE, compute_interval_statistics, export_linear_model, export_tree_model,
+    fit_bootstrap_ensemble
+)
+
 class RealEstateModelTrainer:
-    def __init__(self, data_path: str = "data/tokyo_23ku_2020_2024.csv"):
+    # 学習できるモデルの種類（hist_gbr は勾配ブースティング木、予測区間・アンサンブルは線形のみ）
+    MODEL_TYPES = ("linear", "hist_gbr")
+    
+    def __init__(self, data_path: str = "data/tokyo_23ku_2020_2024.csv", bootstrap_replicas: int = 0,
+                 model_type: str = "linear"):
+        if model_type not in self.MODEL_TYPES:
+            raise ValueError(f"Unknown model type '{model_type}', expected one of {self.MODEL_TYPES}")
         self.data_path = data_path
+        self.bootstrap_replicas = bootstrap_replicas
+        self.model_type = model_type
         self.model = None
         self.scaler = None
         self.label_encoders = {}
         self.feature_columns = []
         self.target_column = 'price'
+        self.interval_stats = None
+        self.ensemble = None
         
     def load_data(self) -> pd.DataFrame:
         """
@@ -134,9 +153,25 @@ class RealEstateModelTrainer:
         X_test_scaled = self.scaler.transform(X_test)
         
         # モデル訓練
-        self.model = LinearRegression()
+        if self.model_type == "hist_gbr":
+            self.model = HistGradientBoostingRegressor(max_iter=200, random_state=42)
+        else:
+            self.model = LinearRegression()
         self.model.fit(X_train_scaled, y_train)
         
+        # 予測区間用の統計量（残差分散・係数共分散、線形モデルのみ）
+        if self.model_type == "linear":
+            self.interval_stats = compute_interval_statistics(self.model, X_train_scaled, y_train)
+            print(f"Residual std: {self.interval_stats['residual_variance'] ** 0.5:,.0f} "
+                  f"(dof={self.interval_stats['dof']:.0f})")
+        
+        # ブートストラップアンサンブル（K 個のレプリカを全コアで並列学習し (K, F) の係数行列に保存）
+        if self.bootstrap_replicas > 0 and self.model_type == "linear":
+            self.ensemble = fit_bootstrap_ensemble(
+                self.model, X_train_scaled, y_train, self.bootstrap_replicas
+            )
+            print(f"Bootstrap ensemble: {self.bootstrap_replicas} replicas")
+        
         # 予測
         y_train_pred = self.model.predict(X_train_scaled)
         y_test_pred = self.model.predict(X_test_scaled)
@@ -157,16 +192,18 @@ class RealEstateModelTrainer:
         print(f"Training MAE: {train_mae:,.0f}")
         print(f"Test MAE: {test_mae:,.0f}")
         
-        # 特徴量重要度（回帰係数）
-        feature_importance = pd.DataFrame({
-            'feature': self.feature_columns,
-            'coefficient': self.model.coef_
-        })
-        feature_importance['abs_coefficient'] = np.abs(feature_importance['coefficient'])
-        feature_importance = feature_importance.sort_values('abs_coefficient', ascending=False)
-        
-        print("\n=== Top 10 Feature Importance ===")
-        print(feature_importance.head(10))
+        # 特徴量重要度（回帰係数、木モデルは算出しない）
+        feature_importance = None
+        if hasattr(self.model, 'coef_'):
+            feature_importance = pd.DataFrame({
+                'feature': self.feature_columns,
+                'coefficient': self.model.coef_
+            })
+            feature_importance['abs_coefficient'] = np.abs(feature_importance['coefficient'])
+            feature_importance = feature_importance.sort_values('abs_coefficient', ascending=False)
+            
+            print("\n=== Top 10 Feature Importance ===")
+            print(feature_importance.head(10))
         
         return {
             'train_r2': train_r2,
@@ -199,11 +236,30 @@ class RealEstateModelTrainer:
         feature_info = {
             'feature_columns': self.feature_columns,
             'label_encoders': self.label_encoders,
-            'target_column': self.target_column
+            'target_column': self.target_column,
+            'interval_stats': self.interval_stats,
+            'ensemble': self.ensemble
         }
         feature_path = os.path.join(model_dir, "feature_info.joblib")
         joblib.dump(feature_info, feature_path)
         print(f"Feature info saved to: {feature_path}")
+
+        # 単一ファイルの成果物（FastAPI はこちらを優先し、sklearn なしでメモリマップ読み込みする）
+        artifact_path = os.path.join(model_dir, ARTIFACT_FILE)
+        if self.model_type == "hist_gbr":
+            # 木はフラットな配列（分岐特徴量・閾値・左右の子・葉の値）として書き出す
+            export_tree_model(
+                artifact_path, self.model, self.scaler,
+                self.feature_columns, self.label_encoders, self.target_column
+            )
+        else:
+            export_linear_model(
+                artifact_path, self.model, self.scaler,
+                self.feature_columns, self.label_encoders, self.target_column,
+                interval_stats=self.interval_stats,
+                ensemble=self.ensemble
+            )
+        print(f"Model artifact saved to: {artifact_path}")
     
     def load_model(self, model_dir: str = "models"):
         """
@@ -250,7 +306,12 @@ def main():
     メイン実行関数
     """
     try:
-        trainer = RealEstateModelTrainer()
+        # BOOTSTRAP_REPLICAS: ブートストラップアンサンブルのレプリカ数（0 で作成しない）
+        # MODEL_TYPE: linear（重回帰、デフォルト）/ hist_gbr（勾配ブースティング木）
+        trainer = RealEstateModelTrainer(
+            bootstrap_replicas=int(os.getenv('BOOTSTRAP_REPLICAS', '0')),
+            model_type=os.getenv('MODEL_TYPE', 'linear').lower()
+        )
         
         # データ読み込み
         df = trainer.load_data()